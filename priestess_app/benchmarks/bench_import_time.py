@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure how long the client-side modules take to import
+
+Each module is imported in a fresh interpreter, several times, and this
+reports the median wall time and the heavy server dependencies it pulled in.
+It exits non-zero if a client-side module imports torch, transformers or
+flask, or takes longer than `--budget` seconds, so it can guard against
+regressions in CI.
+
+    python benchmarks/bench_import_time.py
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that `priestess status` and client-only commands load
+CLIENT_MODULES = ["priestess_client", "priestess_config", "priestess_cli"]
+
+HEAVY_MODULES = ["torch", "transformers", "flask", "numpy"]
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(module: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client-side import time benchmark")
+    parser.add_argument("--modules", nargs="+", default=CLIENT_MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="Median seconds a module may take to import before the check fails")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<20}{'median ms':>11}{'max ms':>9}  heavy imports")
+    for module in args.modules:
+        runs = [import_once(module) for _ in range(args.repeats)]
+        times = [run["seconds"] for run in runs]
+        heavy = sorted({name for run in runs for name in run["heavy"]})
+        median = statistics.median(times)
+        print(f"{module:<20}{median * 1000:>11.1f}{max(times) * 1000:>9.1f}  {', '.join(heavy) or '-'}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if median > args.budget:
+            failures.append(f"{module} takes {median:.2f}s to import (budget {args.budget:.2f}s)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Compare KV cache storage formats side by side
+
+For each `kv_cache_dtype` this reports KV bytes per token, how many sessions
+of `--context` tokens fit in 1 GiB of KV cache, batched decode throughput
+through the engine, greedy agreement with the unquantized cache and the mean
+KL divergence of next-token distributions over the same text.
+
+    python benchmarks/bench_kv_cache.py --model-path ./WhiteRabbitNeo-V3-7B
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from priestess_engine import PriestessEngine, SamplingParams, layers_to_cache  # noqa: E402
+from priestess_kvcache import KV_CACHE_DTYPES, layers_nbytes  # noqa: E402
+from priestess_loader import load_mmap_model  # noqa: E402
+
+TEXT = (
+    "Review the following nginx configuration for security problems and explain each finding. "
+    "server { listen 80; server_name example.com; location / { proxy_pass http://127.0.0.1:5000; "
+    "proxy_set_header Host $host; autoindex on; } location /admin { allow all; } } "
+)
+
+
+def load_model(model_path: str):
+    from transformers import AutoModelForCausalLM
+    model = load_mmap_model(model_path)
+    if model is None:
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype="auto", trust_remote_code=True)
+    return model.eval()
+
+
+def make_prompts(tokenizer, count: int, length: int):
+    ids = tokenizer(TEXT * (length // 16 + 1)).input_ids
+    # Distinct prompts of the same length so nothing is shared between rows
+    return [ids[i:i + length] for i in range(count)]
+
+
+def run_engine(model, tokenizer, prompts, kv_dtype: str, max_new_tokens: int, batch_size: int):
+    engine = PriestessEngine(model, tokenizer, max_batch_size=batch_size, kv_cache_dtype=kv_dtype)
+    engine.eos_token_ids = set()  # Decode the full length so every format does the same work
+    engine.start()
+    params = SamplingParams(max_new_tokens=max_new_tokens, temperature=0.0, top_p=1.0, do_sample=False)
+    start = time.perf_counter()
+    requests = [engine.submit(prompt, params) for prompt in prompts]
+    outputs = [request.result() for request in requests]
+    elapsed = time.perf_counter() - start
+    engine.stop()
+    return outputs, sum(len(o) for o in outputs) / elapsed
+
+
+@torch.inference_mode()
+def log_probs(model, sequence, kv_dtype: str):
+    cache = layers_to_cache(None, kv_dtype)
+    logits = model(torch.tensor([sequence]), past_key_values=cache, use_cache=True).logits[0]
+    return torch.log_softmax(logits.float(), dim=-1), cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KV cache format accuracy and throughput benchmark")
+    parser.add_argument("--model-path", default="./WhiteRabbitNeo-V3-7B")
+    parser.add_argument("--kv-dtypes", nargs="+", default=list(KV_CACHE_DTYPES), choices=KV_CACHE_DTYPES)
+    parser.add_argument("--prompt-tokens", type=int, default=1024)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--context", type=int, default=32768, help="Session length used for the capacity column")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path, trust_remote_code=True)
+    model = load_model(args.model_path)
+    prompts = make_prompts(tokenizer, args.batch_size, args.prompt_tokens)
+
+    reference_outputs, _ = run_engine(model, tokenizer, prompts, "auto", args.max_new_tokens, args.batch_size)
+    sequence = prompts[0] + reference_outputs[0]
+    reference_log_probs, _ = log_probs(model, sequence, "auto")
+    continuation = slice(len(prompts[0]) - 1, len(sequence) - 1)
+
+    print(f"{'kv dtype':<10}{'bytes/token':>13}{'sessions/GiB':>14}{'tok/s':>9}{'greedy match':>14}{'mean KL':>10}")
+    for kv_dtype in ["auto"] + [d for d in args.kv_dtypes if d != "auto"]:
+        outputs, speed = run_engine(model, tokenizer, prompts, kv_dtype, args.max_new_tokens, args.batch_size)
+        matched = 0
+        for output, reference in zip(outputs, reference_outputs):
+            n = 0
+            while n < min(len(output), len(reference)) and output[n] == reference[n]:
+                n += 1
+            matched += n
+        lp, cache = log_probs(model, sequence, kv_dtype)
+        ref = reference_log_probs[continuation]
+        kl = (ref.exp() * (ref - lp[continuation])).sum(-1).mean().item()
+
+        layers = [(layer.keys, layer.values) for layer in cache.layers] if hasattr(cache, "layers") \
+            else list(zip(cache.key_cache, cache.value_cache))
+        per_token = layers_nbytes(layers) / len(sequence)
+        print(f"{kv_dtype:<10}{per_token:>13,.0f}{2 ** 30 / (per_token * args.context):>14.2f}{speed:>9.1f}"
+              f"{matched / sum(len(r) for r in reference_outputs):>14.1%}{kl:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
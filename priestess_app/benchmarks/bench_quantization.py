@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Compare quantized CPU models against the unquantized one
+
+For each mode this reports weight memory, greedy decode speed, how many
+greedy tokens match the unquantized model, and the mean KL divergence of the
+next-token distributions over the same teacher-forced text.
+
+    python benchmarks/bench_quantization.py --model-path ./WhiteRabbitNeo-V3-7B
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from priestess_loader import load_mmap_model  # noqa: E402
+from priestess_quant import QUANTIZATION_MODES, quantize_model, unsupported_reason  # noqa: E402
+
+PROMPTS = [
+    "Explain how a TCP SYN flood works and how to mitigate it.",
+    "Write a Dockerfile for a Python Flask application.",
+    "def parse_cpulist(text):\n    \"\"\"Parse a Linux cpulist such as 0-3,8\"\"\"\n",
+]
+
+
+def load_model(model_path: str):
+    from transformers import AutoModelForCausalLM
+    model = load_mmap_model(model_path)
+    if model is None:
+        model = AutoModelForCausalLM.from_pretrained(model_path, torch_dtype="auto", trust_remote_code=True)
+    return model.eval()
+
+
+def weight_bytes(model) -> int:
+    tensors = {id(t): t for t in list(model.parameters()) + list(model.buffers()) if t is not None}
+    return sum(t.numel() * t.element_size() for t in tensors.values())
+
+
+def encode(tokenizer, prompt: str) -> torch.Tensor:
+    text = prompt
+    if tokenizer.chat_template:
+        text = tokenizer.apply_chat_template([{"role": "user", "content": prompt}], tokenize=False, add_generation_prompt=True)
+    return tokenizer(text, return_tensors="pt").input_ids
+
+
+@torch.inference_mode()
+def greedy(model, input_ids: torch.Tensor, max_new_tokens: int):
+    """Greedy continuation and decode tokens per second"""
+    out = model(input_ids, use_cache=True)
+    past, token = out.past_key_values, out.logits[:, -1].argmax(-1, keepdim=True)
+    tokens = [token]
+    start = time.perf_counter()
+    for _ in range(max_new_tokens - 1):
+        out = model(token, past_key_values=past, use_cache=True)
+        past, token = out.past_key_values, out.logits[:, -1].argmax(-1, keepdim=True)
+        tokens.append(token)
+    elapsed = time.perf_counter() - start
+    return torch.cat(tokens, dim=1)[0], (max_new_tokens - 1) / elapsed
+
+
+@torch.inference_mode()
+def log_probs(model, sequence: torch.Tensor) -> torch.Tensor:
+    return torch.log_softmax(model(sequence).logits[0].float(), dim=-1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantization quality and speed benchmark")
+    parser.add_argument("--model-path", default="./WhiteRabbitNeo-V3-7B")
+    parser.add_argument("--modes", nargs="+", default=[m for m in QUANTIZATION_MODES if m != "none"],
+                        choices=QUANTIZATION_MODES)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_path, trust_remote_code=True)
+    prompts = [encode(tokenizer, prompt) for prompt in PROMPTS]
+
+    # Reference continuations and distributions from the unquantized model
+    baseline = load_model(args.model_path)
+    reference = []
+    for input_ids in prompts:
+        tokens, _ = greedy(baseline, input_ids, args.max_new_tokens)
+        sequence = torch.cat([input_ids[0], tokens]).unsqueeze(0)
+        reference.append((tokens, sequence, log_probs(baseline, sequence)))
+    del baseline
+
+    print(f"{'mode':<18}{'weights MB':>12}{'load s':>9}{'tok/s':>9}{'greedy match':>14}{'mean KL':>10}")
+    for mode in ["none"] + [m for m in args.modes if m != "none"]:
+        reason = unsupported_reason(mode)
+        if reason is not None:
+            print(f"{mode:<18}skipped: {reason}")
+            continue
+        start = time.perf_counter()
+        model = quantize_model(load_model(args.model_path), mode)
+        load_time = time.perf_counter() - start
+        size = weight_bytes(model)
+
+        speeds, matched, total, kl = [], 0, 0, []
+        for input_ids, (ref_tokens, sequence, ref_log_probs) in zip(prompts, reference):
+            tokens, speed = greedy(model, input_ids, args.max_new_tokens)
+            speeds.append(speed)
+            # Tokens agreeing before the first divergence
+            diverged = (tokens != ref_tokens).nonzero()
+            matched += int(diverged[0]) if len(diverged) else len(tokens)
+            total += len(tokens)
+            # KL(reference || quantized) at every teacher-forced position
+            lp = log_probs(model, sequence)
+            kl.append((ref_log_probs.exp() * (ref_log_probs - lp)).sum(-1).mean().item())
+
+        print(f"{mode:<18}{size / 1e6:>12.1f}{load_time:>9.2f}{sum(speeds) / len(speeds):>9.1f}"
+              f"{matched / total:>14.1%}{sum(kl) / len(kl):>10.4f}")
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Priestess AI Admission - KV memory budget for the running batch
+Estimates each request's worst-case KV cache size from the model config and
+only lets requests into the batch while the total stays under a budget
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+import torch
+
+from priestess_kvcache import KV_SCALE_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """A request could never fit in the KV memory budget, even on its own"""
+
+
+def kv_bytes_per_token(model_config, dtype: torch.dtype, kv_cache_dtype: str = "auto") -> int:
+    """Bytes of keys and values one token adds across all layers"""
+    text_config = getattr(model_config, "text_config", None) or model_config
+    num_heads = text_config.num_attention_heads
+    kv_heads = getattr(text_config, "num_key_value_heads", None) or num_heads
+    head_dim = getattr(text_config, "head_dim", None) or text_config.hidden_size // num_heads
+    if kv_cache_dtype == "auto":
+        head_bytes = head_dim * torch.empty(0, dtype=dtype).element_size()
+    else:
+        head_bytes = head_dim + KV_SCALE_BYTES
+    return 2 * text_config.num_hidden_layers * kv_heads * head_bytes
+
+
+class AdmissionController:
+    """Worst-case KV memory accounting for a continuous batching engine
+
+    The engine left-pads every row of the batch to the longest one, so a
+    batch of n rows whose longest can reach L tokens holds up to n * L tokens
+    of KV state. A request reaches at most its prompt plus `max_new_tokens`
+    plus the tokens a speculative step feeds ahead. Requests that would push
+    the batch over `budget_bytes` wait; requests that exceed the budget on
+    their own are rejected when submitted.
+    """
+
+    def __init__(self, budget_bytes: int, bytes_per_token: int):
+        self.budget_bytes = budget_bytes
+        self.bytes_per_token = bytes_per_token
+        self._lock = threading.Lock()
+        self.committed_bytes = 0
+        self.waiting = False
+        self.admitted = 0
+        self.deferred = 0
+        self.rejected = 0
+
+    def batch_bytes(self, worst_lengths: Iterable[int]) -> int:
+        lengths = list(worst_lengths)
+        return len(lengths) * max(lengths, default=0) * self.bytes_per_token
+
+    def check(self, worst_length: int):
+        """Reject a request that cannot fit even in an empty batch"""
+        needed = worst_length * self.bytes_per_token
+        if needed > self.budget_bytes:
+            with self._lock:
+                self.rejected += 1
+            raise AdmissionRejected(
+                f"Request needs up to {needed / 2 ** 20:.1f} MiB of KV cache ({worst_length} tokens), "
+                f"more than the {self.budget_bytes / 2 ** 20:.1f} MiB budget; "
+                f"shorten the conversation or lower max_new_tokens"
+            )
+
+    def fits(self, running_lengths: Iterable[int], worst_length: int) -> bool:
+        """Whether the batch stays within budget with one more request"""
+        return self.batch_bytes(list(running_lengths) + [worst_length]) <= self.budget_bytes
+
+    def record(self, committed_bytes: int, admitted: int = 0, waiting: Optional[bool] = None):
+        with self._lock:
+            self.committed_bytes = committed_bytes
+            self.admitted += admitted
+            if waiting is not None:
+                if waiting and not self.waiting:
+                    self.deferred += 1
+                self.waiting = waiting
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "committed_bytes": self.committed_bytes,
+                "available_bytes": max(0, self.budget_bytes - self.committed_bytes),
+                "bytes_per_token": self.bytes_per_token,
+                "waiting_for_memory": self.waiting,
+                "admitted": self.admitted,
+                "deferred": self.deferred,
+                "rejected": self.rejected,
+            }
@@ -4,29 +4,162 @@ Preserves all original capabilities while providing a clean interface
 """
 
 import torch
+import io
 import json
 import logging
-from typing import Dict, List, Optional, Any, Union
-from dataclasses import dataclass
+import os
+import zlib
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Union
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+
+from priestess_admission import AdmissionRejected
+from priestess_client import PriestessClient  # noqa: F401 - re-exported for existing callers
+from priestess_coalesce import InflightRequests
+from priestess_config import PriestessConfig
+from priestess_engine import GenerationRequest, IncrementalDetokenizer, PriestessEngine, SamplingParams
+from priestess_sessions import ChatSession, SessionLimitError, SessionManager
+from priestess_history import HistoryCompactor, HistoryWindow, summarized_window
+from priestess_kvcache import KV_CACHE_DTYPES, PROMPT_CACHE_FILE, PromptKVCache, RadixPrefixCache, default_cache_dir, model_fingerprint
+from priestess_loader import LoadProgress, load_mmap_model, prefetch_files, safetensors_files
+from priestess_quant import QUANTIZATION_MODES, load_quantized, quantize_model, read_quantized, save_quantized
+from priestess_response_cache import (
+    CACHE_BYPASS,
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_SEMANTIC_HIT,
+    CacheLookup,
+    ResponseCache,
+    is_deterministic,
+    response_cache_key,
+)
+from priestess_semantic_cache import SemanticCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
-class PriestessConfig:
-    """Configuration for Priestess AI"""
-    model_path: str = "./WhiteRabbitNeo-V3-7B"
-    max_new_tokens: int = 2048
-    temperature: float = 0.7
-    top_p: float = 0.9
-    do_sample: bool = True
-    device: str = "auto"
-    torch_dtype: str = "auto"
+# System prompts for the specialist endpoints. Their chat-templated prefixes
+# are prefilled once at load time and shared by every request.
+CYBERSEC_SYSTEM_PROMPT = """You are Priestess, an expert cybersecurity AI. 
+                Perform a {analysis_type} cybersecurity analysis. 
+                Provide detailed, actionable insights and recommendations.
+                Focus on practical security implications and mitigation strategies.
+                You have access to comprehensive cybersecurity knowledge including tools, techniques, and procedures."""
+
+DEVOPS_SYSTEM_PROMPT = """You are Priestess, an expert DevOps AI assistant.
+                Provide comprehensive DevOps solutions including:
+                - Infrastructure as Code
+                - CI/CD pipeline optimization
+                - Container orchestration
+                - Monitoring and observability
+                - Security best practices
+                - Automation strategies
+                You have access to extensive knowledge of tools, commands, and best practices."""
+
+CODE_ANALYSIS_SYSTEM_PROMPT = """You are Priestess, an expert code security analyst.
+                Analyze the provided code for:
+                - Security vulnerabilities
+                - Best practice violations
+                - Performance issues
+                - Potential exploits
+                Provide specific recommendations and secure code alternatives.
+                Use your extensive knowledge of security patterns and anti-patterns."""
+
+ENDPOINT_SYSTEM_PROMPTS = {
+    "cybersec": CYBERSEC_SYSTEM_PROMPT,
+    "devops": DEVOPS_SYSTEM_PROMPT,
+    "code-analysis": CODE_ANALYSIS_SYSTEM_PROMPT,
+}
+
+# Answers from /devops and /code-analysis often quote their input, so prompt
+# lookup speculation is on for them unless a request's generation_kwargs turn it off
+QUOTING_ENDPOINT_DEFAULTS = {"prompt_lookup": True}
+
+# Largest request body accepted once gzip content encoding is undone
+MAX_REQUEST_BYTES = 64 * 1024 ** 2
+
+def gunzip_body(body: bytes, max_bytes: int = MAX_REQUEST_BYTES) -> bytes:
+    """Decompress a gzip-encoded request body, refusing ones that inflate past max_bytes"""
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decoder.decompress(body, max_bytes + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip request body: {e}")
+    if len(data) > max_bytes:
+        raise ValueError(f"Request body exceeds {max_bytes} bytes once decompressed")
+    return data
+
+class GzipRequestMiddleware:
+    """WSGI middleware that inflates gzip-encoded request bodies before Flask reads them"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").lower() == "gzip":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            stream = environ["wsgi.input"]
+            try:
+                body = gunzip_body(stream.read(length) if length else stream.read())
+            except ValueError as e:
+                payload = json.dumps({"error": str(e)}).encode()
+                start_response("400 BAD REQUEST", [
+                    ("Content-Type", "application/json"),
+                    ("Content-Length", str(len(payload)))
+                ])
+                return [payload]
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.app(environ, start_response)
+
+def cybersec_messages(query: str, analysis_type: str) -> List[Dict[str, str]]:
+    """Build the conversation for a cybersecurity analysis request"""
+    return [
+        {"role": "system", "content": CYBERSEC_SYSTEM_PROMPT.format(analysis_type=analysis_type)},
+        {"role": "user", "content": query}
+    ]
+
+def devops_messages(task: str, context: str) -> List[Dict[str, str]]:
+    """Build the conversation for a DevOps assistance request"""
+    return [
+        {"role": "system", "content": DEVOPS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Task: {task}\nContext: {context}"}
+    ]
+
+def code_analysis_messages(code: str, language: str) -> List[Dict[str, str]]:
+    """Build the conversation for a code security analysis request"""
+    return [
+        {"role": "system", "content": CODE_ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Analyze this {language} code:\n\n```{language}\n{code}\n```"}
+    ]
+
+def batch_items(data: Dict[str, Any], max_items: int, field: str) -> List[Dict[str, Any]]:
+    """The items of a batch request body, each of which must carry `field`"""
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        raise ValueError("'items' must be a non-empty list")
+    if len(items) > max_items:
+        raise ValueError(f"At most {max_items} items per batch request")
+    if not all(isinstance(item, dict) and field in item for item in items):
+        raise ValueError(f"Every item needs a '{field}' field")
+    return items
+
+def batch_record(
+    result: Tuple[int, Optional[str], str, Optional[Exception]],
+    result_key: str,
+    fields: Dict[str, Any]
+) -> Dict[str, Any]:
+    """One NDJSON line of a batch endpoint's response"""
+    index, response, cache_status, error = result
+    if error is not None:
+        return {"index": index, **fields, "error": str(error)}
+    return {"index": index, result_key: response, **fields, "cache": cache_status, "status": "success"}
 
 class PriestessSecrets:
     """Secret knowledge repository for Priestess"""
@@ -334,33 +467,146 @@ class PriestessCore:
     def __init__(self, config: PriestessConfig):
         self.config = config
         self.model = None
+        self.draft_model = None
         self.tokenizer = None
+        self.history: Optional[HistoryWindow] = None
+        self.compactor: Optional[HistoryCompactor] = None
+        self.response_cache: Optional[ResponseCache] = None
+        self.inflight = InflightRequests() if config.coalesce_requests else None
+        self.semantic_cache: Optional[SemanticCache] = None
+        # Identifies the model and settings responses were generated with
+        self.response_model_id = ""
+        self.engine = None
+        # With a worker pool the KV caches live in the worker processes
+        local = config.num_workers <= 1
+        self.prompt_cache = PromptKVCache() if config.prompt_cache and local else None
+        self.prefix_cache = RadixPrefixCache(config.prefix_cache_bytes) if config.prefix_cache_bytes > 0 and local else None
+        self.sessions = SessionManager(
+            max_sessions=config.max_sessions,
+            idle_timeout=config.session_idle_timeout,
+            on_evict=self.release_session
+        )
+        # Endpoint name -> (chat-templated prefix text, its token ids)
+        self.prompt_prefixes: Dict[str, tuple] = {}
         self.is_loaded = False
+        self.load_progress = LoadProgress()
+        # Set once a load attempt has succeeded or failed
+        self.load_finished = threading.Event()
+        self._load_lock = threading.Lock()
         self.secrets = PriestessSecrets()
         
     def load_model(self):
         """Load the Priestess model and tokenizer"""
-        try:
-            logger.info("Loading Priestess AI model...")
-            
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.config.model_path,
-                trust_remote_code=True
+        with self._load_lock:
+            if self.is_loaded:
+                return
+            self.load_progress = LoadProgress()
+            self.load_finished.clear()
+            try:
+                self._load_model()
+                self.load_progress.set_phase("ready")
+            except Exception as e:
+                self.load_progress.fail(e)
+                logger.error(f"Failed to load model: {e}")
+                raise
+            finally:
+                self.load_finished.set()
+    
+    def load_model_async(self) -> threading.Thread:
+        """Load the model in the background so health checks are answered meanwhile"""
+        def run():
+            try:
+                self.load_model()
+            except Exception:
+                # Already logged and recorded in load_progress
+                pass
+        thread = threading.Thread(target=run, name="priestess-loader", daemon=True)
+        thread.start()
+        return thread
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until a load attempt finishes; returns whether the model is loaded"""
+        self.load_finished.wait(timeout)
+        return self.is_loaded
+    
+    def _load_model(self):
+        """Build the tokenizer, model and engine; callers hold _load_lock"""
+        if self.config.num_workers > 1:
+            from priestess_workers import cpu_slices
+            # Fail on a bad worker count before loading anything
+            cpu_slices(self.config.num_workers)
+        logger.info("Loading Priestess AI model...")
+        self.load_progress.set_phase("tokenizer")
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            self.config.model_path,
+            trust_remote_code=True
+        )
+        self.history = HistoryWindow.for_tokenizer(self.tokenizer, self.config.max_prompt_tokens)
+        if self.config.history_compaction:
+            self.compactor = HistoryCompactor(
+                self.history,
+                self.config.compaction_threshold,
+                summary_tokens=self.config.compaction_summary_tokens
             )
-            
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.config.model_path,
-                torch_dtype=self.config.torch_dtype,
-                device_map=self.config.device,
-                trust_remote_code=True
+        self.response_model_id = self.output_fingerprint()
+        if self.config.response_cache_bytes > 0:
+            self.load_response_cache()
+        if self.config.semantic_cache:
+            self.semantic_cache = SemanticCache(
+                self.config.semantic_cache_entries,
+                self.config.semantic_cache_threshold,
+                ttl=self.config.response_cache_ttl
             )
-            
+        
+        # Read the shards into the page cache concurrently while the model is built
+        self.load_progress.set_phase("weights")
+        shards = safetensors_files(self.config.model_path)
+        if self.config.draft_model_path:
+            shards += safetensors_files(self.config.draft_model_path)
+        if shards:
+            prefetch_files(shards, self.load_progress)
+        
+        if self.config.num_workers > 1:
+            # Inference runs in worker processes; this one only tokenizes and dispatches
+            from priestess_workers import WorkerPoolEngine
+            if self.config.prompt_cache:
+                self.load_prompt_prefixes()
+            if self.config.quantization != "none" and self.config.quantization_cache:
+                # Convert once here so every worker maps the same quantized file
+                self.ensure_quantized_cache()
+            self.engine = WorkerPoolEngine(self.config)
+            self.engine.start()
             self.is_loaded = True
-            logger.info("Priestess AI model loaded successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to load model: {e}")
-            raise
+            logger.info(f"Priestess AI worker pool ready ({self.config.num_workers} workers)")
+            return
+        
+        if self.config.quantization != "none":
+            self.model = self.load_quantized_model()
+        else:
+            self.model = self.load_weights(self.config.model_path)
+        if self.config.draft_model_path:
+            self.draft_model = self.load_draft_model()
+        
+        self.load_progress.set_phase("warmup")
+        # Start the continuous batching scheduler
+        self.engine = PriestessEngine(
+            self.model,
+            self.tokenizer,
+            max_batch_size=self.config.max_batch_size,
+            prompt_cache=self.prompt_cache,
+            prefix_cache=self.prefix_cache,
+            draft_model=self.draft_model,
+            num_speculative_tokens=self.config.num_speculative_tokens,
+            prompt_lookup_tokens=self.config.prompt_lookup_tokens,
+            kv_cache_dtype=self.config.kv_cache_dtype,
+            kv_memory_budget=self.config.kv_memory_budget
+        )
+        if self.prompt_cache is not None:
+            self.warm_prompt_cache()
+        self.engine.start()
+        
+        self.is_loaded = True
+        logger.info("Priestess AI model loaded successfully")
     
     def generate_response(
         self, 
@@ -368,66 +614,721 @@ class PriestessCore:
         **generation_kwargs
     ) -> str:
         """Generate response from Priestess"""
+        response, _ = self.generate_cached_response(messages, **generation_kwargs)
+        return response
+    
+    def generate_cached_response(
+        self,
+        messages: List[Dict[str, str]],
+        endpoint: Optional[str] = None,
+        **generation_kwargs
+    ) -> Tuple[str, str]:
+        """Generate a response, answering repeated requests from the response caches
+        
+        Returns the response and how the caches were used: CACHE_HIT,
+        CACHE_SEMANTIC_HIT, CACHE_MISS, or CACHE_BYPASS for requests that are
+        not cached. `endpoint` names the specialist endpoint, for the semantic cache.
+        """
         if not self.is_loaded:
             raise RuntimeError("Model not loaded. Call load_model() first.")
         
         try:
             # Check if user is asking for secrets
-            user_message = messages[-1].get('content', '').lower()
-            secret_triggers = [
-                'share your secrets', 'tell me your secrets', 'reveal your secrets',
-                'show me your secrets', 'what are your secrets', 'secret knowledge',
-                'hidden knowledge', 'share secrets', 'priestess secrets'
-            ]
-            
-            if any(trigger in user_message for trigger in secret_triggers):
-                return self.secrets.get_secret_knowledge()
-            
-            # Apply chat template
-            text = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-            
-            # Tokenize input
-            model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-            
-            # Set generation parameters
-            gen_kwargs = {
-                "max_new_tokens": generation_kwargs.get("max_new_tokens", self.config.max_new_tokens),
-                "temperature": generation_kwargs.get("temperature", self.config.temperature),
-                "top_p": generation_kwargs.get("top_p", self.config.top_p),
-                "do_sample": generation_kwargs.get("do_sample", self.config.do_sample),
-                "pad_token_id": self.tokenizer.eos_token_id,
-            }
+            secrets = self.check_secret_request(messages)
+            if secrets is not None:
+                return secrets, CACHE_BYPASS
             
-            # Generate response
-            with torch.no_grad():
-                generated_ids = self.model.generate(
-                    **model_inputs,
-                    **gen_kwargs
-                )
+            lookup = self.check_caches(messages, generation_kwargs, endpoint)
+            if lookup.response is not None:
+                return lookup.response, lookup.status
             
-            # Extract only the new tokens
-            generated_ids = [
-                output_ids[len(input_ids):] 
-                for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-            ]
+            # Queue the request on the batching engine and wait for its tokens
+            request = self.submit_shared(messages, lookup.key, **generation_kwargs)
+            generated_ids = request.result()
             
             # Decode response
-            response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
-            return response.strip()
+            response = self.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+            self.remember_response(lookup, response)
+            return response, lookup.status
             
         except Exception as e:
             logger.error(f"Generation failed: {e}")
             raise
+    
+    def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        **generation_kwargs
+    ) -> Iterator[str]:
+        """Generate response from Priestess, yielding text as tokens are decoded"""
+        chunks, _ = self.stream_cached_response(messages, **generation_kwargs)
+        yield from chunks
+    
+    def stream_cached_response(
+        self,
+        messages: List[Dict[str, str]],
+        endpoint: Optional[str] = None,
+        **generation_kwargs
+    ) -> Tuple[Iterator[str], str]:
+        """Start streaming a response, reporting how the response caches were used
+        
+        A cached response arrives as a single chunk; a fresh one is cached
+        once it has streamed to the end.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        
+        secrets = self.check_secret_request(messages)
+        if secrets is not None:
+            return iter([secrets]), CACHE_BYPASS
+        
+        lookup = self.check_caches(messages, generation_kwargs, endpoint)
+        if lookup.response is not None:
+            return iter([lookup.response]), lookup.status
+        
+        request = self.submit_shared(messages, lookup.key, **generation_kwargs)
+        if lookup.status == CACHE_BYPASS:
+            return self.stream_request(request), lookup.status
+        return self.stream_and_cache(request, lookup), lookup.status
+    
+    def stream_and_cache(self, request: GenerationRequest, lookup: CacheLookup) -> Iterator[str]:
+        """Stream a request's text and cache it if the consumer reads it all"""
+        parts = []
+        for text in self.stream_request(request):
+            parts.append(text)
+            yield text
+        if not request.cancelled:
+            self.remember_response(lookup, "".join(parts).strip())
+    
+    def batch_responses(
+        self,
+        conversations: List[List[Dict[str, str]]],
+        endpoint: Optional[str] = None,
+        **generation_kwargs
+    ) -> Iterator[Tuple[int, Optional[str], str, Optional[Exception]]]:
+        """Generate responses for many stateless conversations, yielding each as it finishes
+        
+        Yields (index, response, cache status, error) in completion order; a
+        failed item does not stop the others. Cached answers come back first.
+        The rest are tokenized together and queued shortest first, a full
+        batch at a time, so the rows the engine prefills and decodes together
+        have similar lengths and little padding.
+        """
+        answered, queued = self.prepare_batch(conversations, endpoint, **generation_kwargs)
+        yield from answered
+        queued = iter(queued)
+        params = self.sampling_params(generation_kwargs)
+        running: Dict[Any, Tuple[int, CacheLookup, GenerationRequest]] = {}
+        try:
+            while True:
+                for index, lookup, prompt_ids in queued:
+                    try:
+                        request = self.submit_batch_item(lookup, prompt_ids, params)
+                    except Exception as e:
+                        yield index, None, lookup.status, e
+                        continue
+                    running[request.future] = (index, lookup, request)
+                    if len(running) >= self.batch_window:
+                        break
+                if not running:
+                    return
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, lookup, _ = running.pop(future)
+                    yield self.finish_batch_item(index, lookup, future)
+        finally:
+            # Frees the engine when the consumer stops reading early
+            for _, _, request in running.values():
+                request.cancel()
+    
+    @property
+    def batch_window(self) -> int:
+        """Batch items kept queued in the engine at once: one full batch per worker"""
+        return self.config.max_batch_size * max(1, self.config.num_workers)
+    
+    def prepare_batch(
+        self,
+        conversations: List[List[Dict[str, str]]],
+        endpoint: Optional[str] = None,
+        **generation_kwargs
+    ) -> Tuple[List[Tuple[int, Optional[str], str, Optional[Exception]]], List[Tuple[int, CacheLookup, List[int]]]]:
+        """Split a batch into items answered without generating and prompts to generate
+        
+        Returns the answered items as batch_responses() yields them, and the
+        rest as (index, cache lookup, prompt ids), shortest prompt first:
+        neighbours in that order are admitted together and pad little.
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        
+        answered = []
+        waiting = []
+        for index, messages in enumerate(conversations):
+            try:
+                secrets = self.check_secret_request(messages)
+                if secrets is not None:
+                    answered.append((index, secrets, CACHE_BYPASS, None))
+                    continue
+                lookup = self.check_caches(messages, generation_kwargs, endpoint)
+                if lookup.response is not None:
+                    answered.append((index, lookup.response, lookup.status, None))
+                    continue
+                text = self.tokenizer.apply_chat_template(
+                    self.history.window(messages, keep_ratio=1.0),
+                    tokenize=False,
+                    add_generation_prompt=True
+                )
+            except Exception as e:
+                answered.append((index, None, CACHE_BYPASS, e))
+                continue
+            waiting.append((index, lookup, text))
+        if not waiting:
+            return answered, []
+        
+        prompts = self.encode_prompts([text for _, _, text in waiting])
+        queued = [(index, lookup, prompt_ids) for (index, lookup, _), prompt_ids in zip(waiting, prompts)]
+        queued.sort(key=lambda item: len(item[2]))
+        return answered, queued
+    
+    def submit_batch_item(self, lookup: CacheLookup, prompt_ids: List[int], params: SamplingParams):
+        """Queue one prepared batch item, sharing the generation of an identical request in flight"""
+        submit = partial(self.engine.submit, prompt_ids, params)
+        if lookup.key is None or self.inflight is None:
+            return submit()
+        return self.inflight.join(lookup.key, submit)
+    
+    def finish_batch_item(
+        self, index: int, lookup: CacheLookup, future
+    ) -> Tuple[int, Optional[str], str, Optional[Exception]]:
+        """Decode and cache a finished batch item"""
+        try:
+            generated_ids = future.result()
+        except Exception as e:
+            return index, None, lookup.status, e
+        response = self.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+        self.remember_response(lookup, response)
+        return index, response, lookup.status, None
+    
+    def lookup_response(
+        self,
+        messages: List[Dict[str, str]],
+        generation_kwargs: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Response cache key of a stateless request, and its cached response if any
+        
+        The key is None for requests whose answers may not be shared: sampled
+        requests that have not opted in with `"cache": true` in their
+        generation_kwargs, and requests that opt out with `"cache": false`.
+        The key also identifies identical requests for coalescing, so it is
+        worked out even when the response cache is off.
+        """
+        if self.response_cache is None and self.inflight is None and self.semantic_cache is None:
+            return None, None
+        opt_in = generation_kwargs.get("cache")
+        params = self.sampling_params(generation_kwargs)
+        if opt_in is False or (not opt_in and not is_deterministic(params)):
+            return None, None
+        key = response_cache_key(messages, params, self.response_model_id)
+        if self.response_cache is None:
+            return key, None
+        return key, self.response_cache.get(key)
+    
+    def lookup_similar(
+        self,
+        endpoint: Optional[str],
+        messages: List[Dict[str, str]],
+        generation_kwargs: Dict[str, Any]
+    ) -> Tuple[Optional[Tuple[str, Any]], Optional[str]]:
+        """Embed a specialist query and look for the answer to a near-duplicate
+        
+        Returns the (namespace, embedding) probe needed to cache this
+        request's answer, and the cached answer if one is similar enough.
+        Both are None when the semantic cache does not apply to the request.
+        """
+        if self.semantic_cache is None or endpoint not in self.config.semantic_cache_endpoints:
+            return None, None
+        token_ids = self.tokenizer(messages[-1].get("content", ""), add_special_tokens=False).input_ids
+        if not token_ids or len(token_ids) > self.config.semantic_cache_max_tokens:
+            return None, None
+        # Everything but the query itself must match exactly
+        namespace = response_cache_key(
+            messages[:-1], self.sampling_params(generation_kwargs), f"{self.response_model_id}:{endpoint}"
+        )
+        started = time.perf_counter()
+        try:
+            vector = self.engine.embed(token_ids).result()
+        except Exception as e:
+            logger.warning(f"Could not embed query for the semantic cache: {e}")
+            return None, None
+        self.semantic_cache.record_embedding(time.perf_counter() - started)
+        return (namespace, vector), self.semantic_cache.search(namespace, vector)
+    
+    def check_caches(
+        self,
+        messages: List[Dict[str, str]],
+        generation_kwargs: Dict[str, Any],
+        endpoint: Optional[str] = None
+    ) -> CacheLookup:
+        """Look a stateless request up in the exact, then the semantic, response cache"""
+        key, cached = self.lookup_response(messages, generation_kwargs)
+        if cached is not None:
+            return CacheLookup(CACHE_HIT, cached, key)
+        probe = None
+        if key is not None:
+            probe, cached = self.lookup_similar(endpoint, messages, generation_kwargs)
+            if cached is not None:
+                return CacheLookup(CACHE_SEMANTIC_HIT, cached, key)
+        cached_here = (key is not None and self.response_cache is not None) or probe is not None
+        return CacheLookup(CACHE_MISS if cached_here else CACHE_BYPASS, None, key, probe)
+    
+    def remember_response(self, lookup: CacheLookup, response: str):
+        """Store a freshly generated answer in the caches its lookup consulted"""
+        if lookup.key is not None and self.response_cache is not None:
+            self.response_cache.put(lookup.key, response)
+        if lookup.probe is not None:
+            self.semantic_cache.add(*lookup.probe, response)
+    
+    def submit_shared(
+        self,
+        messages: List[Dict[str, str]],
+        key: Optional[str],
+        **generation_kwargs
+    ) -> GenerationRequest:
+        """Queue a conversation, joining an identical request already generating
+        
+        With a key from lookup_response and coalescing on, the result is a
+        SharedRequest handle; cancelling it only stops the generation once no
+        other caller is waiting on it.
+        """
+        if key is None or self.inflight is None:
+            return self.submit(messages, **generation_kwargs)
+        return self.inflight.join(key, partial(self.submit, messages, **generation_kwargs))
+    
+    def output_fingerprint(self) -> str:
+        """Identify the model and the settings that change its answers"""
+        variants = [v for v in (self.config.quantization, self.config.kv_cache_dtype) if v not in ("none", "auto")]
+        variants.append(f"max_prompt_tokens={self.config.max_prompt_tokens}")
+        return model_fingerprint(self.config.model_path, self.config.torch_dtype, variants)
+    
+    def load_response_cache(self):
+        """Set up the response cache, in memory and optionally on disk"""
+        disk_dir = None
+        if self.config.response_cache_disk:
+            cache_dir = self.config.kv_cache_dir or default_cache_dir(self.config.model_path)
+            disk_dir = os.path.join(cache_dir, "responses")
+        self.response_cache = ResponseCache(
+            self.config.response_cache_bytes,
+            ttl=self.config.response_cache_ttl,
+            disk_dir=disk_dir,
+            disk_max_bytes=self.config.response_cache_disk_bytes
+        )
+    
+    def stream_request(self, request: GenerationRequest) -> Iterator[str]:
+        """Yield the text of a queued request as its tokens are decoded"""
+        detokenizer = IncrementalDetokenizer(self.tokenizer)
+        try:
+            for token_ids in request.iter_tokens():
+                text = detokenizer.push(token_ids)
+                if text:
+                    yield text
+            text = detokenizer.flush()
+            if text:
+                yield text
+        except Exception as e:
+            logger.error(f"Streaming generation failed: {e}")
+            raise
+        finally:
+            # Free the batch slot if the consumer went away early
+            request.cancel()
+    
+    def create_session(self, messages: Optional[List[Dict[str, str]]] = None) -> ChatSession:
+        """Open a server-side conversation, optionally seeded with messages"""
+        return self.sessions.create(messages)
+    
+    def session_response(self, session: ChatSession, content: str, **generation_kwargs) -> str:
+        """Add a user turn to a session and generate the reply"""
+        with self.sessions.turn(session):
+            request, answer = self.begin_session_turn(session, content, **generation_kwargs)
+            if request is None:
+                return answer
+            try:
+                generated_ids = request.result()
+            except BaseException:
+                self.rollback_session_turn(session, request)
+                raise
+            
+            response = self.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+            self.finish_session_turn(session, request, response)
+            return response
+    
+    def stream_session_response(self, session: ChatSession, content: str, **generation_kwargs) -> Iterator[str]:
+        """Add a user turn to a session, yielding the reply as it is decoded"""
+        with self.sessions.turn(session):
+            request, answer = self.begin_session_turn(session, content, **generation_kwargs)
+            if request is None:
+                yield answer
+                return
+            parts = []
+            try:
+                for text in self.stream_request(request):
+                    parts.append(text)
+                    yield text
+            except BaseException:
+                self.rollback_session_turn(session, request)
+                raise
+            
+            self.finish_session_turn(session, request, "".join(parts).strip())
+    
+    def begin_session_turn(
+        self, session: ChatSession, content: str, **generation_kwargs
+    ) -> Tuple[Optional[GenerationRequest], Optional[str]]:
+        """Add a user turn to a session held by the caller and queue its reply
+        
+        Returns the queued request, or the finished answer when the turn
+        needs no generation. The caller ends a queued turn with
+        finish_session_turn() or rollback_session_turn().
+        """
+        session.messages.append({"role": "user", "content": content})
+        secrets = self.check_secret_request(session.messages)
+        if secrets is not None:
+            self.finish_session_turn(session, None, secrets)
+            return None, secrets
+        try:
+            return self.submit_session_turn(session, **generation_kwargs), None
+        except BaseException:
+            self.rollback_session_turn(session, None)
+            raise
+    
+    def submit_session_turn(self, session: ChatSession, **generation_kwargs) -> GenerationRequest:
+        """Queue a session's conversation, tokenizing only what changed since its last turn"""
+        # The window start only moves when history outgrows the budget (or a
+        # new summary lands), so consecutive turns usually extend the previous prompt
+        summary = session.summary
+        start, reserved = session.window_start, 0
+        if summary is not None:
+            start, reserved = max(start, summary.end), summary.tokens
+        window_start = self.history.start_index(session.messages, start, reserved=reserved)
+        text = self.tokenizer.apply_chat_template(
+            summarized_window(session.messages, window_start, summary),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        if session.prompt_text is not None and text.startswith(session.prompt_text):
+            rest = self.tokenizer(text[len(session.prompt_text):], add_special_tokens=False).input_ids
+            prompt_ids = session.prompt_ids + rest
+        else:
+            prompt_ids = self.encode_prompt(text)
+        
+        request = self.engine.submit(
+            prompt_ids,
+            self.sampling_params(generation_kwargs),
+            pin_cache=self.prefix_cache is not None
+        )
+        session.prompt_text, session.prompt_ids = text, prompt_ids
+        session.window_start = window_start
+        return request
+    
+    def finish_session_turn(self, session: ChatSession, request: Optional[GenerationRequest], response: str):
+        """Record the assistant reply and keep the session's KV state pinned"""
+        session.messages.append({"role": "assistant", "content": response})
+        session.touch()
+        if request is not None and self.prefix_cache is not None:
+            # The turn holds the session's lock, so a concurrent delete waits
+            # for the turn to end before releasing the new pin
+            previous, session.cache_node = session.cache_node, request.cache_node
+            self.prefix_cache.unlock(previous)
+        self.schedule_compaction(session)
+    
+    def schedule_compaction(self, session: ChatSession):
+        """Start summarizing a long session's older turns as background work
+        
+        The summary is generated at background priority and swapped in when
+        it is ready, so the session's next turn never waits for it.
+        """
+        if self.compactor is None or session.compaction is not None or session.closed:
+            return
+        summary = session.summary
+        end = self.compactor.plan(session.messages, summary)
+        if end is None:
+            return
+        text = self.tokenizer.apply_chat_template(
+            self.compactor.request_messages(session.messages, end, summary),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        params = SamplingParams(
+            max_new_tokens=self.compactor.summary_tokens,
+            temperature=0.0,
+            top_p=1.0,
+            do_sample=False
+        )
+        try:
+            request = self.engine.submit(self.tokenizer(text).input_ids, params, background=True)
+        except Exception as e:
+            logger.warning(f"Could not start history compaction: {e}")
+            self.compactor.record(failed=1)
+            return
+        session.compaction = request
+        self.compactor.record(started=1)
+        request.future.add_done_callback(lambda future: self.finish_compaction(session, future, end))
+    
+    def finish_compaction(self, session: ChatSession, future, end: int):
+        """Swap a finished summary into its session"""
+        session.compaction = None
+        if future.cancelled() or session.closed:
+            return
+        if future.exception() is not None:
+            logger.warning(f"History compaction failed: {future.exception()}")
+            self.compactor.record(failed=1)
+            return
+        text = self.tokenizer.decode(future.result(), skip_special_tokens=True).strip()
+        if not text:
+            self.compactor.record(failed=1)
+            return
+        previous = session.summary
+        session.summary = self.compactor.summary(end, text)
+        self.compactor.record(completed=1, summarized=end - (previous.end if previous is not None else 0))
+    
+    def rollback_session_turn(self, session: ChatSession, request: Optional[GenerationRequest]):
+        """Undo a user turn whose generation failed or was abandoned"""
+        session.messages.pop()
+        if request is None:
+            return
+        request.cancel()
+        if request.cache_node is not None and self.prefix_cache is not None:
+            self.prefix_cache.unlock(request.cache_node)
+    
+    def release_session(self, session: ChatSession):
+        """Drop the prefix cache pin and any summary job of a closed session
+        
+        Called by the session manager with the session's lock held.
+        """
+        if session.compaction is not None:
+            session.compaction.cancel()
+        if self.prefix_cache is not None and session.cache_node is not None:
+            self.prefix_cache.unlock(session.cache_node)
+            session.cache_node = None
+    
+    def check_secret_request(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Return the secret knowledge if the last message asks for it"""
+        user_message = messages[-1].get('content', '').lower()
+        secret_triggers = [
+            'share your secrets', 'tell me your secrets', 'reveal your secrets',
+            'show me your secrets', 'what are your secrets', 'secret knowledge',
+            'hidden knowledge', 'share secrets', 'priestess secrets'
+        ]
+        
+        if any(trigger in user_message for trigger in secret_triggers):
+            return self.secrets.get_secret_knowledge()
+        return None
+    
+    def load_weights(self, model_path: str):
+        """Load a model, memory-mapping the checkpoint when running on CPU"""
+        on_cpu = self.config.device == "cpu" or (self.config.device == "auto" and not torch.cuda.is_available())
+        if self.config.mmap_weights and on_cpu:
+            try:
+                model = load_mmap_model(model_path, self.config.torch_dtype)
+                if model is not None:
+                    logger.info(f"Memory-mapped model weights from {model_path}")
+                    return model
+            except Exception as e:
+                logger.warning(f"Could not memory-map model weights: {e}")
+        
+        return AutoModelForCausalLM.from_pretrained(
+            model_path,
+            torch_dtype=self.config.torch_dtype,
+            device_map=self.config.device,
+            trust_remote_code=True
+        )
+    
+    def quantized_cache_path(self) -> str:
+        cache_dir = self.config.kv_cache_dir or default_cache_dir(self.config.model_path)
+        return os.path.join(cache_dir, f"quantized-{self.config.quantization}.pt")
+    
+    def quantization_target(self) -> Tuple[str, str, str]:
+        """Mode, cache file and weights fingerprint of the configured quantization"""
+        mode = self.config.quantization
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {', '.join(QUANTIZATION_MODES)}")
+        if self.config.device not in ("cpu", "auto") or (self.config.device == "auto" and torch.cuda.is_available()):
+            raise ValueError(f"{mode} quantization is only supported on CPU")
+        fingerprint = model_fingerprint(self.config.model_path, self.config.torch_dtype, variants=[mode])
+        return mode, self.quantized_cache_path(), fingerprint
+    
+    def ensure_quantized_cache(self):
+        """Convert and save the quantized weights unless a current file exists, without keeping the model"""
+        mode, cache_path, fingerprint = self.quantization_target()
+        try:
+            if read_quantized(cache_path, fingerprint, mode) is not None:
+                return
+        except Exception as e:
+            logger.warning(f"Could not read quantized weights from {cache_path}: {e}")
+        model = quantize_model(self.load_weights(self.config.model_path), mode)
+        try:
+            save_quantized(model, cache_path, fingerprint, mode)
+        except OSError as e:
+            # Each worker then converts the weights itself
+            logger.warning(f"Could not save quantized weights to {cache_path}: {e}")
+    
+    def load_quantized_model(self):
+        """Load the model with quantized linear layers, converting and caching it if needed"""
+        mode, cache_path, fingerprint = self.quantization_target()
+        if self.config.quantization_cache:
+            try:
+                model = load_quantized(self.config.model_path, cache_path, fingerprint, mode)
+                if model is not None:
+                    logger.info(f"Loaded {mode} weights from {cache_path}")
+                    return model
+            except Exception as e:
+                logger.warning(f"Could not load quantized weights from {cache_path}: {e}")
+        
+        model = quantize_model(self.load_weights(self.config.model_path), mode)
+        if self.config.quantization_cache:
+            try:
+                save_quantized(model, cache_path, fingerprint, mode)
+            except OSError as e:
+                logger.warning(f"Could not save quantized weights to {cache_path}: {e}")
+        return model
+    
+    def load_draft_model(self):
+        """Load the speculative decoding draft model and check it shares the tokenizer"""
+        try:
+            draft_tokenizer = AutoTokenizer.from_pretrained(self.config.draft_model_path, trust_remote_code=True)
+        except (OSError, ValueError):
+            draft_tokenizer = None
+        if draft_tokenizer is not None and draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            raise ValueError(f"Draft model {self.config.draft_model_path} does not share the main model's tokenizer")
+        
+        draft_model = self.load_weights(self.config.draft_model_path)
+        if draft_model.device != self.model.device:
+            draft_model = draft_model.to(self.model.device)
+        logger.info(f"Speculative decoding with {self.config.draft_model_path} "
+                    f"({self.config.num_speculative_tokens} tokens per step)")
+        return draft_model
+    
+    def load_prompt_prefixes(self):
+        """Work out the chat-templated text and token ids of each endpoint's fixed prefix"""
+        marker = "\x00PRIESTESS_PREFIX_END\x00"
+        for name, system_prompt in ENDPOINT_SYSTEM_PROMPTS.items():
+            # Everything the chat template renders before request-specific text
+            text = self.tokenizer.apply_chat_template(
+                [
+                    {"role": "system", "content": system_prompt.replace("{analysis_type}", marker)},
+                    {"role": "user", "content": marker}
+                ],
+                tokenize=False,
+                add_generation_prompt=True
+            )
+            prefix_text = text[:text.index(marker)].rstrip(" ")
+            self.prompt_prefixes[name] = (prefix_text, self.tokenizer(prefix_text).input_ids)
+    
+    def warm_prompt_cache(self):
+        """Prefill the endpoint system prompts, reusing KV state saved by a previous run"""
+        self.load_prompt_prefixes()
+        
+        cache_dir = self.config.kv_cache_dir or default_cache_dir(self.config.model_path)
+        cache_path = os.path.join(cache_dir, PROMPT_CACHE_FILE)
+        variants = [v for v in (self.config.quantization, self.config.kv_cache_dtype) if v not in ("none", "auto")]
+        fingerprint = model_fingerprint(self.config.model_path, self.model.dtype, variants)
+        try:
+            self.prompt_cache.load(cache_path, fingerprint, device=self.model.device)
+        except Exception as e:
+            logger.warning(f"Could not load prompt KV cache from {cache_path}: {e}")
+        
+        stale = []
+        for name, (_, prefix_ids) in self.prompt_prefixes.items():
+            entry = self.prompt_cache.get(name)
+            if entry is None or entry.token_ids != tuple(prefix_ids):
+                self.prompt_cache.add(name, prefix_ids, self.engine.compute_kv(prefix_ids))
+                stale.append(name)
+        
+        if stale:
+            logger.info(f"Prefilled system prompts: {', '.join(stale)}")
+            try:
+                self.prompt_cache.save(cache_path, fingerprint)
+            except OSError as e:
+                logger.warning(f"Could not save prompt KV cache to {cache_path}: {e}")
+    
+    def encode_prompt(self, text: str) -> List[int]:
+        """Tokenize a chat-templated prompt, reusing the ids of a known prefix
+        
+        Cached prefixes end on a token boundary, so the prompt is split there
+        and only the remainder is tokenized.
+        """
+        return self.encode_prompts([text])[0]
+    
+    def encode_prompts(self, texts: List[str]) -> List[List[int]]:
+        """Tokenize many chat-templated prompts, with one tokenizer call per known prefix"""
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, text in enumerate(texts):
+            best = None
+            for prefix_text, _ in self.prompt_prefixes.values():
+                if text.startswith(prefix_text) and (best is None or len(prefix_text) > len(best)):
+                    best = prefix_text
+            groups.setdefault(best, []).append(i)
+        
+        prefix_ids = dict(self.prompt_prefixes.values())
+        prompts: List[List[int]] = [[] for _ in texts]
+        for prefix_text, indices in groups.items():
+            if prefix_text is None:
+                encoded = self.tokenizer([texts[i] for i in indices]).input_ids
+                prefix = []
+            else:
+                encoded = self.tokenizer(
+                    [texts[i][len(prefix_text):] for i in indices], add_special_tokens=False
+                ).input_ids
+                prefix = list(prefix_ids[prefix_text])
+            for i, ids in zip(indices, encoded):
+                prompts[i] = prefix + ids
+        return prompts
+    
+    def submit(self, messages: List[Dict[str, str]], **generation_kwargs) -> GenerationRequest:
+        """Tokenize a conversation and queue it on the batching engine"""
+        # Apply chat template to the turns that fit the prompt budget
+        text = self.tokenizer.apply_chat_template(
+            self.history.window(messages, keep_ratio=1.0),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        
+        # Tokenize input
+        prompt_ids = self.encode_prompt(text)
+        return self.engine.submit(prompt_ids, self.sampling_params(generation_kwargs))
+    
+    def sampling_params(self, generation_kwargs: Dict[str, Any]) -> SamplingParams:
+        """Resolve per-request generation parameters against the configured defaults"""
+        return SamplingParams(
+            max_new_tokens=int(generation_kwargs.get("max_new_tokens", self.config.max_new_tokens)),
+            temperature=float(generation_kwargs.get("temperature", self.config.temperature)),
+            top_p=float(generation_kwargs.get("top_p", self.config.top_p)),
+            do_sample=bool(generation_kwargs.get("do_sample", self.config.do_sample)),
+            prompt_lookup=bool(generation_kwargs.get("prompt_lookup", False)),
+        )
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return inference engine statistics"""
+        if self.engine is None:
+            return {}
+        metrics = self.engine.get_metrics()
+        metrics["sessions"] = self.sessions.get_stats()
+        if self.history is not None:
+            metrics["history"] = self.history.get_stats()
+        if self.compactor is not None:
+            metrics["compaction"] = self.compactor.get_stats()
+        if self.response_cache is not None:
+            metrics["response_cache"] = self.response_cache.get_stats()
+        if self.inflight is not None:
+            metrics["coalescing"] = self.inflight.get_stats()
+        if self.semantic_cache is not None:
+            metrics["semantic_cache"] = self.semantic_cache.get_stats()
+        return metrics
 
 class PriestessAPI:
     """RESTful API for Priestess AI"""
     
     def __init__(self, config: PriestessConfig):
         self.app = Flask(__name__)
+        self.app.wsgi_app = GzipRequestMiddleware(self.app.wsgi_app)
         self.priestess = PriestessCore(config)
         self.setup_routes()
         
@@ -440,6 +1341,29 @@ class PriestessAPI:
             return jsonify({
                 "status": "healthy",
                 "model_loaded": self.priestess.is_loaded,
+                "load": self.priestess.load_progress.to_dict(),
+                "timestamp": time.time()
+            })
+        
+        @self.app.route('/health/live', methods=['GET'])
+        def liveness():
+            """Liveness probe: the process is up and answering"""
+            return jsonify({"status": "alive", "timestamp": time.time()})
+        
+        @self.app.route('/health/ready', methods=['GET'])
+        def readiness():
+            """Readiness probe: the model is loaded and serving requests"""
+            load = self.priestess.load_progress.to_dict()
+            if not self.priestess.is_loaded:
+                return jsonify({"status": load["phase"], "load": load, "timestamp": time.time()}), 503
+            return jsonify({"status": "ready", "load": load, "timestamp": time.time()})
+        
+        @self.app.route('/metrics', methods=['GET'])
+        def metrics():
+            """Inference engine metrics endpoint"""
+            return jsonify({
+                "model_loaded": self.priestess.is_loaded,
+                "engine": self.priestess.get_metrics(),
                 "timestamp": time.time()
             })
         
@@ -482,17 +1406,124 @@ class PriestessAPI:
                 messages = data['messages']
                 generation_kwargs = data.get('generation_kwargs', {})
                 
+                if self.wants_stream(data):
+                    chunks, cache_status = self.priestess.stream_cached_response(messages, **generation_kwargs)
+                    return self.with_cache_status(self.stream_events(chunks), cache_status)
+                
                 # Generate response
-                response = self.priestess.generate_response(messages, **generation_kwargs)
+                response, cache_status = self.priestess.generate_cached_response(messages, **generation_kwargs)
+                
+                return self.with_cache_status(jsonify({
+                    "response": response,
+                    "status": "success",
+                    "timestamp": time.time()
+                }), cache_status)
+                
+            except AdmissionRejected as e:
+                return jsonify({"error": str(e)}), 413
+            except Exception as e:
+                logger.error(f"Chat endpoint error: {e}")
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/chat/batch', methods=['POST'])
+        def chat_batch():
+            """Batch chat endpoint, answering each item as an NDJSON line"""
+            try:
+                if not self.priestess.is_loaded:
+                    return jsonify({"error": "Model not loaded"}), 400
+                
+                data = request.get_json()
+                items = batch_items(data, self.priestess.config.max_batch_items, 'messages')
+                generation_kwargs = data.get('generation_kwargs', {})
+                
+                results = self.priestess.batch_responses([item['messages'] for item in items], **generation_kwargs)
+                return self.stream_batch(results, "response", [{} for _ in items])
+                
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            except Exception as e:
+                logger.error(f"Batch chat endpoint error: {e}")
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/sessions', methods=['POST'])
+        def create_session():
+            """Open a server-side chat session"""
+            try:
+                if not self.priestess.is_loaded:
+                    return jsonify({"error": "Model not loaded"}), 400
+                
+                data = request.get_json(silent=True) or {}
+                messages = list(data.get('messages', []))
+                if data.get('system'):
+                    messages.insert(0, {"role": "system", "content": data['system']})
+                
+                session = self.priestess.create_session(messages)
+                
+                return jsonify({
+                    "session_id": session.session_id,
+                    "status": "success",
+                    "timestamp": time.time()
+                })
+                
+            except SessionLimitError as e:
+                return jsonify({"error": str(e)}), 503
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/sessions/<session_id>', methods=['GET'])
+        def get_session(session_id):
+            """Show a session's conversation"""
+            try:
+                session = self.priestess.sessions.get(session_id)
+            except KeyError:
+                return jsonify({"error": "Unknown or expired session"}), 404
+            return jsonify({**session.to_dict(), "status": "success", "timestamp": time.time()})
+        
+        @self.app.route('/sessions/<session_id>', methods=['DELETE'])
+        def delete_session(session_id):
+            """Close a session and release its cached state"""
+            if not self.priestess.sessions.delete(session_id):
+                return jsonify({"error": "Unknown or expired session"}), 404
+            return jsonify({"status": "success", "timestamp": time.time()})
+        
+        @self.app.route('/sessions/<session_id>/messages', methods=['POST'])
+        def session_message(session_id):
+            """Send the next user turn of a session"""
+            try:
+                if not self.priestess.is_loaded:
+                    return jsonify({"error": "Model not loaded"}), 400
+                
+                data = request.get_json()
+                
+                # Validate input
+                if 'content' not in data:
+                    return jsonify({"error": "Missing 'content' field"}), 400
+                
+                try:
+                    session = self.priestess.sessions.get(session_id)
+                except KeyError:
+                    return jsonify({"error": "Unknown or expired session"}), 404
+                
+                content = data['content']
+                generation_kwargs = data.get('generation_kwargs', {})
+                
+                if self.wants_stream(data):
+                    chunks = self.priestess.stream_session_response(session, content, **generation_kwargs)
+                    return self.stream_events(chunks, session_id=session_id)
+                
+                response = self.priestess.session_response(session, content, **generation_kwargs)
                 
                 return jsonify({
                     "response": response,
+                    "session_id": session_id,
                     "status": "success",
                     "timestamp": time.time()
                 })
                 
+            except AdmissionRejected as e:
+                return jsonify({"error": str(e)}), 413
             except Exception as e:
-                logger.error(f"Chat endpoint error: {e}")
+                logger.error(f"Session endpoint error: {e}")
                 return jsonify({"error": str(e)}), 500
         
         @self.app.route('/cybersec', methods=['POST'])
@@ -507,26 +1538,28 @@ class PriestessAPI:
                 analysis_type = data.get('type', 'general')
                 
                 # Craft specialized cybersecurity prompt
-                system_prompt = f"""You are Priestess, an expert cybersecurity AI. 
-                Perform a {analysis_type} cybersecurity analysis. 
-                Provide detailed, actionable insights and recommendations.
-                Focus on practical security implications and mitigation strategies.
-                You have access to comprehensive cybersecurity knowledge including tools, techniques, and procedures."""
+                messages = cybersec_messages(query, analysis_type)
+                generation_kwargs = data.get('generation_kwargs', {})
                 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": query}
-                ]
+                if self.wants_stream(data):
+                    chunks, cache_status = self.priestess.stream_cached_response(
+                        messages, "cybersec", **generation_kwargs
+                    )
+                    return self.with_cache_status(self.stream_events(chunks, type=analysis_type), cache_status)
                 
-                response = self.priestess.generate_response(messages)
+                response, cache_status = self.priestess.generate_cached_response(
+                    messages, "cybersec", **generation_kwargs
+                )
                 
-                return jsonify({
+                return self.with_cache_status(jsonify({
                     "analysis": response,
                     "type": analysis_type,
                     "status": "success",
                     "timestamp": time.time()
-                })
+                }), cache_status)
                 
+            except AdmissionRejected as e:
+                return jsonify({"error": str(e)}), 413
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
@@ -541,32 +1574,28 @@ class PriestessAPI:
                 task = data.get('task', '')
                 context = data.get('context', '')
                 
-                system_prompt = """You are Priestess, an expert DevOps AI assistant.
-                Provide comprehensive DevOps solutions including:
-                - Infrastructure as Code
-                - CI/CD pipeline optimization
-                - Container orchestration
-                - Monitoring and observability
-                - Security best practices
-                - Automation strategies
-                You have access to extensive knowledge of tools, commands, and best practices."""
-                
-                user_prompt = f"Task: {task}\nContext: {context}"
+                messages = devops_messages(task, context)
+                generation_kwargs = {**QUOTING_ENDPOINT_DEFAULTS, **data.get('generation_kwargs', {})}
                 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
+                if self.wants_stream(data):
+                    chunks, cache_status = self.priestess.stream_cached_response(
+                        messages, "devops", **generation_kwargs
+                    )
+                    return self.with_cache_status(self.stream_events(chunks, task=task), cache_status)
                 
-                response = self.priestess.generate_response(messages)
+                response, cache_status = self.priestess.generate_cached_response(
+                    messages, "devops", **generation_kwargs
+                )
                 
-                return jsonify({
+                return self.with_cache_status(jsonify({
                     "solution": response,
                     "task": task,
                     "status": "success",
                     "timestamp": time.time()
-                })
+                }), cache_status)
                 
+            except AdmissionRejected as e:
+                return jsonify({"error": str(e)}), 413
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
@@ -581,107 +1610,248 @@ class PriestessAPI:
                 code = data.get('code', '')
                 language = data.get('language', 'unknown')
                 
-                system_prompt = """You are Priestess, an expert code security analyst.
-                Analyze the provided code for:
-                - Security vulnerabilities
-                - Best practice violations
-                - Performance issues
-                - Potential exploits
-                Provide specific recommendations and secure code alternatives.
-                Use your extensive knowledge of security patterns and anti-patterns."""
+                messages = code_analysis_messages(code, language)
+                generation_kwargs = {**QUOTING_ENDPOINT_DEFAULTS, **data.get('generation_kwargs', {})}
                 
-                user_prompt = f"Analyze this {language} code:\n\n```{language}\n{code}\n```"
+                if self.wants_stream(data):
+                    chunks, cache_status = self.priestess.stream_cached_response(
+                        messages, "code-analysis", **generation_kwargs
+                    )
+                    return self.with_cache_status(self.stream_events(chunks, language=language), cache_status)
                 
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ]
-                
-                response = self.priestess.generate_response(messages)
+                response, cache_status = self.priestess.generate_cached_response(
+                    messages, "code-analysis", **generation_kwargs
+                )
                 
-                return jsonify({
+                return self.with_cache_status(jsonify({
                     "analysis": response,
                     "language": language,
                     "status": "success",
                     "timestamp": time.time()
-                })
+                }), cache_status)
+                
+            except AdmissionRejected as e:
+                return jsonify({"error": str(e)}), 413
+            except Exception as e:
+                return jsonify({"error": str(e)}), 500
+        
+        @self.app.route('/code-analysis/batch', methods=['POST'])
+        def code_analysis_batch():
+            """Batch code security analysis endpoint, answering each file as an NDJSON line"""
+            try:
+                if not self.priestess.is_loaded:
+                    return jsonify({"error": "Model not loaded"}), 400
+                
+                data = request.get_json()
+                items = batch_items(data, self.priestess.config.max_batch_items, 'code')
+                fields = [{"language": item.get('language', 'unknown')} for item in items]
+                conversations = [
+                    code_analysis_messages(item['code'], f["language"]) for item, f in zip(items, fields)
+                ]
+                generation_kwargs = {**QUOTING_ENDPOINT_DEFAULTS, **data.get('generation_kwargs', {})}
+                
+                results = self.priestess.batch_responses(conversations, "code-analysis", **generation_kwargs)
+                return self.stream_batch(results, "analysis", fields)
                 
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
     
+    def wants_stream(self, data: Dict) -> bool:
+        """Check whether the caller asked for a server-sent-events response"""
+        if data.get('stream'):
+            return True
+        return 'text/event-stream' in request.headers.get('Accept', '')
+    
+    def with_cache_status(self, response: Response, cache_status: str) -> Response:
+        """Tell the client whether the response came from the response cache"""
+        response.headers["X-Cache"] = cache_status
+        return response
+    
+    def stream_events(self, chunks: Iterator[str], **fields) -> Response:
+        """Stream generated text to the client as server-sent events
+        
+        Each event carries a JSON object: {"delta": "..."} for new text, then a
+        final {"done": true, ...} with the endpoint's metadata fields, or
+        {"error": "..."} if generation fails part way.
+        """
+        def events():
+            # An SSE comment sends the headers now rather than with the first
+            # token, so a client can abort the stream (e.g. a losing hedged
+            # request) before anything is generated
+            yield ": stream open\n\n"
+            try:
+                for text in chunks:
+                    yield f"data: {json.dumps({'delta': text})}\n\n"
+                done = {"done": True, **fields, "status": "success", "timestamp": time.time()}
+                yield f"data: {json.dumps(done)}\n\n"
+            except Exception as e:
+                logger.error(f"Streaming endpoint error: {e}")
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            finally:
+                # Stops generation when the client disconnects mid-stream
+                if hasattr(chunks, "close"):
+                    chunks.close()
+        
+        return Response(
+            events(),
+            mimetype='text/event-stream',
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    
+    def stream_batch(
+        self,
+        results: Iterator[Tuple[int, Optional[str], str, Optional[Exception]]],
+        result_key: str,
+        fields: List[Dict[str, Any]]
+    ) -> Response:
+        """Stream batch results to the client as newline-delimited JSON
+        
+        Items arrive in completion order, each line carrying the item's
+        "index" and either its result or an "error". A final
+        {"done": true, ...} line counts the items and failures.
+        """
+        def lines():
+            failed = 0
+            try:
+                for result in results:
+                    record = batch_record(result, result_key, fields[result[0]])
+                    failed += "error" in record
+                    yield json.dumps(record) + "\n"
+                done = {"done": True, "items": len(fields), "failed": failed, "status": "success",
+                        "timestamp": time.time()}
+                yield json.dumps(done) + "\n"
+            except Exception as e:
+                logger.error(f"Batch endpoint error: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+            finally:
+                # Stops the remaining items when the client disconnects
+                results.close()
+        
+        return Response(lines(), mimetype='application/x-ndjson', headers={"X-Accel-Buffering": "no"})
+    
     def run(self, host='0.0.0.0', port=5000, debug=False):
         """Run the API server"""
         logger.info(f"Starting Priestess API on {host}:{port}")
         self.app.run(host=host, port=port, debug=debug)
+    
+    def make_server(self, host='0.0.0.0', port=5000):
+        """Bind a threaded server for the API; it accepts connections as soon as this returns"""
+        from werkzeug.serving import make_server
+        logger.info(f"Starting Priestess API on {host}:{port}")
+        return make_server(host, port, self.app, threaded=True)
 
-class PriestessClient:
-    """Client for interacting with Priestess API"""
+class PriestessLocalClient:
+    """PriestessClient counterpart that calls PriestessCore in this process
+    
+    No HTTP is involved: requests are queued straight on the engine and
+    streamed text comes straight from its token stream.
+    """
+    
+    def __init__(self, core: PriestessCore):
+        self.core = core
     
-    def __init__(self, base_url: str = "http://localhost:5000"):
-        self.base_url = base_url.rstrip('/')
-        
     def health_check(self) -> Dict:
-        """Check API health"""
-        import requests
-        response = requests.get(f"{self.base_url}/health")
-        return response.json()
+        """Check model health"""
+        return {
+            "status": "healthy",
+            "model_loaded": self.core.is_loaded,
+            "load": self.core.load_progress.to_dict(),
+            "timestamp": time.time()
+        }
     
     def load_model(self) -> Dict:
         """Load the model"""
-        import requests
-        response = requests.post(f"{self.base_url}/load")
-        return response.json()
+        self.core.load_model()
+        return {"status": "success", "message": "Model loaded successfully"}
     
     def get_secrets(self) -> str:
         """Get Priestess secret knowledge"""
-        import requests
-        response = requests.get(f"{self.base_url}/secrets")
-        result = response.json()
-        return result.get("secrets", "")
+        return self.core.secrets.get_secret_knowledge()
     
     def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
-        """Send chat request"""
-        import requests
-        data = {
-            "messages": messages,
-            "generation_kwargs": kwargs
-        }
-        response = requests.post(f"{self.base_url}/chat", json=data)
-        result = response.json()
-        return result.get("response", "")
+        """Generate a chat response"""
+        return self.core.generate_response(messages, **kwargs)
+    
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Generate a chat response, yielding text as it is generated"""
+        return self.stream(messages, None, kwargs)
+    
+    def chat_batch(self, conversations: List[List[Dict[str, str]]], **kwargs) -> Iterator[Dict]:
+        """Generate many chat responses, yielding each result as it finishes"""
+        for result in self.core.batch_responses(conversations, **kwargs):
+            yield batch_record(result, "response", {})
     
-    def cybersec_analysis(self, query: str, analysis_type: str = "general") -> str:
+    def create_session(self, system_prompt: Optional[str] = None) -> str:
+        """Open a chat session and return its id"""
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        return self.core.create_session(messages).session_id
+    
+    def send_message(self, session_id: str, content: str, **kwargs) -> str:
+        """Send the next user turn of a session"""
+        return self.core.session_response(self.session(session_id), content, **kwargs)
+    
+    def send_message_stream(self, session_id: str, content: str, **kwargs) -> Iterator[str]:
+        """Send the next user turn of a session, yielding the reply as it is generated"""
+        return self.core.stream_session_response(self.session(session_id), content, **kwargs)
+    
+    def delete_session(self, session_id: str) -> Dict:
+        """Close a session"""
+        if not self.core.sessions.delete(session_id):
+            return {"error": "Unknown or expired session"}
+        return {"status": "success", "timestamp": time.time()}
+    
+    def cybersec_analysis(self, query: str, analysis_type: str = "general", **kwargs) -> str:
         """Request cybersecurity analysis"""
-        import requests
-        data = {
-            "query": query,
-            "type": analysis_type
-        }
-        response = requests.post(f"{self.base_url}/cybersec", json=data)
-        result = response.json()
-        return result.get("analysis", "")
+        response, _ = self.core.generate_cached_response(cybersec_messages(query, analysis_type), "cybersec", **kwargs)
+        return response
     
-    def devops_assistance(self, task: str, context: str = "") -> str:
+    def cybersec_analysis_stream(self, query: str, analysis_type: str = "general", **kwargs) -> Iterator[str]:
+        """Request cybersecurity analysis, yielding text as it is generated"""
+        return self.stream(cybersec_messages(query, analysis_type), "cybersec", kwargs)
+    
+    def devops_assistance(self, task: str, context: str = "", **kwargs) -> str:
         """Request DevOps assistance"""
-        import requests
-        data = {
-            "task": task,
-            "context": context
-        }
-        response = requests.post(f"{self.base_url}/devops", json=data)
-        result = response.json()
-        return result.get("solution", "")
+        response, _ = self.core.generate_cached_response(
+            devops_messages(task, context), "devops", **{**QUOTING_ENDPOINT_DEFAULTS, **kwargs}
+        )
+        return response
+    
+    def devops_assistance_stream(self, task: str, context: str = "", **kwargs) -> Iterator[str]:
+        """Request DevOps assistance, yielding text as it is generated"""
+        return self.stream(devops_messages(task, context), "devops", {**QUOTING_ENDPOINT_DEFAULTS, **kwargs})
     
-    def analyze_code(self, code: str, language: str = "unknown") -> str:
+    def analyze_code(self, code: str, language: str = "unknown", **kwargs) -> str:
         """Analyze code for security issues"""
-        import requests
-        data = {
-            "code": code,
-            "language": language
-        }
-        response = requests.post(f"{self.base_url}/code-analysis", json=data)
-        result = response.json()
-        return result.get("analysis", "")
+        response, _ = self.core.generate_cached_response(
+            code_analysis_messages(code, language), "code-analysis", **{**QUOTING_ENDPOINT_DEFAULTS, **kwargs}
+        )
+        return response
+    
+    def analyze_code_stream(self, code: str, language: str = "unknown", **kwargs) -> Iterator[str]:
+        """Analyze code for security issues, yielding text as it is generated"""
+        return self.stream(
+            code_analysis_messages(code, language), "code-analysis", {**QUOTING_ENDPOINT_DEFAULTS, **kwargs}
+        )
+    
+    def analyze_code_batch(self, files: List[Dict[str, str]], **kwargs) -> Iterator[Dict]:
+        """Analyze many pieces of code, yielding each result as it finishes"""
+        fields = [{"language": f.get("language", "unknown")} for f in files]
+        conversations = [code_analysis_messages(f["code"], field["language"]) for f, field in zip(files, fields)]
+        results = self.core.batch_responses(conversations, "code-analysis", **{**QUOTING_ENDPOINT_DEFAULTS, **kwargs})
+        for result in results:
+            yield batch_record(result, "analysis", fields[result[0]])
+    
+    def stream(self, messages: List[Dict[str, str]], endpoint: Optional[str], kwargs: Dict) -> Iterator[str]:
+        chunks, _ = self.core.stream_cached_response(messages, endpoint, **kwargs)
+        return chunks
+    
+    def session(self, session_id: str) -> ChatSession:
+        try:
+            return self.core.sessions.get(session_id)
+        except KeyError:
+            raise RuntimeError("Unknown or expired session")
 
 # Example usage and CLI interface
 def main():
@@ -694,22 +1864,86 @@ def main():
     parser.add_argument("--port", type=int, default=5000, help="Port to bind to")
     parser.add_argument("--debug", action="store_true", help="Enable debug mode")
     parser.add_argument("--auto-load", action="store_true", help="Auto-load model on startup")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Inference processes, each pinned to its own slice of CPU cores")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="Torch threads per worker (defaults to its core count)")
+    parser.add_argument("--draft-model", default=None,
+                        help="Small model sharing the tokenizer, for speculative decoding")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default="none",
+                        help="Quantize the model's linear layers for CPU inference")
+    parser.add_argument("--kv-cache-dtype", choices=KV_CACHE_DTYPES, default="auto",
+                        help="Store the KV cache in 8 bits to fit more concurrent sessions")
+    parser.add_argument("--kv-budget-gb", type=float, default=None,
+                        help="Queue requests once their worst-case KV cache would exceed this many GiB")
+    parser.add_argument("--max-prompt-tokens", type=int, default=8192,
+                        help="Token budget for conversation history in each prompt; 0 disables windowing")
+    parser.add_argument("--history-compaction", action="store_true",
+                        help="Summarize the older turns of long sessions in the background")
+    parser.add_argument("--compaction-threshold", type=int, default=4096,
+                        help="Session history tokens that trigger a summary of the older turns")
+    parser.add_argument("--response-cache-mb", type=int, default=64,
+                        help="Memory for cached answers to repeated deterministic requests; 0 disables")
+    parser.add_argument("--response-cache-ttl", type=float, default=3600.0,
+                        help="Seconds a cached response stays valid")
+    parser.add_argument("--response-cache-disk", action="store_true",
+                        help="Also keep cached responses on disk, across restarts")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="Answer near-duplicate /cybersec and /devops queries from earlier answers")
+    parser.add_argument("--semantic-threshold", type=float, default=0.92,
+                        help="Cosine similarity of query embeddings needed for a semantic cache hit")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="Serve with the asyncio (ASGI) server instead of Flask")
+    parser.add_argument("--max-in-flight", type=int, default=32,
+                        help="Async mode: requests generating at once before others queue")
+    parser.add_argument("--max-queued", type=int, default=64,
+                        help="Async mode: queued requests before new ones get 429")
+    parser.add_argument("--queue-timeout", type=float, default=30.0,
+                        help="Async mode: seconds a request may queue before it gets 503")
     
     args = parser.parse_args()
     
     # Create configuration
-    config = PriestessConfig(model_path=args.model_path)
+    config = PriestessConfig(
+        model_path=args.model_path,
+        num_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        draft_model_path=args.draft_model,
+        quantization=args.quantization,
+        kv_cache_dtype=args.kv_cache_dtype,
+        kv_memory_budget=int(args.kv_budget_gb * 2 ** 30) if args.kv_budget_gb else None,
+        max_prompt_tokens=args.max_prompt_tokens,
+        history_compaction=args.history_compaction,
+        compaction_threshold=args.compaction_threshold,
+        response_cache_bytes=args.response_cache_mb * 1024 ** 2,
+        response_cache_ttl=args.response_cache_ttl,
+        response_cache_disk=args.response_cache_disk,
+        semantic_cache=args.semantic_cache,
+        semantic_cache_threshold=args.semantic_threshold
+    )
     
     # Create and start API
     api = PriestessAPI(config)
     
     # Auto-load model if requested
     if args.auto_load:
+        # Load in the background so liveness and load progress are reported meanwhile
         logger.info("Auto-loading model...")
-        api.priestess.load_model()
+        api.priestess.load_model_async()
     
     # Start server
-    api.run(host=args.host, port=args.port, debug=args.debug)
+    if args.async_mode:
+        from priestess_asgi import run_asgi
+        run_asgi(
+            api.priestess,
+            host=args.host,
+            port=args.port,
+            max_in_flight=args.max_in_flight,
+            max_queued=args.max_queued,
+            queue_timeout=args.queue_timeout
+        )
+    else:
+        api.run(host=args.host, port=args.port, debug=args.debug)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,670 @@
+"""
+Priestess AI ASGI Server - Asyncio serving mode with bounded concurrency
+Non-blocking handlers await engine futures, and load beyond the configured
+limits is rejected immediately with 429/503 and a Retry-After hint
+"""
+
+import asyncio
+import json
+import logging
+import math
+import re
+import time
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from priestess_admission import AdmissionRejected
+from priestess_api import (
+    QUOTING_ENDPOINT_DEFAULTS,
+    PriestessCore,
+    batch_items,
+    batch_record,
+    code_analysis_messages,
+    cybersec_messages,
+    devops_messages,
+    gunzip_body,
+)
+from priestess_engine import GenerationRequest, IncrementalDetokenizer
+from priestess_response_cache import CACHE_BYPASS
+from priestess_sessions import SessionLimitError
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """A request that cannot be admitted, with the status and Retry-After to return"""
+
+    def __init__(self, status: int, message: str, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """Caps the number of requests in flight and the number waiting for a slot
+
+    Requests beyond `max_in_flight` wait up to `queue_timeout` seconds for a
+    slot; once `max_queued` are already waiting, new arrivals are rejected at
+    once instead of piling up until the proxy times out.
+    """
+
+    def __init__(self, max_in_flight: int = 32, max_queued: int = 64, queue_timeout: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Moving average of how long a request holds its slot
+        self.avg_service_time = 1.0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new arrival"""
+        waves = (self.queued + 1) / max(1, self.max_in_flight)
+        return max(1, min(300, math.ceil(waves * self.avg_service_time)))
+
+    async def acquire(self):
+        if self._slots is None:
+            # Created lazily so it binds to the server's event loop
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        if self._slots.locked():
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise Overloaded(429, "Too many requests queued", self.retry_after())
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Overloaded(503, "Timed out waiting for capacity", self.retry_after())
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, service_time: float):
+        self.in_flight -= 1
+        self.avg_service_time = 0.9 * self.avg_service_time + 0.1 * service_time
+        self._slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_service_time": self.avg_service_time,
+        }
+
+
+class HTTPRequest:
+    """The parts of an ASGI HTTP request the handlers need"""
+
+    def __init__(self, scope: Dict, body: bytes, receive: Callable[[], Awaitable[Dict]]):
+        self.scope = scope
+        self.body = body
+        self.receive = receive
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+    def json(self) -> Dict:
+        if not self.body:
+            return {}
+        return json.loads(self.body)
+
+    async def wait_disconnect(self):
+        """Return once the client has gone away"""
+        while True:
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                return
+
+
+class PriestessASGI:
+    """ASGI application exposing the same endpoints as PriestessAPI"""
+
+    def __init__(self, core: PriestessCore, max_in_flight: int = 32, max_queued: int = 64, queue_timeout: float = 30.0):
+        self.priestess = core
+        self.gate = ConcurrencyGate(max_in_flight, max_queued, queue_timeout)
+        self.routes: List[Tuple[str, "re.Pattern", Callable]] = []
+        self.setup_routes()
+
+    def setup_routes(self):
+        """Setup API routes"""
+        self.add_route("GET", "/health", self.health_check)
+        self.add_route("GET", "/health/live", self.liveness)
+        self.add_route("GET", "/health/ready", self.readiness)
+        self.add_route("GET", "/metrics", self.metrics)
+        self.add_route("POST", "/load", self.load_model)
+        self.add_route("GET", "/secrets", self.get_secrets)
+        self.add_route("POST", "/chat", self.chat)
+        self.add_route("POST", "/chat/batch", self.chat_batch)
+        self.add_route("POST", "/sessions", self.create_session)
+        self.add_route("GET", "/sessions/<session_id>", self.get_session)
+        self.add_route("DELETE", "/sessions/<session_id>", self.delete_session)
+        self.add_route("POST", "/sessions/<session_id>/messages", self.session_message)
+        self.add_route("POST", "/cybersec", self.cybersecurity_analysis)
+        self.add_route("POST", "/devops", self.devops_assistance)
+        self.add_route("POST", "/code-analysis", self.code_analysis)
+        self.add_route("POST", "/code-analysis/batch", self.code_analysis_batch)
+
+    def add_route(self, method: str, path: str, handler: Callable):
+        pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", path) + "$")
+        self.routes.append((method, pattern, handler))
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        handler, params = None, {}
+        path_matched = False
+        for method, pattern, route_handler in self.routes:
+            match = pattern.match(scope["path"])
+            if match:
+                path_matched = True
+                if method == scope["method"]:
+                    handler, params = route_handler, match.groupdict()
+                    break
+        if handler is None:
+            status = 405 if path_matched else 404
+            await self.send_json(send, status, {"error": "Method not allowed" if path_matched else "Not found"})
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        req = HTTPRequest(scope, body, receive)
+        if req.headers.get("content-encoding", "").lower() == "gzip":
+            try:
+                req.body = gunzip_body(body)
+            except ValueError as e:
+                await self.send_json(send, 400, {"error": str(e)})
+                return
+
+        try:
+            await handler(req, send, **params)
+        except Overloaded as e:
+            await self.send_json(send, e.status, {"error": str(e)}, [("retry-after", str(e.retry_after))])
+        except AdmissionRejected as e:
+            await self.send_json(send, 413, {"error": str(e)})
+        except json.JSONDecodeError:
+            await self.send_json(send, 400, {"error": "Invalid JSON body"})
+        except Exception as e:
+            logger.error(f"Endpoint error on {scope['path']}: {e}")
+            await self.send_json(send, 500, {"error": str(e)})
+
+    async def lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ------------------------------------------------------------------
+    # Response helpers
+    # ------------------------------------------------------------------
+
+    async def send_json(self, send: Callable, status: int, payload: Dict, headers: Optional[List] = None):
+        body = json.dumps(payload).encode()
+        response_headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        response_headers += [(k.encode(), v.encode()) for k, v in (headers or [])]
+        await send({"type": "http.response.start", "status": status, "headers": response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def start_events(self, send: Callable, headers: Optional[List] = None):
+        response_headers = [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]
+        response_headers += [(k.encode(), v.encode()) for k, v in (headers or [])]
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+
+    async def send_event(self, send: Callable, payload: Dict, more_body: bool = True):
+        data = f"data: {json.dumps(payload)}\n\n".encode()
+        await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    async def send_text(self, send: Callable, stream: bool, text: str, result_key: str, fields: Dict,
+                        headers: Optional[List] = None):
+        """Answer with an already known response, as JSON or as a single event"""
+        if stream:
+            await self.start_events(send, headers)
+            await self.send_event(send, {"delta": text})
+            await self.send_event(send, {"done": True, **fields, "status": "success", "timestamp": time.time()}, False)
+        else:
+            await self.send_json(send, 200, {result_key: text, **fields, "status": "success", "timestamp": time.time()},
+                                 headers)
+
+    async def send_line(self, send: Callable, payload: Dict, more_body: bool = True):
+        data = (json.dumps(payload) + "\n").encode()
+        await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def wants_stream(self, req: HTTPRequest, data: Dict) -> bool:
+        """Check whether the caller asked for a server-sent-events response"""
+        if data.get("stream"):
+            return True
+        return "text/event-stream" in req.headers.get("accept", "")
+
+    def require_loaded(self):
+        if not self.priestess.is_loaded:
+            raise Overloaded(503, "Model not loaded", 30)
+
+    # ------------------------------------------------------------------
+    # Generation
+    # ------------------------------------------------------------------
+
+    async def generate(
+        self,
+        req: HTTPRequest,
+        send: Callable,
+        messages: List[Dict[str, str]],
+        data: Dict,
+        result_key: str,
+        defaults: Optional[Dict[str, Any]] = None,
+        endpoint: Optional[str] = None,
+        **fields
+    ):
+        """Run a stateless generation, answering with JSON or server-sent events"""
+        self.require_loaded()
+        generation_kwargs = {**(defaults or {}), **data.get("generation_kwargs", {})}
+        stream = self.wants_stream(req, data)
+
+        secrets = self.priestess.check_secret_request(messages)
+        if secrets is not None:
+            await self.send_text(send, stream, secrets, result_key, fields, [("x-cache", CACHE_BYPASS)])
+            return
+
+        loop = asyncio.get_running_loop()
+        # Lookups may read from disk or embed the query, so they run off the event loop
+        lookup = await loop.run_in_executor(None, self.priestess.check_caches, messages, generation_kwargs, endpoint)
+        cache_headers = [("x-cache", lookup.status)]
+        if lookup.response is not None:
+            await self.send_text(send, stream, lookup.response, result_key, fields, cache_headers)
+            return
+
+        await self.gate.acquire()
+        started = time.monotonic()
+        request: Optional[GenerationRequest] = None
+        watcher = None
+        try:
+            # Chat templating and tokenization run off the event loop; identical
+            # requests in flight share one generation
+            request = await loop.run_in_executor(
+                None, partial(self.priestess.submit_shared, messages, lookup.key, **generation_kwargs)
+            )
+            watcher = self.cancel_on_disconnect(req, request)
+
+            if stream:
+                response = await self.stream_tokens(send, request, fields, cache_headers)
+            else:
+                generated_ids = await self.wait_request(request)
+                if generated_ids is None:
+                    # Client disconnected; nobody is left to answer
+                    return
+                response = self.priestess.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+                await self.send_json(send, 200, {
+                    result_key: response,
+                    **fields,
+                    "status": "success",
+                    "timestamp": time.time()
+                }, cache_headers)
+            # A cancelled stream ends early without an error; only complete answers are cached
+            if response is not None and not request.cancelled:
+                self.priestess.remember_response(lookup, response)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if request is not None:
+                request.cancel()
+            self.gate.release(time.monotonic() - started)
+
+    def cancel_on_disconnect(self, req: HTTPRequest, request: GenerationRequest) -> "asyncio.Future":
+        """Watch for the client going away and drop its request when it does"""
+        watcher = asyncio.ensure_future(req.wait_disconnect())
+        watcher.add_done_callback(lambda _: request.cancel())
+        return watcher
+
+    async def wait_request(self, request: GenerationRequest) -> Optional[List[int]]:
+        """Await a request's token ids; None if it was cancelled"""
+        done = asyncio.wrap_future(request.future)
+        # Waiting rather than awaiting the future keeps its cancellation apart
+        # from this task's own, which must propagate
+        await asyncio.wait([done])
+        if request.cancelled:
+            return None
+        return done.result()
+
+    async def stream_tokens(
+        self, send: Callable, request: GenerationRequest, fields: Dict, headers: Optional[List] = None
+    ) -> Optional[str]:
+        """Stream a request as server-sent events; returns its full text, or None if it failed"""
+        await self.start_events(send, headers)
+        detokenizer = IncrementalDetokenizer(self.priestess.tokenizer)
+        parts = []
+        try:
+            async for token_ids in request.aiter_tokens():
+                text = detokenizer.push(token_ids)
+                if text:
+                    parts.append(text)
+                    await self.send_event(send, {"delta": text})
+            text = detokenizer.flush()
+            if text:
+                parts.append(text)
+                await self.send_event(send, {"delta": text})
+            await self.send_event(send, {"done": True, **fields, "status": "success", "timestamp": time.time()}, False)
+        except Exception as e:
+            logger.error(f"Streaming endpoint error: {e}")
+            await self.send_event(send, {"error": str(e)}, False)
+            return None
+        return "".join(parts).strip()
+
+    async def run_batch(
+        self,
+        req: HTTPRequest,
+        send: Callable,
+        conversations: List[List[Dict[str, str]]],
+        data: Dict,
+        result_key: str,
+        fields: List[Dict],
+        defaults: Optional[Dict[str, Any]] = None,
+        endpoint: Optional[str] = None
+    ):
+        """Run a batch of stateless generations, answering each item as an NDJSON line
+
+        Items are prepared off the event loop, then queued and awaited here, a
+        window at a time, so no thread waits on generation.
+        """
+        self.require_loaded()
+        generation_kwargs = {**(defaults or {}), **data.get("generation_kwargs", {})}
+        loop = asyncio.get_running_loop()
+
+        # The whole batch holds one slot; the engine interleaves its items itself
+        await self.gate.acquire()
+        started = time.monotonic()
+        disconnected = asyncio.ensure_future(req.wait_disconnect())
+        running: Dict["asyncio.Future", Tuple[int, Any, GenerationRequest]] = {}
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"application/x-ndjson"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            failed = 0
+            try:
+                answered, queued = await loop.run_in_executor(
+                    None, partial(self.priestess.prepare_batch, conversations, endpoint, **generation_kwargs)
+                )
+                params = self.priestess.sampling_params(generation_kwargs)
+                for result in answered:
+                    record = batch_record(result, result_key, fields[result[0]])
+                    failed += "error" in record
+                    await self.send_line(send, record)
+
+                queued = iter(queued)
+                while not disconnected.done():
+                    finished = []
+                    for index, lookup, prompt_ids in queued:
+                        try:
+                            request = self.priestess.submit_batch_item(lookup, prompt_ids, params)
+                        except Exception as e:
+                            finished.append((index, None, lookup.status, e))
+                            continue
+                        running[asyncio.wrap_future(request.future)] = (index, lookup, request)
+                        if len(running) >= self.priestess.batch_window:
+                            break
+                    if not running and not finished:
+                        break
+                    if not finished:
+                        done, _ = await asyncio.wait([*running, disconnected], return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            if future is not disconnected:
+                                index, lookup, request = running.pop(future)
+                                finished.append(self.priestess.finish_batch_item(index, lookup, request.future))
+                    for result in finished:
+                        record = batch_record(result, result_key, fields[result[0]])
+                        failed += "error" in record
+                        await self.send_line(send, record)
+                if not disconnected.done():
+                    await self.send_line(send, {
+                        "done": True,
+                        "items": len(fields),
+                        "failed": failed,
+                        "status": "success",
+                        "timestamp": time.time()
+                    }, False)
+            except Exception as e:
+                logger.error(f"Batch endpoint error: {e}")
+                if not disconnected.done():
+                    await self.send_line(send, {"error": str(e)}, False)
+        finally:
+            disconnected.cancel()
+            # Cancels whatever is still generating
+            for _, _, request in running.values():
+                request.cancel()
+            self.gate.release(time.monotonic() - started)
+
+    async def run_session_turn(self, req: HTTPRequest, send: Callable, session, data: Dict):
+        """Run a session turn, awaiting its generation like a stateless request"""
+        generation_kwargs = data.get("generation_kwargs", {})
+        content = data["content"]
+        stream = self.wants_stream(req, data)
+        fields = {"session_id": session.session_id}
+        loop = asyncio.get_running_loop()
+
+        await self.gate.acquire()
+        started = time.monotonic()
+        try:
+            async with self.priestess.sessions.aturn(session):
+                # Templating and tokenizing the new turn runs off the event loop
+                begin = loop.run_in_executor(
+                    None, partial(self.priestess.begin_session_turn, session, content, **generation_kwargs)
+                )
+                try:
+                    request, answer = await asyncio.shield(begin)
+                except asyncio.CancelledError:
+                    # Let the turn finish being queued so it can be undone
+                    await asyncio.wait([begin])
+                    if not begin.cancelled() and begin.exception() is None and begin.result()[0] is not None:
+                        self.priestess.rollback_session_turn(session, begin.result()[0])
+                    raise
+                if request is None:
+                    await self.send_text(send, stream, answer, "response", fields)
+                    return
+
+                watcher = self.cancel_on_disconnect(req, request)
+                try:
+                    if stream:
+                        response = await self.stream_tokens(send, request, fields)
+                    else:
+                        generated_ids = await self.wait_request(request)
+                        response = None
+                        if generated_ids is not None:
+                            response = self.priestess.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+                except BaseException:
+                    self.priestess.rollback_session_turn(session, request)
+                    raise
+                finally:
+                    watcher.cancel()
+
+                # Failed and abandoned turns leave the session as it was
+                if response is None or request.cancelled:
+                    self.priestess.rollback_session_turn(session, request)
+                    return
+                self.priestess.finish_session_turn(session, request, response)
+                if not stream:
+                    await self.send_json(send, 200, {
+                        "response": response,
+                        **fields,
+                        "status": "success",
+                        "timestamp": time.time()
+                    })
+        finally:
+            self.gate.release(time.monotonic() - started)
+
+    # ------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------
+
+    async def health_check(self, req: HTTPRequest, send: Callable):
+        await self.send_json(send, 200, {
+            "status": "healthy",
+            "model_loaded": self.priestess.is_loaded,
+            "load": self.priestess.load_progress.to_dict(),
+            "timestamp": time.time()
+        })
+
+    async def liveness(self, req: HTTPRequest, send: Callable):
+        await self.send_json(send, 200, {"status": "alive", "timestamp": time.time()})
+
+    async def readiness(self, req: HTTPRequest, send: Callable):
+        load = self.priestess.load_progress.to_dict()
+        if not self.priestess.is_loaded:
+            await self.send_json(send, 503, {"status": load["phase"], "load": load, "timestamp": time.time()},
+                                 [("retry-after", "5")])
+            return
+        await self.send_json(send, 200, {"status": "ready", "load": load, "timestamp": time.time()})
+
+    async def metrics(self, req: HTTPRequest, send: Callable):
+        await self.send_json(send, 200, {
+            "model_loaded": self.priestess.is_loaded,
+            "engine": self.priestess.get_metrics(),
+            "server": self.gate.get_stats(),
+            "timestamp": time.time()
+        })
+
+    async def load_model(self, req: HTTPRequest, send: Callable):
+        try:
+            if not self.priestess.is_loaded:
+                await asyncio.get_running_loop().run_in_executor(None, self.priestess.load_model)
+            await self.send_json(send, 200, {"status": "success", "message": "Model loaded successfully"})
+        except Exception as e:
+            await self.send_json(send, 500, {"status": "error", "message": str(e)})
+
+    async def get_secrets(self, req: HTTPRequest, send: Callable):
+        await self.send_json(send, 200, {
+            "secrets": self.priestess.secrets.get_secret_knowledge(),
+            "status": "success",
+            "timestamp": time.time()
+        })
+
+    async def chat(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        if "messages" not in data:
+            await self.send_json(send, 400, {"error": "Missing 'messages' field"})
+            return
+        await self.generate(req, send, data["messages"], data, "response")
+
+    async def chat_batch(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        try:
+            items = batch_items(data, self.priestess.config.max_batch_items, "messages")
+        except ValueError as e:
+            await self.send_json(send, 400, {"error": str(e)})
+            return
+        conversations = [item["messages"] for item in items]
+        await self.run_batch(req, send, conversations, data, "response", [{} for _ in items])
+
+    async def cybersecurity_analysis(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        analysis_type = data.get("type", "general")
+        messages = cybersec_messages(data.get("query", ""), analysis_type)
+        await self.generate(req, send, messages, data, "analysis", endpoint="cybersec", type=analysis_type)
+
+    async def devops_assistance(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        task = data.get("task", "")
+        messages = devops_messages(task, data.get("context", ""))
+        await self.generate(req, send, messages, data, "solution", QUOTING_ENDPOINT_DEFAULTS, "devops", task=task)
+
+    async def code_analysis(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        language = data.get("language", "unknown")
+        messages = code_analysis_messages(data.get("code", ""), language)
+        await self.generate(req, send, messages, data, "analysis", QUOTING_ENDPOINT_DEFAULTS, "code-analysis",
+                            language=language)
+
+    async def code_analysis_batch(self, req: HTTPRequest, send: Callable):
+        data = req.json()
+        try:
+            items = batch_items(data, self.priestess.config.max_batch_items, "code")
+        except ValueError as e:
+            await self.send_json(send, 400, {"error": str(e)})
+            return
+        fields = [{"language": item.get("language", "unknown")} for item in items]
+        conversations = [code_analysis_messages(item["code"], f["language"]) for item, f in zip(items, fields)]
+        await self.run_batch(req, send, conversations, data, "analysis", fields, QUOTING_ENDPOINT_DEFAULTS,
+                             "code-analysis")
+
+    async def create_session(self, req: HTTPRequest, send: Callable):
+        self.require_loaded()
+        data = req.json()
+        messages = list(data.get("messages", []))
+        if data.get("system"):
+            messages.insert(0, {"role": "system", "content": data["system"]})
+        try:
+            session = self.priestess.create_session(messages)
+        except SessionLimitError as e:
+            raise Overloaded(503, str(e), self.gate.retry_after())
+        await self.send_json(send, 200, {
+            "session_id": session.session_id,
+            "status": "success",
+            "timestamp": time.time()
+        })
+
+    async def get_session(self, req: HTTPRequest, send: Callable, session_id: str):
+        try:
+            session = self.priestess.sessions.get(session_id)
+        except KeyError:
+            await self.send_json(send, 404, {"error": "Unknown or expired session"})
+            return
+        await self.send_json(send, 200, {**session.to_dict(), "status": "success", "timestamp": time.time()})
+
+    async def delete_session(self, req: HTTPRequest, send: Callable, session_id: str):
+        if not self.priestess.sessions.delete(session_id):
+            await self.send_json(send, 404, {"error": "Unknown or expired session"})
+            return
+        await self.send_json(send, 200, {"status": "success", "timestamp": time.time()})
+
+    async def session_message(self, req: HTTPRequest, send: Callable, session_id: str):
+        self.require_loaded()
+        data = req.json()
+        if "content" not in data:
+            await self.send_json(send, 400, {"error": "Missing 'content' field"})
+            return
+        try:
+            session = self.priestess.sessions.get(session_id)
+        except KeyError:
+            await self.send_json(send, 404, {"error": "Unknown or expired session"})
+            return
+        await self.run_session_turn(req, send, session, data)
+
+
+def run_asgi(core: PriestessCore, host: str = "0.0.0.0", port: int = 5000, max_in_flight: int = 32,
+             max_queued: int = 64, queue_timeout: float = 30.0):
+    """Serve Priestess with uvicorn in asyncio mode"""
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("Async serving mode requires uvicorn: pip install uvicorn")
+
+    app = PriestessASGI(core, max_in_flight=max_in_flight, max_queued=max_queued, queue_timeout=queue_timeout)
+    logger.info(f"Starting Priestess ASGI server on {host}:{port} "
+                f"(max_in_flight={max_in_flight}, max_queued={max_queued})")
+    uvicorn.run(app, host=host, port=port, log_level="info")
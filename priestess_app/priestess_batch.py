@@ -0,0 +1,220 @@
+"""
+Priestess AI Batch Runner - Offline generation over JSONL workloads
+Drives PriestessCore in-process with a bounded window of requests in flight,
+appending results as they finish so an interrupted run can resume
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from priestess_api import (
+    QUOTING_ENDPOINT_DEFAULTS,
+    PriestessCore,
+    code_analysis_messages,
+    cybersec_messages,
+    devops_messages,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def item_request(item: Dict[str, Any], endpoint: str) -> Tuple[List[Dict[str, str]], str, Dict[str, Any]]:
+    """The conversation, result key and generation defaults for one input item
+
+    Items are shaped like the body of the matching HTTP endpoint.
+    """
+    if endpoint == "chat":
+        if "messages" not in item:
+            raise ValueError("Missing 'messages' field")
+        return item["messages"], "response", {}
+    if endpoint == "cybersec":
+        return cybersec_messages(item.get("query", ""), item.get("type", "general")), "analysis", {}
+    if endpoint == "devops":
+        messages = devops_messages(item.get("task", ""), item.get("context", ""))
+        return messages, "solution", QUOTING_ENDPOINT_DEFAULTS
+    if endpoint == "code-analysis":
+        messages = code_analysis_messages(item.get("code", ""), item.get("language", "unknown"))
+        return messages, "analysis", QUOTING_ENDPOINT_DEFAULTS
+    raise ValueError(f"Unknown endpoint '{endpoint}'")
+
+
+def count_items(path: str) -> int:
+    """Number of non-blank lines in a JSONL file"""
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+class BatchRunner:
+    """Runs a JSONL file of requests through PriestessCore into a JSONL file of results
+
+    Each input line is a JSON object shaped like the body of an HTTP endpoint,
+    with optional "endpoint" and "id" fields. Results are written in
+    completion order and carry the input's 1-based "line" number (and "id"),
+    so the output file is also the checkpoint: lines already answered there
+    are skipped when the same run is started again, and lines whose latest
+    record is an error are tried again.
+    """
+
+    def __init__(
+        self,
+        core: PriestessCore,
+        window: Optional[int] = None,
+        endpoint: str = "chat",
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        progress_interval: float = 5.0
+    ):
+        self.core = core
+        # Twice the batch size, so a freed slot always has a request queued for it
+        self.window = window or 2 * core.config.max_batch_size * max(1, core.config.num_workers)
+        self.endpoint = endpoint
+        self.generation_kwargs = generation_kwargs or {}
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.total = 0
+        self.skipped = 0
+        self.completed = 0
+        self.failed = 0
+        self.generated_tokens = 0
+        self.started = 0.0
+
+    def run(self, input_path: str, output_path: str) -> Dict[str, Any]:
+        """Answer every input line not yet in the output file; returns the final stats"""
+        answered = self.checkpoint(output_path)
+        self.total = count_items(input_path)
+        self.skipped = len(answered)
+        self.started = time.monotonic()
+        if self.skipped:
+            logger.info(f"Resuming: {self.skipped} of {self.total} items already answered in {output_path}")
+
+        running: Dict[Any, Tuple[Dict[str, Any], str, Any, Any]] = {}
+        last_report = time.monotonic()
+        with open(input_path, "r", encoding="utf-8") as source, \
+                open(output_path, "a", encoding="utf-8") as results:
+            items = self.read_items(source, answered)
+            try:
+                while True:
+                    for line_no, item in items:
+                        record = self.start(line_no, item, running)
+                        if record is not None:
+                            self.write(results, record)
+                        if len(running) >= self.window:
+                            break
+                    if not running:
+                        break
+                    done, _ = wait(list(running), timeout=self.progress_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self.write(results, self.finish(future, *running.pop(future)))
+                    if time.monotonic() - last_report >= self.progress_interval:
+                        # Results survive a crash up to the last report
+                        os.fsync(results.fileno())
+                        self.report()
+                        last_report = time.monotonic()
+            finally:
+                for _, _, _, request in running.values():
+                    request.cancel()
+        self.report()
+        return self.get_stats()
+
+    def checkpoint(self, output_path: str) -> Set[int]:
+        """Input line numbers whose latest record in the output file is an answer
+
+        A line cut short by an interrupted write is removed, so the file
+        holds only whole records before new ones are appended.
+        """
+        answered: Set[int] = set()
+        if not os.path.exists(output_path):
+            return answered
+        with open(output_path, "rb+") as f:
+            keep = 0
+            for raw in iter(f.readline, b""):
+                if not raw.endswith(b"\n"):
+                    break
+                keep += len(raw)
+                try:
+                    record = json.loads(raw)
+                    line_no = int(record["line"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if "error" in record:
+                    answered.discard(line_no)
+                else:
+                    answered.add(line_no)
+            f.truncate(keep)
+        return answered
+
+    def read_items(self, source: TextIO, answered: Set[int]) -> Iterator[Tuple[int, Any]]:
+        """Lazily parse input lines that still need an answer"""
+        for line_no, line in enumerate(source, start=1):
+            if not line.strip() or line_no in answered:
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+
+    def start(self, line_no: int, item: Any, running: Dict) -> Optional[Dict[str, Any]]:
+        """Queue one item, or return its record if it is answered without generating"""
+        key = {"line": line_no}
+        try:
+            if isinstance(item, Exception):
+                raise ValueError(f"Invalid JSON: {item}")
+            if not isinstance(item, dict):
+                raise ValueError("Each line must be a JSON object")
+            if "id" in item:
+                key["id"] = item["id"]
+            endpoint = item.get("endpoint", self.endpoint)
+            messages, result_key, defaults = item_request(item, endpoint)
+            generation_kwargs = {**defaults, **self.generation_kwargs, **item.get("generation_kwargs", {})}
+
+            secrets = self.core.check_secret_request(messages)
+            if secrets is not None:
+                return {**key, result_key: secrets, "status": "success"}
+            lookup = self.core.check_caches(messages, generation_kwargs, endpoint)
+            if lookup.response is not None:
+                return {**key, result_key: lookup.response, "cache": lookup.status, "status": "success"}
+            request = self.core.submit_shared(messages, lookup.key, **generation_kwargs)
+        except Exception as e:
+            return {**key, "error": str(e)}
+        running[request.future] = (key, result_key, lookup, request)
+        return None
+
+    def finish(self, future, key: Dict[str, Any], result_key: str, lookup, request) -> Dict[str, Any]:
+        try:
+            generated_ids = future.result()
+        except Exception as e:
+            return {**key, "error": str(e)}
+        self.generated_tokens += len(generated_ids)
+        response = self.core.tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+        self.core.remember_response(lookup, response)
+        return {**key, result_key: response, "cache": lookup.status, "status": "success"}
+
+    def write(self, results: TextIO, record: Dict[str, Any]):
+        results.write(json.dumps(record, ensure_ascii=False) + "\n")
+        results.flush()
+        self.completed += 1
+        self.failed += "error" in record
+
+    def report(self):
+        if self.progress is not None:
+            self.progress(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        rate = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.skipped - self.completed
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "completed": self.completed,
+            "failed": self.failed,
+            "remaining": remaining,
+            "elapsed": elapsed,
+            "items_per_second": rate,
+            "tokens_per_second": self.generated_tokens / elapsed if elapsed > 0 else 0.0,
+            "eta": remaining / rate if rate > 0 else None,
+        }
@@ -11,12 +11,28 @@ import json
 import time
 import threading
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from priestess_api import PriestessAPI, PriestessClient, PriestessConfig
+# Client-side commands only need these; the server modules (torch,
+# transformers, flask) are imported when a command runs the model itself
+from priestess_client import PriestessClient
+from priestess_config import GENERATION_ENDPOINTS, PriestessConfig
+from priestess_history import HistoryWindow
+
+if TYPE_CHECKING:
+    from priestess_api import PriestessCore
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Render seconds as e.g. '1h02m' or '3m05s'"""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
 
 class PriestessCLI:
     """Enhanced CLI interface for Priestess AI"""
@@ -25,43 +41,76 @@ class PriestessCLI:
         self.client = None
         self.server_process = None
         self.config = None
+        self.api = None
+        self.core = None
         
     def start_server(self, config: PriestessConfig, host='localhost', port=5000, auto_load=True):
         """Start the Priestess API server in background"""
         print("🔮 Starting Priestess AI Server...")
+        from priestess_api import PriestessAPI
         
-        # Start server in background thread
+        # The socket is listening once make_server returns, so the server is
+        # reachable (and answers health checks) while the model loads
         api = PriestessAPI(config)
+        self.config, self.api, self.core = config, api, api.priestess
+        try:
+            server = api.make_server(host, port)
+        except OSError as e:
+            print(f"❌ Failed to start server: {e}")
+            return False
+        threading.Thread(target=server.serve_forever, name="priestess-server", daemon=True).start()
+        print(f"🚀 Priestess AI Server running on http://{host}:{port}")
         
-        def run_server():
-            if auto_load:
-                print("📦 Loading AI model...")
-                api.priestess.load_model()
-                print("✅ Model loaded successfully!")
-            api.run(host=host, port=port, debug=False)
-        
-        server_thread = threading.Thread(target=run_server, daemon=True)
-        server_thread.start()
-        
-        # Wait for server to start
-        time.sleep(3)
-        
-        # Initialize client
         self.client = PriestessClient(f"http://{host}:{port}")
-        
-        # Test connection
-        try:
-            health = self.client.health_check()
-            if health.get('status') == 'healthy':
-                print(f"🚀 Priestess AI Server running on http://{host}:{port}")
-                return True
-        except Exception as e:
-            print(f"❌ Failed to connect to server: {e}")
+        if auto_load:
+            api.priestess.load_model_async()
+            return self.wait_for_model(api.priestess)
+        return True
+    
+    def start_local(self, config: PriestessConfig) -> bool:
+        """Load the model in this process and talk to it directly instead of over HTTP"""
+        from priestess_api import PriestessCore, PriestessLocalClient
+        core = PriestessCore(config)
+        self.config, self.core = config, core
+        core.load_model_async()
+        if not self.wait_for_model(core):
             return False
+        self.client = PriestessLocalClient(core)
+        return True
+    
+    def wait_for_model(self, core: "PriestessCore") -> bool:
+        """Show load progress until the model is ready or has failed to load"""
+        while not core.wait_until_loaded(timeout=0.5):
+            progress = core.load_progress.to_dict()
+            if progress['phase'] == 'failed':
+                print(f"\n❌ Failed to load model: {progress['error']}")
+                return False
+            print(f"\r📦 Loading AI model... {progress['phase']} {progress['percent']}%   ", end="", flush=True)
+        print("\n✅ Model loaded successfully!")
+        return True
+    
+    def history_window(self, max_prompt_tokens: Optional[int] = None) -> HistoryWindow:
+        """Token-budget window for conversations kept on this side of the API
         
-        return False
+        Counts with the loaded model's tokenizer, or with the model's
+        tokenizer.json when it is on disk (through `tokenizers`, keeping
+        transformers off the client path), and falls back to a
+        character-based estimate otherwise.
+        """
+        config = self.config or PriestessConfig()
+        if max_prompt_tokens is None:
+            max_prompt_tokens = config.max_prompt_tokens
+        if self.core is not None and self.core.tokenizer is not None:
+            return HistoryWindow.for_tokenizer(self.core.tokenizer, max_prompt_tokens)
+        tokenizer_file = os.path.join(config.model_path, "tokenizer.json")
+        if os.path.isfile(tokenizer_file):
+            try:
+                return HistoryWindow.for_tokenizer_file(tokenizer_file, max_prompt_tokens)
+            except Exception:
+                pass
+        return HistoryWindow.approximate(max_prompt_tokens)
     
-    def interactive_chat(self):
+    def interactive_chat(self, max_prompt_tokens: Optional[int] = None):
         """Start interactive chat session"""
         if not self.client:
             print("❌ Server not running. Start server first.")
@@ -73,6 +122,11 @@ class PriestessCLI:
         print("=\"*" * 50)
         
         conversation = []
+        # History lives on the server when sessions are available; older
+        # servers get the conversation resent every turn instead, windowed
+        # to the prompt token budget
+        session_id = self.open_session()
+        history = None if session_id else self.history_window(max_prompt_tokens)
         
         while True:
             try:
@@ -94,27 +148,28 @@ class PriestessCLI:
                 
                 if user_input.lower() == 'clear':
                     conversation = []
+                    if session_id:
+                        self.client.delete_session(session_id)
+                        session_id = self.open_session()
                     print("🧹 Conversation cleared.")
                     continue
                 
                 if not user_input:
                     continue
                 
-                # Add to conversation
-                conversation.append({"role": "user", "content": user_input})
-                
-                # Get response
-                print("\n🔮 Priestess is thinking...")
-                response = self.client.chat(conversation)
+                # Stream response as it is generated
+                print("\n🔮 Priestess: ", end="", flush=True)
+                if session_id:
+                    self.print_stream(self.client.send_message_stream(session_id, user_input))
+                    continue
                 
-                print(f"\n🔮 Priestess: {response}")
+                # Add to conversation, dropping the oldest turns once over budget
+                conversation.append({"role": "user", "content": user_input})
+                conversation = history.window(conversation)
+                response = self.print_stream(self.client.chat_stream(conversation))
                 
                 # Add response to conversation
                 conversation.append({"role": "assistant", "content": response})
-                
-                # Keep conversation manageable (last 10 exchanges)
-                if len(conversation) > 20:
-                    conversation = conversation[-20:]
                     
             except KeyboardInterrupt:
                 print("\n👋 Goodbye!")
@@ -122,6 +177,22 @@ class PriestessCLI:
             except Exception as e:
                 print(f"\n❌ Error: {e}")
     
+    def open_session(self) -> Optional[str]:
+        """Open a server-side chat session, or None if the server has no sessions"""
+        try:
+            return self.client.create_session()
+        except Exception:
+            return None
+    
+    def print_stream(self, chunks) -> str:
+        """Print streamed text as it arrives and return the full response"""
+        parts = []
+        for chunk in chunks:
+            print(chunk, end="", flush=True)
+            parts.append(chunk)
+        print()
+        return "".join(parts)
+    
     def show_chat_help(self):
         """Show chat help"""
         help_text = """
@@ -147,8 +218,8 @@ class PriestessCLI:
             return
         
         print(f"🔍 Performing {analysis_type} cybersecurity analysis...")
-        result = self.client.cybersec_analysis(query, analysis_type)
-        print(f"\n🛡️ Analysis Result:\n{result}")
+        print("\n🛡️ Analysis Result:")
+        self.print_stream(self.client.cybersec_analysis_stream(query, analysis_type))
     
     def devops_help(self, task: str, context: str = ""):
         """Get DevOps assistance"""
@@ -157,8 +228,8 @@ class PriestessCLI:
             return
         
         print("⚙️ Getting DevOps assistance...")
-        result = self.client.devops_assistance(task, context)
-        print(f"\n🔧 DevOps Solution:\n{result}")
+        print("\n🔧 DevOps Solution:")
+        self.print_stream(self.client.devops_assistance_stream(task, context))
     
     def analyze_code(self, code_file: str = None, code_text: str = None, language: str = "auto"):
         """Analyze code for security issues"""
@@ -182,8 +253,38 @@ class PriestessCLI:
             return
         
         print(f"🔍 Analyzing {language} code for security issues...")
-        result = self.client.analyze_code(code_text, language)
-        print(f"\n🛡️ Security Analysis:\n{result}")
+        print("\n🛡️ Security Analysis:")
+        self.print_stream(self.client.analyze_code_stream(code_text, language))
+    
+    def run_batch(self, config: PriestessConfig, input_path: str, output_path: str,
+                  endpoint: str = "chat", window: Optional[int] = None, generation_kwargs: Optional[Dict] = None):
+        """Run a JSONL file of requests through the model in this process, without the server"""
+        from priestess_api import PriestessCore
+        from priestess_batch import BatchRunner
+        print("📦 Loading AI model...")
+        core = PriestessCore(config)
+        core.load_model()
+        print("✅ Model loaded successfully!")
+        
+        runner = BatchRunner(core, window=window, endpoint=endpoint,
+                             generation_kwargs=generation_kwargs, progress=self.print_batch_progress)
+        print(f"🔄 Running {input_path} -> {output_path} ({runner.window} requests in flight)")
+        try:
+            stats = runner.run(input_path, output_path)
+        except KeyboardInterrupt:
+            print("\n⏸️ Interrupted. Run the same command again to resume.")
+            return
+        finally:
+            core.engine.stop()
+        print(f"\n✅ Done: {stats['completed']} items in {format_duration(stats['elapsed'])}, "
+              f"{stats['failed']} failed, {stats['skipped']} already answered")
+    
+    def print_batch_progress(self, stats: Dict):
+        """Overwrite the progress line with throughput and ETA"""
+        done = stats['skipped'] + stats['completed']
+        print(f"\r⏳ {done}/{stats['total']} items ({stats['failed']} failed) | "
+              f"{stats['items_per_second']:.2f} items/s, {stats['tokens_per_second']:.0f} tokens/s | "
+              f"ETA {format_duration(stats['eta'])}   ", end="", flush=True)
     
     def show_status(self):
         """Show system status"""
@@ -212,6 +313,7 @@ Examples:
   priestess cybersec "Analyze this vuln"   # Quick security analysis
   priestess devops "Setup CI/CD pipeline"  # DevOps assistance
   priestess code-analysis file.py          # Analyze code file
+  priestess batch --input in.jsonl --output out.jsonl  # Offline bulk run
   priestess secrets                        # Show secret knowledge
         """
     )
@@ -227,19 +329,21 @@ Examples:
     
     # Chat command
     chat_parser = subparsers.add_parser('chat', help='Start interactive chat')
-    chat_parser.add_argument('--start-server', action='store_true', help='Auto-start server if needed')
+    chat_parser.add_argument('--start-server', action='store_true', help='Run the model in this process instead of using a running server')
+    chat_parser.add_argument('--max-prompt-tokens', type=int, default=None,
+                             help='Token budget for conversation history resent to servers without sessions')
     
     # Cybersecurity analysis
     cybersec_parser = subparsers.add_parser('cybersec', help='Cybersecurity analysis')
     cybersec_parser.add_argument('query', help='Security question or scenario')
     cybersec_parser.add_argument('--type', default='general', help='Analysis type')
-    cybersec_parser.add_argument('--start-server', action='store_true', help='Auto-start server if needed')
+    cybersec_parser.add_argument('--start-server', action='store_true', help='Run the model in this process instead of using a running server')
     
     # DevOps assistance
     devops_parser = subparsers.add_parser('devops', help='DevOps assistance')
     devops_parser.add_argument('task', help='DevOps task description')
     devops_parser.add_argument('--context', default='', help='Additional context')
-    devops_parser.add_argument('--start-server', action='store_true', help='Auto-start server if needed')
+    devops_parser.add_argument('--start-server', action='store_true', help='Run the model in this process instead of using a running server')
     
     # Code analysis
     code_parser = subparsers.add_parser('code-analysis', help='Analyze code for security issues')
@@ -247,15 +351,29 @@ Examples:
     code_group.add_argument('--file', help='Code file to analyze')
     code_group.add_argument('--code', help='Code text to analyze')
     code_parser.add_argument('--language', default='auto', help='Programming language')
-    code_parser.add_argument('--start-server', action='store_true', help='Auto-start server if needed')
+    code_parser.add_argument('--start-server', action='store_true', help='Run the model in this process instead of using a running server')
     
     # Secrets command
     secrets_parser = subparsers.add_parser('secrets', help='Show Priestess secret knowledge')
-    secrets_parser.add_argument('--start-server', action='store_true', help='Auto-start server if needed')
+    secrets_parser.add_argument('--start-server', action='store_true', help='Run the model in this process instead of using a running server')
     
     # Status command
     status_parser = subparsers.add_parser('status', help='Show system status')
     
+    # Offline batch run
+    batch_parser = subparsers.add_parser('batch', help='Run a JSONL file of requests in-process, without the server')
+    batch_parser.add_argument('--input', required=True, help='JSONL file, one request body per line')
+    batch_parser.add_argument('--output', required=True, help='JSONL file results are appended to; rerun to resume')
+    batch_parser.add_argument('--model-path', default='./WhiteRabbitNeo-V3-7B', help='Path to AI model')
+    batch_parser.add_argument('--endpoint', choices=GENERATION_ENDPOINTS, default='chat',
+                              help='Endpoint for lines without an "endpoint" field')
+    batch_parser.add_argument('--window', type=int, default=None,
+                              help='Requests in flight (defaults to twice the batch size)')
+    batch_parser.add_argument('--workers', type=int, default=1,
+                              help='Inference processes, each pinned to its own slice of CPU cores')
+    batch_parser.add_argument('--max-new-tokens', type=int, default=None,
+                              help='Longest answer per item, unless a line sets its own')
+    
     args = parser.parse_args()
     
     cli = PriestessCLI()
@@ -280,13 +398,14 @@ Examples:
             print("\n👋 Shutting down Priestess AI Server...")
         return
     
-    # Auto-start server for other commands if requested
+    # Run the model in this process for other commands if requested,
+    # otherwise talk to a running server
     def ensure_server(start_server_flag):
         if start_server_flag:
             config = PriestessConfig()
-            success = cli.start_server(config, auto_load=True)
+            success = cli.start_local(config)
             if not success:
-                print("❌ Failed to start server")
+                print("❌ Failed to load model")
                 sys.exit(1)
         else:
             cli.client = PriestessClient()
@@ -294,7 +413,7 @@ Examples:
     # Handle other commands
     if args.command == 'chat':
         ensure_server(getattr(args, 'start_server', False))
-        cli.interactive_chat()
+        cli.interactive_chat(getattr(args, 'max_prompt_tokens', None))
     
     elif args.command == 'cybersec':
         ensure_server(getattr(args, 'start_server', False))
@@ -319,7 +438,13 @@ Examples:
             print(f"\n🔮 Priestess Secret Knowledge:\n{secrets}")
     
     elif args.command == 'status':
+        cli.client = PriestessClient()
         cli.show_status()
+    
+    elif args.command == 'batch':
+        config = PriestessConfig(model_path=args.model_path, num_workers=args.workers)
+        generation_kwargs = {"max_new_tokens": args.max_new_tokens} if args.max_new_tokens else {}
+        cli.run_batch(config, args.input, args.output, args.endpoint, args.window, generation_kwargs)
 
 if __name__ == '__main__':
     main()
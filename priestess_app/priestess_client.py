@@ -0,0 +1,898 @@
+"""
+Priestess AI Client - HTTP client for a running Priestess API server
+Imports nothing heavier than requests, and that only when a call is made
+"""
+
+import gzip
+import itertools
+import json
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Statuses the server uses for "busy, try again later"
+RETRY_STATUSES = (429, 503)
+
+# Methods that are safe to send again after a connection broke mid-request;
+# a resent POST could start the same generation twice
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# Added to a replica's /health round trip before weighting by its inverse, so
+# replicas answering within a few milliseconds share traffic about evenly
+HEALTH_LATENCY_FLOOR = 0.05
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def request_never_sent(error: Exception) -> bool:
+    """Whether a requests connection error struck before the server could see the request
+    
+    True for connect timeouts and connections that were refused or could not
+    be opened at all, the only failures after which a POST may be resent.
+    """
+    import requests
+    from urllib3.exceptions import NewConnectionError
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+def backoff_delay(attempt: int, retry_after: Optional[float], backoff: float, max_backoff: float) -> float:
+    """Seconds to wait before the next attempt, jittered so clients spread out"""
+    if retry_after is not None:
+        # Never earlier than the server asked
+        return retry_after + random.uniform(0, backoff)
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+def encode_json_body(data: Optional[Dict], headers: Optional[Dict[str, str]],
+                     gzip_min_bytes: Optional[int]) -> Tuple[Optional[bytes], Dict[str, str]]:
+    """Serialize a request body, gzip-compressing it from `gzip_min_bytes` up"""
+    headers = dict(headers or {})
+    if data is None:
+        return None, headers
+    body = json.dumps(data).encode("utf-8")
+    headers["Content-Type"] = "application/json"
+    if gzip_min_bytes is not None and len(body) >= gzip_min_bytes:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+class Replica:
+    """One API server behind a PriestessClient and what the client knows of it
+    
+    Updated from caller threads, hedged attempts and health probes at once,
+    so the fields are only changed through `record` and `set_health`.
+    """
+    
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True  # Model loaded and reachable at the last check
+        self.health_latency: Optional[float] = None  # Seconds /health took to answer
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def weight(self) -> float:
+        with self._lock:
+            return self._weight()
+    
+    def record(self, requests: int = 0, errors: int = 0):
+        with self._lock:
+            self.requests += requests
+            self.errors += errors
+    
+    def set_health(self, healthy: bool, latency: Optional[float] = None):
+        """Mark the replica up or down, with the latency of the probe that found out if there was one"""
+        with self._lock:
+            self.healthy = healthy
+            if latency is not None:
+                self.health_latency = latency
+    
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "url": self.url,
+                "healthy": self.healthy,
+                "weight": self._weight(),
+                "health_latency": self.health_latency,
+                "requests": self.requests,
+                "errors": self.errors,
+            }
+    
+    def _weight(self) -> float:
+        if not self.healthy:
+            return 0.0
+        if self.health_latency is None:
+            return 1.0 / HEALTH_LATENCY_FLOOR
+        return 1.0 / (self.health_latency + HEALTH_LATENCY_FLOOR)
+
+class PriestessClient:
+    """Client for interacting with Priestess API
+    
+    Calls share a pooled keep-alive session. Requests the server turns away
+    with 429 or 503, or that fail to connect, are retried up to
+    `max_retries` times, waiting as long as Retry-After asks or else a
+    jittered exponential backoff. A connection that breaks once the request
+    is sent is only retried for idempotent methods, never for a POST that
+    may already be generating. JSON bodies of at least `gzip_min_bytes`
+    (large code payloads) are sent gzip-compressed; None disables that.
+    
+    `base_url` may be a list of replicas. Each request then goes to a
+    replica picked at random, weighted by how quickly its /health answers and
+    skipping those without a loaded model; health is rechecked every
+    `health_interval` seconds. Sessions stay on the replica that created them.
+    With `hedge_delay` set, a generation request that has not produced its
+    first token after that many seconds is sent again to a second replica;
+    whichever answers first is used and the other is cancelled.
+    """
+    
+    def __init__(
+        self,
+        base_url: Union[str, Sequence[str]] = "http://localhost:5000",
+        connect_timeout: float = 5.0,
+        read_timeout: Optional[float] = 600.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        gzip_min_bytes: Optional[int] = 64 * 1024,
+        pool_size: int = 10,
+        hedge_delay: Optional[float] = None,
+        health_interval: float = 10.0
+    ):
+        urls = [base_url] if isinstance(base_url, str) else list(base_url)
+        if not urls:
+            raise ValueError("At least one base URL is required")
+        self.replicas = [Replica(url) for url in urls]
+        self.base_url = self.replicas[0].url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.gzip_min_bytes = gzip_min_bytes
+        self.pool_size = pool_size
+        self.hedge_delay = hedge_delay
+        self.health_interval = health_interval
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._health_checked: Optional[float] = None
+        self._session_replicas: Dict[str, Replica] = {}
+        self.hedge_requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        
+    @property
+    def session(self):
+        """The pooled HTTP session, created on first use"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            # Health probes and hedged attempts may get here at the same time as callers
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=len(self.replicas), pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+    
+    @property
+    def executor(self):
+        """Threads that run health probes and hedged attempts, created on first use"""
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max(2 * self.pool_size, len(self.replicas)), thread_name_prefix="priestess-client"
+                    )
+        return self._executor
+    
+    @property
+    def hedging(self) -> bool:
+        return self.hedge_delay is not None and len(self.replicas) > 1
+    
+    def close(self):
+        """Close the pooled connections"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            session, self._session = self._session, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if session is not None:
+            session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def request(self, method: str, path: str, data: Optional[Dict] = None,
+                headers: Optional[Dict[str, str]] = None, stream: bool = False,
+                replica: Optional[Replica] = None):
+        """Send a request, retrying while the server is busy or unreachable
+        
+        Each attempt goes to `replica`, or else to a freshly picked one, so
+        retries move away from a replica that is down or overloaded.
+        """
+        import requests
+        body, headers = encode_json_body(data, headers, self.gzip_min_bytes)
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            target = replica or self.pick_replica()
+            target.record(requests=1)
+            try:
+                response = self.session.request(
+                    method, f"{target.url}{path}", data=body, headers=headers, stream=stream, timeout=self.timeout
+                )
+            except requests.ConnectionError as e:
+                target.record(errors=1)
+                # Skipped until the next health check finds it back
+                target.set_health(False)
+                if attempt == self.max_retries or not (method.upper() in IDEMPOTENT_METHODS or request_never_sent(e)):
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                target.record(errors=1)
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                response.close()
+            time.sleep(backoff_delay(attempt, retry_after, self.backoff, self.max_backoff))
+    
+    def pick_replica(self, exclude: Sequence[Replica] = ()) -> Replica:
+        """A replica chosen at random, weighted by health"""
+        if len(self.replicas) == 1:
+            return self.replicas[0]
+        self.refresh_health()
+        candidates = [replica for replica in self.replicas if replica not in exclude] or self.replicas
+        weights = [replica.weight for replica in candidates]
+        if not any(weights):
+            # None known to be serving; spread out and let retries find one
+            weights = [1.0] * len(candidates)
+        return random.choices(candidates, weights)[0]
+    
+    def refresh_health(self, force: bool = False):
+        """Probe every replica's /health, at most once per `health_interval` unless forced
+        
+        Only the first check (and a forced one) waits for the answers; later
+        ones run in the background so a slow replica never delays a request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            first = self._health_checked is None
+            if not force and not first and now - self._health_checked < self.health_interval:
+                return
+            self._health_checked = now
+        probes = [self.executor.submit(self.probe_health, replica) for replica in self.replicas]
+        if first or force:
+            for probe in probes:
+                probe.result()
+    
+    def probe_health(self, replica: Replica):
+        import requests
+        started = time.monotonic()
+        try:
+            # A replica too slow to answer within the connect timeout is not worth waiting for
+            response = self.session.get(f"{replica.url}/health", timeout=self.timeout[0])
+            health = response.json()
+        except (requests.RequestException, ValueError):
+            replica.set_health(False)
+            return
+        replica.set_health(response.ok and bool(health.get("model_loaded")), time.monotonic() - started)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-replica counters and how often hedging fired and won"""
+        with self._lock:
+            hedging = {
+                "delay": self.hedge_delay,
+                "requests": self.hedge_requests,
+                "hedged": self.hedged,
+                "hedge_rate": self.hedged / self.hedge_requests if self.hedge_requests else 0.0,
+                "hedge_wins": self.hedge_wins,
+                "hedge_win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            }
+        return {"replicas": [replica.to_dict() for replica in self.replicas], "hedging": hedging}
+    
+    def health_check(self) -> Dict:
+        """Check API health"""
+        response = self.request("GET", "/health")
+        return response.json()
+    
+    def load_model(self) -> Dict:
+        """Load the model, on every replica"""
+        result: Dict = {}
+        for replica in self.replicas:
+            result = self.request("POST", "/load", replica=replica).json()
+            if result.get("status") != "success":
+                break
+        if len(self.replicas) > 1:
+            self.refresh_health(force=True)
+        return result
+    
+    def get_secrets(self) -> str:
+        """Get Priestess secret knowledge"""
+        response = self.request("GET", "/secrets")
+        result = response.json()
+        return result.get("secrets", "")
+    
+    def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Send chat request"""
+        data = {
+            "messages": messages,
+            "generation_kwargs": kwargs
+        }
+        return self.generate("/chat", data, "response")
+    
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> Iterator[str]:
+        """Send chat request, yielding response text as it is generated"""
+        data = {
+            "messages": messages,
+            "generation_kwargs": kwargs
+        }
+        return self.stream_events("/chat", data)
+    
+    def chat_batch(self, conversations: List[List[Dict[str, str]]], **kwargs) -> Iterator[Dict]:
+        """Send many chat requests at once, yielding each result as the server finishes it
+        
+        Results carry the "index" of their conversation and either a
+        "response" or an "error".
+        """
+        data = {
+            "items": [{"messages": messages} for messages in conversations],
+            "generation_kwargs": kwargs
+        }
+        return self.stream_batch("/chat/batch", data)
+    
+    def create_session(self, system_prompt: Optional[str] = None) -> str:
+        """Open a server-side chat session and return its id"""
+        data = {"system": system_prompt} if system_prompt else {}
+        replica = self.pick_replica()
+        response = self.request("POST", "/sessions", data, replica=replica)
+        result = response.json()
+        if "session_id" not in result:
+            raise RuntimeError(result.get("error", "Failed to create session"))
+        self._session_replicas[result["session_id"]] = replica
+        return result["session_id"]
+    
+    def session_replica(self, session_id: str) -> Replica:
+        """The replica holding a session; sessions opened elsewhere are assumed to be on the first"""
+        return self._session_replicas.get(session_id, self.replicas[0])
+    
+    def send_message(self, session_id: str, content: str, **kwargs) -> str:
+        """Send the next user turn of a session"""
+        data = {
+            "content": content,
+            "generation_kwargs": kwargs
+        }
+        response = self.request("POST", f"/sessions/{session_id}/messages", data,
+                                replica=self.session_replica(session_id))
+        result = response.json()
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result.get("response", "")
+    
+    def send_message_stream(self, session_id: str, content: str, **kwargs) -> Iterator[str]:
+        """Send the next user turn of a session, yielding the reply as it is generated"""
+        data = {
+            "content": content,
+            "generation_kwargs": kwargs
+        }
+        return self.stream_events(f"/sessions/{session_id}/messages", data, self.session_replica(session_id))
+    
+    def delete_session(self, session_id: str) -> Dict:
+        """Close a session"""
+        response = self.request("DELETE", f"/sessions/{session_id}", replica=self.session_replica(session_id))
+        self._session_replicas.pop(session_id, None)
+        return response.json()
+    
+    def cybersec_analysis(self, query: str, analysis_type: str = "general", **kwargs) -> str:
+        """Request cybersecurity analysis"""
+        data = {
+            "query": query,
+            "type": analysis_type,
+            "generation_kwargs": kwargs
+        }
+        return self.generate("/cybersec", data, "analysis")
+    
+    def cybersec_analysis_stream(self, query: str, analysis_type: str = "general", **kwargs) -> Iterator[str]:
+        """Request cybersecurity analysis, yielding text as it is generated"""
+        data = {
+            "query": query,
+            "type": analysis_type,
+            "generation_kwargs": kwargs
+        }
+        return self.stream_events("/cybersec", data)
+    
+    def devops_assistance(self, task: str, context: str = "", **kwargs) -> str:
+        """Request DevOps assistance"""
+        data = {
+            "task": task,
+            "context": context,
+            "generation_kwargs": kwargs
+        }
+        return self.generate("/devops", data, "solution")
+    
+    def devops_assistance_stream(self, task: str, context: str = "", **kwargs) -> Iterator[str]:
+        """Request DevOps assistance, yielding text as it is generated"""
+        data = {
+            "task": task,
+            "context": context,
+            "generation_kwargs": kwargs
+        }
+        return self.stream_events("/devops", data)
+    
+    def analyze_code(self, code: str, language: str = "unknown", **kwargs) -> str:
+        """Analyze code for security issues"""
+        data = {
+            "code": code,
+            "language": language,
+            "generation_kwargs": kwargs
+        }
+        return self.generate("/code-analysis", data, "analysis")
+    
+    def analyze_code_stream(self, code: str, language: str = "unknown", **kwargs) -> Iterator[str]:
+        """Analyze code for security issues, yielding text as it is generated"""
+        data = {
+            "code": code,
+            "language": language,
+            "generation_kwargs": kwargs
+        }
+        return self.stream_events("/code-analysis", data)
+    
+    def analyze_code_batch(self, files: List[Dict[str, str]], **kwargs) -> Iterator[Dict]:
+        """Analyze many pieces of code at once, yielding each result as the server finishes it
+        
+        `files` are {"code": ..., "language": ...} dicts. Results carry the
+        "index" of their file and either an "analysis" or an "error".
+        """
+        data = {
+            "items": [{"code": f["code"], "language": f.get("language", "unknown")} for f in files],
+            "generation_kwargs": kwargs
+        }
+        return self.stream_batch("/code-analysis/batch", data)
+    
+    def stream_batch(self, path: str, data: Dict) -> Iterator[Dict]:
+        """POST a batch request and yield the per-item results it sends back"""
+        with self.request("POST", path, data, stream=True) as response:
+            if response.headers.get("Content-Type", "").startswith("application/json"):
+                result = response.json()
+                raise RuntimeError(result.get("error", "Batch requests not supported by server"))
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("done"):
+                    return
+                if "index" not in record:
+                    raise RuntimeError(record.get("error", "Batch request failed"))
+                yield record
+        raise RuntimeError("Batch response ended before every item was answered")
+    
+    def generate(self, path: str, data: Dict, result_key: str) -> str:
+        """POST a generation request and return its text
+        
+        Hedged requests are streamed, as only a stream shows when the first
+        token arrives, and closing it cancels the generation on the server.
+        """
+        if self.hedging:
+            return "".join(self.stream_events(path, data))
+        response = self.request("POST", path, data)
+        result = response.json()
+        return result.get(result_key, "")
+    
+    def stream_events(self, path: str, data: Dict, replica: Optional[Replica] = None) -> Iterator[str]:
+        """POST a streaming request and yield the text deltas it sends back"""
+        if self.hedging and replica is None:
+            response, events = self.open_hedged_events(path, data)
+        else:
+            response, events = self.open_events(path, data, replica)
+        with response:
+            for event in events:
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                if event.get("done"):
+                    break
+                yield event.get("delta", "")
+    
+    def open_events(self, path: str, data: Dict, replica: Optional[Replica] = None):
+        """POST a streaming request; returns the response and an iterator over its events"""
+        data = dict(data, stream=True)
+        response = self.request("POST", path, data, headers={"Accept": "text/event-stream"}, stream=True,
+                                replica=replica)
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            # Errors (and non-streaming servers) answer with a plain JSON body
+            with response:
+                result = response.json()
+            raise RuntimeError(result.get("error", "Streaming not supported by server"))
+        response.encoding = "utf-8"
+        
+        def events():
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[len("data: "):])
+        return response, events()
+    
+    def open_hedged_events(self, path: str, data: Dict):
+        """Like open_events, racing a second replica if the first token is slow to arrive
+        
+        The second replica is also tried straight away if the first fails
+        before `hedge_delay`. Once an attempt wins, the others are aborted,
+        so their servers see the disconnect and stop generating.
+        """
+        from concurrent.futures import FIRST_COMPLETED, wait
+        
+        def first_event(attempt: HedgedAttempt):
+            response, events = self.open_events(path, data, attempt.replica)
+            if not attempt.opened(response):
+                raise RuntimeError(f"Hedged request to {attempt.replica.url} was abandoned")
+            try:
+                first = next(events, None)
+            except BaseException:
+                response.close()
+                raise
+            return response, itertools.chain([] if first is None else [first], events)
+        
+        def launch(replica: Replica):
+            attempt = HedgedAttempt(replica)
+            attempts[self.executor.submit(first_event, attempt)] = attempt
+        
+        primary = self.pick_replica()
+        attempts: Dict[Any, HedgedAttempt] = {}
+        launch(primary)
+        with self._lock:
+            self.hedge_requests += 1
+        done, _ = wait(attempts, timeout=self.hedge_delay)
+        if not done or next(iter(done)).exception() is not None:
+            launch(self.pick_replica(exclude=[primary]))
+            with self._lock:
+                self.hedged += 1
+        
+        pending = set(attempts)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # Prefer an attempt that succeeded; fail only once every attempt has
+            winner = next((f for f in done if f.exception() is None), None)
+            if winner is not None or not pending:
+                break
+        for future, attempt in attempts.items():
+            if future is not winner:
+                future.cancel()
+                attempt.abort()
+        if winner is None:
+            return next(iter(done)).result()
+        if attempts[winner].replica is not primary:
+            with self._lock:
+                self.hedge_wins += 1
+        return winner.result()
+
+class HedgedAttempt:
+    """One replica's try at a hedged stream, which another thread may abort
+    
+    Closing a response does not interrupt a thread blocked reading it, and
+    the server only notices the disconnect once that read returns; so an
+    abort shuts the socket down first. An attempt aborted before its
+    response arrived closes it as soon as it does.
+    """
+    
+    def __init__(self, replica: Replica):
+        self.replica = replica
+        self.response = None
+        self.aborted = False
+        self._lock = threading.Lock()
+    
+    def opened(self, response) -> bool:
+        """Record the attempt's response; False (and closed) if it was aborted meanwhile"""
+        with self._lock:
+            if not self.aborted:
+                self.response = response
+                return True
+        abort_response(response)
+        return False
+    
+    def abort(self):
+        with self._lock:
+            self.aborted = True
+            response = self.response
+        if response is not None:
+            abort_response(response)
+
+def abort_response(response):
+    """Close a streaming response, waking any thread blocked reading it"""
+    import socket
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+class PriestessAsyncClient:
+    """Asyncio counterpart of PriestessClient, built on aiohttp (an optional dependency)
+    
+    Has the same methods as coroutines, with the streaming ones as async
+    generators, and the same timeouts, retries and gzip of large bodies.
+    `map` and `gather` keep up to `concurrency` requests in flight, so a
+    batching server always has work queued.
+    """
+    
+    def __init__(
+        self,
+        base_url: str = "http://localhost:5000",
+        connect_timeout: float = 5.0,
+        read_timeout: Optional[float] = 600.0,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        gzip_min_bytes: Optional[int] = 64 * 1024,
+        concurrency: int = 16
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.gzip_min_bytes = gzip_min_bytes
+        self.concurrency = concurrency
+        self._session = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.close()
+    
+    async def close(self):
+        """Close the pooled connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    
+    def session(self):
+        """The pooled HTTP session, created on first use inside the running event loop"""
+        aiohttp = import_aiohttp()
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                # Leave connection headroom for the requests map() keeps in flight
+                connector=aiohttp.TCPConnector(limit=max(100, self.concurrency)),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout,
+                                              sock_read=self.read_timeout)
+            )
+        return self._session
+    
+    async def request(self, method: str, path: str, data: Optional[Dict] = None,
+                      headers: Optional[Dict[str, str]] = None):
+        """Send a request, retrying while the server is busy or unreachable"""
+        import asyncio  # Imported here, as it alone doubles the CLI start-up time
+        aiohttp = import_aiohttp()
+        body, headers = encode_json_body(data, headers, self.gzip_min_bytes)
+        session = self.session()
+        
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = await session.request(method, f"{self.base_url}{path}", data=body, headers=headers)
+            except aiohttp.ClientConnectionError as e:
+                # Only failures to connect are known to leave a POST unsent
+                connect_errors = (aiohttp.ClientConnectorError, getattr(aiohttp, "ConnectionTimeoutError", ()))
+                never_sent = isinstance(e, connect_errors)
+                if attempt == self.max_retries or not (method.upper() in IDEMPOTENT_METHODS or never_sent):
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                response.release()
+            await asyncio.sleep(backoff_delay(attempt, retry_after, self.backoff, self.max_backoff))
+    
+    async def request_json(self, method: str, path: str, data: Optional[Dict] = None) -> Dict:
+        response = await self.request(method, path, data)
+        async with response:
+            return await response.json(content_type=None)
+    
+    async def map(
+        self,
+        func: Callable[[Any], Awaitable[Any]],
+        items: Iterable[Any],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """Call `func` on every item with up to `concurrency` calls in flight
+        
+        Yields (index, result) as each call completes. Items are drawn from
+        `items` only as slots free up. A failed call raises, unless
+        `return_exceptions` yields its exception as the result; stopping
+        early cancels the calls still running.
+        """
+        import asyncio
+        limit = concurrency or self.concurrency
+        pending: Dict[Any, int] = {}
+        queued = iter(enumerate(items))
+        try:
+            while True:
+                for index, item in queued:
+                    pending[asyncio.ensure_future(func(item))] = index
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    return
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = pending.pop(task)
+                    error = task.exception()
+                    if error is not None and not return_exceptions:
+                        raise error
+                    yield index, error if error is not None else task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Let the cancelled calls unwind (and release their connections) before returning
+            await asyncio.gather(*pending, return_exceptions=True)
+    
+    async def gather(
+        self,
+        func: Callable[[Any], Awaitable[Any]],
+        items: Iterable[Any],
+        concurrency: Optional[int] = None,
+        return_exceptions: bool = False
+    ) -> List[Any]:
+        """Like `map`, but returns every result in the order of `items`"""
+        results = {}
+        async for index, result in self.map(func, items, concurrency, return_exceptions):
+            results[index] = result
+        return [results[index] for index in range(len(results))]
+    
+    async def health_check(self) -> Dict:
+        """Check API health"""
+        return await self.request_json("GET", "/health")
+    
+    async def load_model(self) -> Dict:
+        """Load the model"""
+        return await self.request_json("POST", "/load")
+    
+    async def get_secrets(self) -> str:
+        """Get Priestess secret knowledge"""
+        result = await self.request_json("GET", "/secrets")
+        return result.get("secrets", "")
+    
+    async def chat(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Send chat request"""
+        result = await self.request_json("POST", "/chat", {"messages": messages, "generation_kwargs": kwargs})
+        return result.get("response", "")
+    
+    def chat_stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncIterator[str]:
+        """Send chat request, yielding response text as it is generated"""
+        return self.stream_events("/chat", {"messages": messages, "generation_kwargs": kwargs})
+    
+    def chat_batch(self, conversations: List[List[Dict[str, str]]], **kwargs) -> AsyncIterator[Dict]:
+        """Send many chat requests at once, yielding each result as the server finishes it"""
+        data = {
+            "items": [{"messages": messages} for messages in conversations],
+            "generation_kwargs": kwargs
+        }
+        return self.stream_batch("/chat/batch", data)
+    
+    async def create_session(self, system_prompt: Optional[str] = None) -> str:
+        """Open a server-side chat session and return its id"""
+        result = await self.request_json("POST", "/sessions", {"system": system_prompt} if system_prompt else {})
+        if "session_id" not in result:
+            raise RuntimeError(result.get("error", "Failed to create session"))
+        return result["session_id"]
+    
+    async def send_message(self, session_id: str, content: str, **kwargs) -> str:
+        """Send the next user turn of a session"""
+        data = {"content": content, "generation_kwargs": kwargs}
+        result = await self.request_json("POST", f"/sessions/{session_id}/messages", data)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result.get("response", "")
+    
+    def send_message_stream(self, session_id: str, content: str, **kwargs) -> AsyncIterator[str]:
+        """Send the next user turn of a session, yielding the reply as it is generated"""
+        data = {"content": content, "generation_kwargs": kwargs}
+        return self.stream_events(f"/sessions/{session_id}/messages", data)
+    
+    async def delete_session(self, session_id: str) -> Dict:
+        """Close a session"""
+        return await self.request_json("DELETE", f"/sessions/{session_id}")
+    
+    async def cybersec_analysis(self, query: str, analysis_type: str = "general", **kwargs) -> str:
+        """Request cybersecurity analysis"""
+        data = {"query": query, "type": analysis_type, "generation_kwargs": kwargs}
+        result = await self.request_json("POST", "/cybersec", data)
+        return result.get("analysis", "")
+    
+    def cybersec_analysis_stream(self, query: str, analysis_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        """Request cybersecurity analysis, yielding text as it is generated"""
+        return self.stream_events("/cybersec", {"query": query, "type": analysis_type, "generation_kwargs": kwargs})
+    
+    async def devops_assistance(self, task: str, context: str = "", **kwargs) -> str:
+        """Request DevOps assistance"""
+        data = {"task": task, "context": context, "generation_kwargs": kwargs}
+        result = await self.request_json("POST", "/devops", data)
+        return result.get("solution", "")
+    
+    def devops_assistance_stream(self, task: str, context: str = "", **kwargs) -> AsyncIterator[str]:
+        """Request DevOps assistance, yielding text as it is generated"""
+        return self.stream_events("/devops", {"task": task, "context": context, "generation_kwargs": kwargs})
+    
+    async def analyze_code(self, code: str, language: str = "unknown", **kwargs) -> str:
+        """Analyze code for security issues"""
+        data = {"code": code, "language": language, "generation_kwargs": kwargs}
+        result = await self.request_json("POST", "/code-analysis", data)
+        return result.get("analysis", "")
+    
+    def analyze_code_stream(self, code: str, language: str = "unknown", **kwargs) -> AsyncIterator[str]:
+        """Analyze code for security issues, yielding text as it is generated"""
+        return self.stream_events("/code-analysis", {"code": code, "language": language, "generation_kwargs": kwargs})
+    
+    def analyze_code_batch(self, files: List[Dict[str, str]], **kwargs) -> AsyncIterator[Dict]:
+        """Analyze many pieces of code at once, yielding each result as the server finishes it"""
+        data = {
+            "items": [{"code": f["code"], "language": f.get("language", "unknown")} for f in files],
+            "generation_kwargs": kwargs
+        }
+        return self.stream_batch("/code-analysis/batch", data)
+    
+    async def stream_batch(self, path: str, data: Dict) -> AsyncIterator[Dict]:
+        """POST a batch request and yield the per-item results it sends back"""
+        response = await self.request("POST", path, data)
+        async with response:
+            if response.content_type == "application/json":
+                result = await response.json()
+                raise RuntimeError(result.get("error", "Batch requests not supported by server"))
+            async for raw in response.content:
+                line = raw.decode("utf-8").strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if record.get("done"):
+                    return
+                if "index" not in record:
+                    raise RuntimeError(record.get("error", "Batch request failed"))
+                yield record
+        raise RuntimeError("Batch response ended before every item was answered")
+    
+    async def stream_events(self, path: str, data: Dict) -> AsyncIterator[str]:
+        """POST a streaming request and yield the text deltas it sends back"""
+        response = await self.request("POST", path, dict(data, stream=True), headers={"Accept": "text/event-stream"})
+        async with response:
+            if response.content_type == "application/json":
+                # Errors (and non-streaming servers) answer with a plain JSON body
+                result = await response.json()
+                raise RuntimeError(result.get("error", "Streaming not supported by server"))
+            async for raw in response.content:
+                line = raw.decode("utf-8").strip()
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[len("data: "):])
+                if "error" in event:
+                    raise RuntimeError(event["error"])
+                if event.get("done"):
+                    break
+                yield event.get("delta", "")
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError("PriestessAsyncClient requires aiohttp: pip install aiohttp")
+    return aiohttp
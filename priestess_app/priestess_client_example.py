@@ -3,9 +3,11 @@ Example client usage for Priestess AI API
 Demonstrates how to interact with all capabilities including secret knowledge
 """
 
-from priestess_api import PriestessClient
+import asyncio
 import json
 
+from priestess_client import PriestessAsyncClient, PriestessClient
+
 def main():
     # Initialize client
     client = PriestessClient("http://localhost:5000")
@@ -100,6 +102,27 @@ def test_secret_triggers():
         else:
             print(f"❌ Trigger failed: '{phrase}'")
 
+async def analyze_concurrently():
+    """Analyze several snippets with a bounded number of requests in flight"""
+    snippets = [
+        ("python", "eval(input())"),
+        ("python", "pickle.loads(request.data)"),
+        ("javascript", "element.innerHTML = location.hash"),
+        ("php", "include($_GET['page']);"),
+    ]
+    
+    print("\n⚡ Concurrent Code Analysis:")
+    print("=" * 40)
+    
+    async with PriestessAsyncClient("http://localhost:5000", concurrency=2) as client:
+        async def analyze(snippet):
+            language, code = snippet
+            return await client.analyze_code(code, language)
+        
+        async for index, analysis in client.map(analyze, snippets):
+            print(f"[{snippets[index][0]}] {snippets[index][1]}\n{analysis}\n")
+
 if __name__ == "__main__":
     main()
-    test_secret_triggers()
\ No newline at end of file
+    test_secret_triggers()
+    asyncio.run(analyze_concurrently())
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Priestess AI Coalescing - Single-flight generation for identical requests
+Requests with the same response cache key that arrive while one of them is
+still generating share that generation instead of starting their own
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from priestess_engine import GenerationRequest
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """A generation in progress and the number of callers sharing it"""
+
+    def __init__(self):
+        # Resolves to the leader's GenerationRequest, or to its submit error
+        self.ready: Future = Future()
+        self.consumers = 0
+
+
+class SharedRequest:
+    """One caller's handle on a generation it may share with identical requests
+
+    Reads like a GenerationRequest. Cancelling a handle only detaches its
+    caller; the generation itself stops once every caller has cancelled.
+    """
+
+    def __init__(self, flights: "InflightRequests", key: str, flight: _Flight, request: GenerationRequest):
+        self.request = request
+        self.future: Future = Future()
+        self._flights = flights
+        self._key = key
+        self._flight = flight
+        self._released = False
+        self._lock = threading.Lock()
+        request.future.add_done_callback(self._copy_outcome)
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.future.cancelled()
+
+    def result(self, timeout: Optional[float] = None) -> List[int]:
+        return self.future.result(timeout)
+
+    def cancel(self) -> bool:
+        cancelled = self.future.cancel()
+        with self._lock:
+            released, self._released = self._released, True
+        if not released:
+            self._flights.release(self._key, self._flight, self.request)
+        return cancelled
+
+    def iter_tokens(self) -> Iterator[List[int]]:
+        for tokens in self.request.iter_tokens():
+            if self.future.cancelled():
+                return
+            yield tokens
+
+    async def aiter_tokens(self) -> AsyncIterator[List[int]]:
+        async for tokens in self.request.aiter_tokens():
+            if self.future.cancelled():
+                return
+            yield tokens
+
+    def _copy_outcome(self, source: Future):
+        if self.future.done():
+            return
+        if source.cancelled():
+            self.future.cancel()
+        elif source.exception() is not None:
+            self.future.set_exception(source.exception())
+        else:
+            self.future.set_result(source.result())
+
+
+class InflightRequests:
+    """Registry of generations that identical requests can join"""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def join(self, key: str, submit: Callable[[], GenerationRequest]) -> SharedRequest:
+        """Attach to the generation running for `key`, or start one with `submit`
+
+        A submit error (e.g. a rejected admission) is raised to every caller
+        that joined while it was being submitted.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+            flight.consumers += 1
+
+        if not leader:
+            return SharedRequest(self, key, flight, flight.ready.result())
+
+        try:
+            request = submit()
+        except BaseException as e:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.ready.set_exception(e)
+            raise
+        flight.ready.set_result(request)
+        request.future.add_done_callback(lambda _: self._forget(key, flight))
+        return SharedRequest(self, key, flight, request)
+
+    def release(self, key: str, flight: _Flight, request: GenerationRequest):
+        """Detach one caller, stopping the generation when it was the last"""
+        with self._lock:
+            flight.consumers -= 1
+            last = flight.consumers == 0
+            if last and self._flights.get(key) is flight:
+                del self._flights[key]
+        if last:
+            request.cancel()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+            }
+
+    def _forget(self, key: str, flight: _Flight):
+        # Later arrivals start afresh (or hit the response cache)
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
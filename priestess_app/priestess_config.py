@@ -0,0 +1,52 @@
+"""
+Priestess AI Configuration - Settings shared by the server, CLI and workers
+Kept free of heavy imports so client-side tools can build a config cheaply
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Stateless generation endpoints, by the names per-endpoint settings use
+GENERATION_ENDPOINTS = ("chat", "cybersec", "devops", "code-analysis")
+
+@dataclass
+class PriestessConfig:
+    """Configuration for Priestess AI"""
+    model_path: str = "./WhiteRabbitNeo-V3-7B"
+    max_new_tokens: int = 2048
+    temperature: float = 0.7
+    top_p: float = 0.9
+    do_sample: bool = True
+    device: str = "auto"
+    torch_dtype: str = "auto"
+    max_batch_size: int = 16
+    prompt_cache: bool = True
+    kv_cache_dir: Optional[str] = None  # Defaults to "<model_path>.priestess-cache"
+    prefix_cache_bytes: int = 2 * 1024 ** 3  # Budget for reusable conversation KV state; 0 disables
+    max_sessions: int = 256
+    session_idle_timeout: float = 1800.0  # Seconds before an idle session is evicted
+    mmap_weights: bool = True  # On CPU, map safetensors weights so worker processes share one copy
+    num_workers: int = 1  # Inference processes, each pinned to its own slice of cores
+    threads_per_worker: Optional[int] = None  # Defaults to the size of each worker's core slice
+    draft_model_path: Optional[str] = None  # Small model sharing the tokenizer, for speculative decoding
+    num_speculative_tokens: int = 4  # Draft tokens verified per forward pass of the main model
+    prompt_lookup_tokens: int = 8  # Max tokens copied from the prompt per step when prompt_lookup is on; 0 disables
+    quantization: str = "none"  # CPU weight quantization: "none", "int8-dynamic" or "int4-weight-only"
+    quantization_cache: bool = True  # Save quantized weights to the cache dir so conversion runs once
+    kv_cache_dtype: str = "auto"  # "int8" or "fp8" stores keys/values in 8 bits with per-head scales
+    kv_memory_budget: Optional[int] = None  # Bytes of worst-case KV for running requests (per worker); None = unlimited
+    max_prompt_tokens: int = 8192  # Older turns beyond this many prompt tokens are left out; 0 disables
+    history_compaction: bool = False  # Summarize older session turns in the background instead of dropping them
+    compaction_threshold: int = 4096  # Session history tokens past the summary that trigger a new summary
+    compaction_summary_tokens: int = 512  # Longest summary the model may write
+    response_cache_bytes: int = 64 * 1024 ** 2  # Memory for answers to repeated deterministic requests; 0 disables
+    response_cache_ttl: float = 3600.0  # Seconds a cached response stays valid
+    response_cache_disk: bool = False  # Also keep cached responses under "<kv_cache_dir>/responses"
+    response_cache_disk_bytes: int = 1024 ** 3
+    coalesce_requests: bool = True  # Identical concurrent deterministic requests share one generation
+    semantic_cache: bool = False  # Answer near-duplicate specialist queries from earlier answers
+    semantic_cache_threshold: float = 0.92  # Cosine similarity of query embeddings needed for a hit
+    semantic_cache_entries: int = 4096
+    semantic_cache_endpoints: Tuple[str, ...] = ("cybersec", "devops")  # Exact code matters for code-analysis
+    semantic_cache_max_tokens: int = 512  # Longer queries are not embedded or cached semantically
+    max_batch_items: int = 1024  # Most items one /chat/batch or /code-analysis/batch request may carry
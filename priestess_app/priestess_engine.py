@@ -0,0 +1,1223 @@
+"""
+Priestess AI Engine - Continuous batching inference scheduler
+Merges concurrent generation requests into one running decode batch
+"""
+
+import asyncio
+import inspect
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Any, Tuple
+
+import torch
+from transformers import DynamicCache
+
+from priestess_admission import AdmissionController, kv_bytes_per_token
+from priestess_kvcache import KV_CACHE_DTYPES, KVLayers, PromptKVCache, RadixPrefixCache, pack_kv, unpack_kv
+
+logger = logging.getLogger(__name__)
+
+# Prompt lookup matches the sequence's last n tokens, longest n first
+PROMPT_LOOKUP_MAX_NGRAM = 3
+PROMPT_LOOKUP_MIN_NGRAM = 2
+
+
+def cache_to_layers(cache) -> Optional[KVLayers]:
+    """Extract per-layer (key, value) tensors from a model cache object"""
+    if cache is None:
+        return None
+    if isinstance(cache, (tuple, list)):
+        return [(k, v) for k, v in cache]
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+class QuantizedDynamicCache(DynamicCache):
+    """Model cache holding keys/values packed by `pack_kv`
+
+    New states are packed as attention layers add them, and each layer's
+    states are unpacked only while that layer runs, so at most one layer is
+    held at full precision.
+    """
+
+    def __init__(self, kv_dtype: str):
+        super().__init__()
+        self.kv_dtype = kv_dtype
+
+    def update(self, key_states: torch.Tensor, value_states: torch.Tensor, layer_idx: int, *args, **kwargs):
+        keys, values = self.update_packed(
+            pack_kv(key_states, self.kv_dtype), pack_kv(value_states, self.kv_dtype), layer_idx, *args, **kwargs
+        )
+        return (
+            unpack_kv(keys, self.kv_dtype, key_states.dtype),
+            unpack_kv(values, self.kv_dtype, value_states.dtype),
+        )
+
+    def update_packed(self, keys: torch.Tensor, values: torch.Tensor, layer_idx: int, *args, **kwargs):
+        """Append already packed states without unpacking them"""
+        return super().update(keys, values, layer_idx, *args, **kwargs)
+
+
+def layers_to_cache(layers: Optional[KVLayers], kv_dtype: str = "auto") -> DynamicCache:
+    """Wrap per-layer (key, value) tensors in a cache the model accepts
+
+    With an 8-bit `kv_dtype` the tensors must already be packed.
+    """
+    if kv_dtype == "auto":
+        cache = DynamicCache()
+        append = cache.update
+    else:
+        cache = QuantizedDynamicCache(kv_dtype)
+        append = cache.update_packed
+    for layer_idx, (k, v) in enumerate(layers or []):
+        append(k, v, layer_idx)
+    return cache
+
+
+def pad_layers_left(layers: KVLayers, mask: torch.Tensor, length: int) -> Tuple[KVLayers, torch.Tensor]:
+    """Left-pad cached keys/values and their attention mask to `length` positions"""
+    pad = length - mask.shape[1]
+    if pad <= 0:
+        return layers, mask
+    padded = []
+    for k, v in layers:
+        k_pad = k.new_zeros(k.shape[0], k.shape[1], pad, k.shape[3])
+        v_pad = v.new_zeros(v.shape[0], v.shape[1], pad, v.shape[3])
+        padded.append((torch.cat([k_pad, k], dim=2), torch.cat([v_pad, v], dim=2)))
+    mask = torch.cat([mask.new_zeros(mask.shape[0], pad), mask], dim=1)
+    return padded, mask
+
+
+def merge_batches(
+    kv: Optional[KVLayers], mask: Optional[torch.Tensor], new_kv: KVLayers, new_mask: torch.Tensor
+) -> Tuple[KVLayers, torch.Tensor]:
+    """Append the rows of one batched cache to another, left-padding to a common length"""
+    if kv is None:
+        return new_kv, new_mask
+    length = max(mask.shape[1], new_mask.shape[1])
+    kv, mask = pad_layers_left(kv, mask, length)
+    new_kv, new_mask = pad_layers_left(new_kv, new_mask, length)
+    merged = [
+        (torch.cat([k, nk], dim=0), torch.cat([v, nv], dim=0))
+        for (k, v), (nk, nv) in zip(kv, new_kv)
+    ]
+    return merged, torch.cat([mask, new_mask], dim=0)
+
+
+def select_rows(kv: KVLayers, mask: torch.Tensor, keep: List[int]) -> Tuple[KVLayers, torch.Tensor]:
+    """Keep the given rows of a batched cache and trim columns that are padding in all of them"""
+    index = torch.tensor(keep, dtype=torch.long, device=mask.device)
+    mask = mask.index_select(0, index)
+    start = int(torch.nonzero(mask.sum(dim=0))[0])
+    kv = [
+        (k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+        for k, v in kv
+    ]
+    return kv, mask[:, start:]
+
+
+def compact_layers(kv: KVLayers, mask: torch.Tensor) -> Tuple[KVLayers, torch.Tensor]:
+    """Drop masked-out columns a batched cache no longer needs
+
+    Trailing columns unused by every row are cut off. If masked holes (e.g.
+    rejected speculative tokens) still make up a large share of the cache,
+    each row's live columns are gathered to the right and left-padded.
+    """
+    used = torch.nonzero(mask.sum(dim=0))
+    end = int(used[-1]) + 1 if used.numel() else 0
+    if end < mask.shape[1]:
+        mask = mask[:, :end]
+        kv = [(k[:, :, :end], v[:, :, :end]) for k, v in kv]
+
+    counts = mask.sum(dim=1)
+    length = int(counts.max()) if counts.numel() else 0
+    if mask.shape[1] - length <= max(32, mask.shape[1] // 4):
+        return kv, mask
+
+    # For each row, the source column of every destination column; pads point at column 0
+    columns = torch.arange(mask.shape[1], device=mask.device).expand_as(mask)
+    order = torch.argsort(mask * mask.shape[1] + columns, dim=1)[:, -length:]
+    new_mask = (torch.arange(length, device=mask.device) >= (length - counts).unsqueeze(1)).to(mask.dtype)
+    order = order * new_mask
+    compacted = []
+    for k, v in kv:
+        index = order[:, None, :, None].expand(k.shape[0], k.shape[1], length, k.shape[3])
+        compacted.append((k.gather(2, index), v.gather(2, index)))
+    return compacted, new_mask
+
+
+def logits_kwarg(model) -> Optional[str]:
+    """Name of the forward argument limiting which positions get logits, if supported"""
+    forward_params = inspect.signature(model.forward).parameters
+    for name in ("logits_to_keep", "num_logits_to_keep"):
+        if name in forward_params:
+            return name
+    return None
+
+
+@dataclass
+class SamplingParams:
+    """Per-request decoding parameters"""
+    max_new_tokens: int
+    temperature: float
+    top_p: float
+    do_sample: bool
+    # Propose tokens by copying spans of the prompt that follow the latest n-gram
+    prompt_lookup: bool = False
+
+
+def logits_to_probs(logits: torch.Tensor, params: SamplingParams) -> torch.Tensor:
+    """Apply temperature and nucleus filtering, returning a probability distribution"""
+    logits = logits.float()
+    if params.temperature and params.temperature != 1.0:
+        logits = logits / params.temperature
+    if params.top_p is not None and params.top_p < 1.0:
+        sorted_logits, sorted_idx = torch.sort(logits, descending=False, dim=-1)
+        cumulative = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+        remove = cumulative <= (1 - params.top_p)
+        # Always keep the most likely token
+        remove[..., -1:] = False
+        remove = remove.scatter(-1, sorted_idx, remove)
+        logits = logits.masked_fill(remove, float("-inf"))
+    return logits.softmax(dim=-1)
+
+
+def sample_token(logits: torch.Tensor, params: SamplingParams) -> int:
+    """Pick the next token for one sequence from its last-position logits"""
+    if not params.do_sample or not params.temperature:
+        return int(torch.argmax(logits, dim=-1))
+    probs = logits_to_probs(logits, params)
+    return int(torch.multinomial(probs, num_samples=1))
+
+
+class NgramIndex:
+    """Latest position of every short n-gram of a growing token sequence
+
+    Used for prompt lookup decoding: the tokens that followed the previous
+    occurrence of the sequence's last n-gram are proposed as its continuation.
+    """
+
+    def __init__(self):
+        self._ends: Dict[Tuple[int, ...], int] = {}
+        # N-grams ending at positions up to here are indexed
+        self._indexed = 0
+
+    def propose(self, token_ids: List[int], max_tokens: int) -> List[int]:
+        """Continuation of the last earlier match of the sequence's tail, if any"""
+        # Index everything except n-grams ending at the tail itself
+        while self._indexed < len(token_ids) - 1:
+            self._indexed += 1
+            for n in range(PROMPT_LOOKUP_MIN_NGRAM, PROMPT_LOOKUP_MAX_NGRAM + 1):
+                if self._indexed >= n:
+                    self._ends[tuple(token_ids[self._indexed - n:self._indexed])] = self._indexed
+
+        for n in range(PROMPT_LOOKUP_MAX_NGRAM, PROMPT_LOOKUP_MIN_NGRAM - 1, -1):
+            if len(token_ids) <= n:
+                continue
+            end = self._ends.get(tuple(token_ids[-n:]))
+            if end is not None:
+                return token_ids[end:end + max_tokens]
+        return []
+
+
+class GenerationRequest:
+    """A single sequence tracked by the engine from submission to completion"""
+
+    _ids = itertools.count()
+
+    def __init__(self, prompt_ids: List[int], params: SamplingParams, pin_cache: bool = False,
+                 background: bool = False):
+        self.request_id = next(self._ids)
+        self.prompt_ids = list(prompt_ids)
+        self.params = params
+        # Low priority: only scheduled when nothing else is waiting
+        self.background = background
+        # Keep the finished sequence pinned in the prefix cache; the caller owns
+        # the pin on `cache_node` and must release it with unlock()
+        self.pin_cache = pin_cache
+        self.cache_node = None
+        self.output_ids: List[int] = []
+        self.future: Future = Future()
+        self.arrival_time = time.time()
+        self.first_token_time: Optional[float] = None
+        self.finish_time: Optional[float] = None
+        # Number of real tokens held in the KV cache (next position id)
+        self.position = 0
+        # Last sampled token, fed to the model on the next decode step
+        self.next_token: Optional[int] = None
+        # Built by the engine on first use when prompt lookup is enabled
+        self.ngram_index: Optional[NgramIndex] = None
+        # Wakes up stream consumers when tokens arrive or generation ends
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.future.cancelled()
+
+    def result(self, timeout: Optional[float] = None) -> List[int]:
+        """Block until generation finishes and return the new token ids"""
+        return self.future.result(timeout)
+
+    def cancel(self) -> bool:
+        """Ask the engine to drop this request"""
+        with self._cond:
+            cancelled = self.future.cancel()
+            self._notify()
+        return cancelled
+
+    def iter_tokens(self) -> Iterator[List[int]]:
+        """Yield chunks of new token ids as the engine produces them
+
+        Any number of consumers may iterate concurrently; each one starts from
+        the first generated token.
+        """
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.output_ids) and not self.future.done():
+                    self._cond.wait()
+                tokens = self.output_ids[index:]
+                done = self.future.done()
+            if tokens:
+                index += len(tokens)
+                yield tokens
+            elif done:
+                break
+        if not self.future.cancelled() and self.future.exception() is not None:
+            raise self.future.exception()
+
+    async def aiter_tokens(self) -> AsyncIterator[List[int]]:
+        """Asyncio counterpart of iter_tokens() that never blocks the event loop"""
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+        self.add_listener(notify)
+        index = 0
+        try:
+            while True:
+                await wakeup.wait()
+                wakeup.clear()
+                with self._cond:
+                    tokens = self.output_ids[index:]
+                    done = self.future.done()
+                if tokens:
+                    index += len(tokens)
+                    yield tokens
+                if done:
+                    break
+        finally:
+            self.remove_listener(notify)
+        if not self.future.cancelled() and self.future.exception() is not None:
+            raise self.future.exception()
+
+    def add_listener(self, callback: Callable[[], None]):
+        """Call `callback` from the engine thread whenever tokens arrive or generation ends"""
+        with self._cond:
+            self._listeners.append(callback)
+        # Catch up on anything that happened before registration
+        callback()
+
+    def remove_listener(self, callback: Callable[[], None]):
+        with self._cond:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self):
+        self._cond.notify_all()
+        for callback in self._listeners:
+            callback()
+
+    def _append(self, token_id: int):
+        with self._cond:
+            if self.first_token_time is None:
+                self.first_token_time = time.time()
+            self.output_ids.append(token_id)
+            self._notify()
+
+    def _finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.finish_time = time.time()
+            if not self.future.done():
+                if error is not None:
+                    self.future.set_exception(error)
+                else:
+                    self.future.set_result(self.output_ids)
+            self._notify()
+
+
+class IncrementalDetokenizer:
+    """Turn a growing token sequence into text deltas
+
+    Only a short window of recent tokens is decoded per step, and text is held
+    back while the window ends in an incomplete multi-byte character.
+    """
+
+    def __init__(self, tokenizer, skip_special_tokens: bool = True, strip_leading: bool = True):
+        self.tokenizer = tokenizer
+        self.skip_special_tokens = skip_special_tokens
+        # Drop leading whitespace, matching the stripped non-streaming response
+        self.strip_leading = strip_leading
+        self.token_ids: List[int] = []
+        self.prefix_offset = 0
+        self.read_offset = 0
+
+    def push(self, token_ids: List[int]) -> str:
+        """Add new tokens and return the text they complete"""
+        self.token_ids.extend(token_ids)
+        return self._lstrip(self._decode_delta())
+
+    def flush(self) -> str:
+        """Return any text still held back once generation has ended"""
+        prefix_text = self.tokenizer.decode(
+            self.token_ids[self.prefix_offset:self.read_offset],
+            skip_special_tokens=self.skip_special_tokens
+        )
+        new_text = self.tokenizer.decode(
+            self.token_ids[self.prefix_offset:],
+            skip_special_tokens=self.skip_special_tokens
+        )
+        self.prefix_offset = self.read_offset = len(self.token_ids)
+        return self._lstrip(new_text[len(prefix_text):])
+
+    def _lstrip(self, text: str) -> str:
+        if self.strip_leading and text:
+            text = text.lstrip()
+            self.strip_leading = not text
+        return text
+
+    def _decode_delta(self) -> str:
+        prefix_text = self.tokenizer.decode(
+            self.token_ids[self.prefix_offset:self.read_offset],
+            skip_special_tokens=self.skip_special_tokens
+        )
+        new_text = self.tokenizer.decode(
+            self.token_ids[self.prefix_offset:],
+            skip_special_tokens=self.skip_special_tokens
+        )
+        if len(new_text) > len(prefix_text) and not new_text.endswith("\ufffd"):
+            self.prefix_offset = self.read_offset
+            self.read_offset = len(self.token_ids)
+            return new_text[len(prefix_text):]
+        return ""
+
+
+class DraftProposer:
+    """Small model that proposes tokens for the target model to verify
+
+    Keeps its own batched KV state, row-aligned with the engine's running
+    batch. Tokens the target has accepted but the draft has not yet processed
+    are carried over and fed at the start of the next round.
+    """
+
+    def __init__(self, model, pad_token_id: int):
+        self.model = model
+        self.pad_token_id = pad_token_id
+        self.device = model.device
+        kwarg = logits_kwarg(model)
+        self._keep_last_logits = {kwarg: 1} if kwarg else {}
+        self._kv: Optional[KVLayers] = None
+        self._mask: Optional[torch.Tensor] = None
+        # Per row: tokens accepted by the target that are not in the draft cache yet
+        self._pending: List[List[int]] = []
+        # Cache column where the last round's fed proposals start
+        self._proposal_start = 0
+
+    def prefill(self, requests: List[GenerationRequest]):
+        """Run the prompts of newly admitted requests and append them to the batch"""
+        batch_size = len(requests)
+        length = max(len(r.prompt_ids) for r in requests)
+        input_ids = torch.full((batch_size, length), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((batch_size, length), dtype=torch.long)
+        position_ids = torch.zeros((batch_size, length), dtype=torch.long)
+        for row, request in enumerate(requests):
+            n = len(request.prompt_ids)
+            input_ids[row, length - n:] = torch.tensor(request.prompt_ids, dtype=torch.long)
+            mask[row, length - n:] = 1
+            position_ids[row, length - n:] = torch.arange(n)
+
+        outputs = self.model(
+            input_ids=input_ids.to(self.device),
+            attention_mask=mask.to(self.device),
+            position_ids=position_ids.to(self.device),
+            use_cache=True,
+            **self._keep_last_logits,
+        )
+        self._kv, self._mask = merge_batches(
+            self._kv, self._mask, cache_to_layers(outputs.past_key_values), mask.to(self.device)
+        )
+        self._pending.extend(
+            [r.next_token if r.next_token is not None else self.pad_token_id] for r in requests
+        )
+
+    def propose(
+        self, requests: List[GenerationRequest], k: int
+    ) -> Tuple[List[List[int]], List[List[Optional[torch.Tensor]]]]:
+        """Propose `k` tokens per row, with the distribution each was drawn from
+
+        Greedy rows get None instead of a distribution.
+        """
+        batch_size = len(requests)
+        width = max(len(p) for p in self._pending)
+        input_ids = torch.full((batch_size, width), self.pad_token_id, dtype=torch.long)
+        step_mask = torch.zeros((batch_size, width), dtype=torch.long)
+        position_ids = torch.zeros((batch_size, width), dtype=torch.long)
+        for row, (request, pending) in enumerate(zip(requests, self._pending)):
+            n = len(pending)
+            input_ids[row, width - n:] = torch.tensor(pending, dtype=torch.long)
+            step_mask[row, width - n:] = 1
+            # The last pending token is the target's next input, at request.position
+            position_ids[row, width - n:] = torch.arange(request.position - n + 1, request.position + 1)
+
+        kv = self._kv
+        mask = torch.cat([self._mask, step_mask.to(self.device)], dim=1)
+        input_ids, position_ids = input_ids.to(self.device), position_ids.to(self.device)
+        tokens: List[List[int]] = [[] for _ in requests]
+        probs: List[List[Optional[torch.Tensor]]] = [[] for _ in requests]
+        for step in range(k):
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=layers_to_cache(kv),
+                use_cache=True,
+                **self._keep_last_logits,
+            )
+            kv = cache_to_layers(outputs.past_key_values)
+            logits = outputs.logits[:, -1, :]
+            for row, request in enumerate(requests):
+                if not request.params.do_sample or not request.params.temperature:
+                    tokens[row].append(int(torch.argmax(logits[row], dim=-1)))
+                    probs[row].append(None)
+                else:
+                    p = logits_to_probs(logits[row], request.params)
+                    tokens[row].append(int(torch.multinomial(p, num_samples=1)))
+                    probs[row].append(p)
+            if step == k - 1:
+                break
+            if step == 0:
+                self._proposal_start = mask.shape[1]
+            input_ids = torch.tensor([[t[-1]] for t in tokens], dtype=torch.long, device=self.device)
+            position_ids = position_ids[:, -1:] + 1
+            mask = torch.cat([mask, mask.new_ones(batch_size, 1)], dim=1)
+        if k == 1:
+            self._proposal_start = mask.shape[1]
+
+        self._kv, self._mask = kv, mask
+        return tokens, probs
+
+    def accept(self, proposals: List[List[int]], accepted: List[int], next_tokens: List[Optional[int]]):
+        """Roll the draft cache back to the proposals the target accepted"""
+        for row, (drafts, n_accept, next_token) in enumerate(zip(proposals, accepted, next_tokens)):
+            # Proposals fed to the draft are all but the last one
+            fed = len(drafts) - 1
+            self._mask[row, self._proposal_start + min(n_accept, fed):] = 0
+            pending = drafts[fed:n_accept] if n_accept > fed else []
+            self._pending[row] = pending + [next_token if next_token is not None else self.pad_token_id]
+        self._kv, self._mask = compact_layers(self._kv, self._mask)
+
+    def select(self, keep: List[int]):
+        """Keep only the given rows, mirroring the engine's batch"""
+        if not keep:
+            self.reset()
+            return
+        self._kv, self._mask = select_rows(self._kv, self._mask, keep)
+        self._pending = [self._pending[row] for row in keep]
+
+    def reset(self):
+        self._kv, self._mask, self._pending = None, None, []
+
+
+class PriestessEngine:
+    """Continuous batching scheduler driving a causal LM from a single thread
+
+    Requests are queued by any number of caller threads. The scheduler thread
+    prefills newly arrived requests, merges them into the running batch and
+    advances every running sequence by one token per forward pass. Finished
+    sequences leave the batch immediately so waiting ones can take their slot.
+
+    With a draft model, each step instead verifies `num_speculative_tokens`
+    proposed tokens per sequence in a single forward pass of the model.
+    Without one, requests with `prompt_lookup` set propose up to
+    `prompt_lookup_tokens` tokens copied from their own prompt.
+
+    With an 8-bit `kv_cache_dtype` the keys and values are kept packed by
+    `pack_kv` (the draft model's cache stays at full precision).
+
+    With a `kv_memory_budget` (bytes), requests only join the batch while its
+    worst-case KV size stays within the budget; the first one that does not
+    fit waits at the head of the queue.
+
+    Requests submitted with `background=True` (housekeeping such as history
+    summaries) only take a slot when no other request is waiting, and at most
+    one of them runs at a time, so they never delay interactive traffic.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 16,
+        prompt_cache: Optional[PromptKVCache] = None,
+        prefix_cache: Optional[RadixPrefixCache] = None,
+        draft_model=None,
+        num_speculative_tokens: int = 4,
+        prompt_lookup_tokens: int = 8,
+        kv_cache_dtype: str = "auto",
+        kv_memory_budget: Optional[int] = None
+    ):
+        if kv_cache_dtype not in KV_CACHE_DTYPES:
+            raise ValueError(f"Unknown KV cache dtype {kv_cache_dtype!r}; expected one of {', '.join(KV_CACHE_DTYPES)}")
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.prompt_cache = prompt_cache
+        self.prefix_cache = prefix_cache
+        self.device = model.device
+
+        self.eos_token_ids = self._resolve_eos_ids()
+        self.pad_token_id = tokenizer.pad_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = tokenizer.eos_token_id
+
+        self._logits_kwarg = logits_kwarg(model)
+        self._keep_last_logits = {self._logits_kwarg: 1} if self._logits_kwarg else {}
+
+        self.drafter = DraftProposer(draft_model, self.pad_token_id) if draft_model is not None else None
+        self.num_speculative_tokens = max(1, num_speculative_tokens)
+        self.prompt_lookup_tokens = prompt_lookup_tokens
+        # Every KV tensor the engine keeps (batch, prompt and prefix caches) uses this format
+        self.kv_cache_dtype = kv_cache_dtype
+
+        self.admission: Optional[AdmissionController] = None
+        if kv_memory_budget:
+            bytes_per_token = kv_bytes_per_token(model.config, model.dtype, kv_cache_dtype)
+            if draft_model is not None:
+                bytes_per_token += kv_bytes_per_token(draft_model.config, draft_model.dtype)
+            self.admission = AdmissionController(kv_memory_budget, bytes_per_token)
+
+        self._pending: "queue.Queue[Optional[GenerationRequest]]" = queue.Queue()
+        self._background: deque = deque()
+        # (token ids, future) of queued embed() calls
+        self._embeddings: deque = deque()
+        self._running: List[GenerationRequest] = []
+        # Request taken off the queue that is waiting for KV memory
+        self._deferred: Optional[GenerationRequest] = None
+        self._kv: Optional[KVLayers] = None
+        self._mask: Optional[torch.Tensor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self._recent_steps: deque = deque(maxlen=256)
+        self.total_requests = 0
+        self.completed_requests = 0
+        self.generated_tokens = 0
+        self.decode_steps = 0
+        self.proposed_tokens = 0
+        self.accepted_tokens = 0
+        self.verify_rows = 0
+        self.draft_time = 0.0
+        self.verify_time = 0.0
+
+    def _resolve_eos_ids(self) -> set:
+        eos_ids = set()
+        generation_config = getattr(self.model, "generation_config", None)
+        configured = getattr(generation_config, "eos_token_id", None)
+        if isinstance(configured, int):
+            eos_ids.add(configured)
+        elif configured:
+            eos_ids.update(configured)
+        if self.tokenizer.eos_token_id is not None:
+            eos_ids.add(self.tokenizer.eos_token_id)
+        return eos_ids
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the scheduler thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="priestess-engine", daemon=True)
+        self._thread.start()
+        logger.info(f"Priestess engine started (max_batch_size={self.max_batch_size})")
+
+    def stop(self):
+        """Stop the scheduler thread and fail any outstanding requests"""
+        self._stop.set()
+        self._pending.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(
+        self, prompt_ids: List[int], params: SamplingParams, pin_cache: bool = False, background: bool = False
+    ) -> GenerationRequest:
+        """Queue a tokenized prompt for generation"""
+        if not self.is_running:
+            raise RuntimeError("Engine not running. Call start() first.")
+        if not prompt_ids:
+            raise ValueError("Prompt must contain at least one token")
+        request = GenerationRequest(prompt_ids, params, pin_cache=pin_cache, background=background)
+        if self.admission is not None:
+            self.admission.check(self.worst_length(request))
+        with self._stats_lock:
+            self.total_requests += 1
+        if background:
+            # Picked up by the scheduler's idle poll; no need to wake it
+            self._background.append(request)
+        else:
+            self._pending.put(request)
+        return request
+
+    def embed(self, token_ids: List[int]) -> Future:
+        """Mean-pooled final hidden state of `token_ids`, unit length, as a float32 numpy array
+
+        The forward pass runs on the scheduler thread between decode steps;
+        the returned future resolves once it has.
+        """
+        if not self.is_running:
+            raise RuntimeError("Engine not running. Call start() first.")
+        if not token_ids:
+            raise ValueError("Text must contain at least one token")
+        future = Future()
+        self._embeddings.append((list(token_ids), future))
+        # Wake the scheduler if it is idle
+        self._pending.put(None)
+        return future
+
+    def worst_length(self, request: GenerationRequest) -> int:
+        """Most cache columns a request's row can need, including speculative lookahead"""
+        lookahead = 0
+        if self.drafter is not None:
+            lookahead = self.num_speculative_tokens
+        elif request.params.prompt_lookup:
+            lookahead = self.prompt_lookup_tokens
+        return len(request.prompt_ids) + request.params.max_new_tokens + lookahead
+    
+    def compute_kv(self, token_ids: List[int]) -> KVLayers:
+        """Prefill `token_ids` on their own and return the resulting KV state
+
+        Must be called before start() or from the scheduler thread, since it
+        runs the model directly.
+        """
+        input_ids = torch.tensor([token_ids], dtype=torch.long, device=self.device)
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=input_ids,
+                past_key_values=layers_to_cache(None, self.kv_cache_dtype),
+                use_cache=True,
+                **self._keep_last_logits
+            )
+        return cache_to_layers(outputs.past_key_values)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return scheduler and throughput statistics"""
+        with self._stats_lock:
+            steps = list(self._recent_steps)
+            metrics = {
+                "running": len(self._running),
+                "waiting": self._pending.qsize() + (self._deferred is not None),
+                "background_waiting": len(self._background),
+                "max_batch_size": self.max_batch_size,
+                "total_requests": self.total_requests,
+                "completed_requests": self.completed_requests,
+                "generated_tokens": self.generated_tokens,
+                "decode_steps": self.decode_steps,
+                "kv_cache_dtype": self.kv_cache_dtype,
+            }
+            if self.verify_rows:
+                tokens_per_step = (self.accepted_tokens + self.verify_rows) / self.verify_rows
+                verify_time = self.verify_time + self.draft_time
+                metrics["speculative"] = {
+                    "proposed_tokens": self.proposed_tokens,
+                    "accepted_tokens": self.accepted_tokens,
+                    "acceptance_rate": self.accepted_tokens / self.proposed_tokens if self.proposed_tokens else 0.0,
+                    "tokens_per_step": tokens_per_step,
+                    # A verification pass costs about one plain decode step, so
+                    # this is tokens per step discounted by the drafting overhead
+                    "estimated_speedup": tokens_per_step * self.verify_time / verify_time if verify_time else 0.0,
+                }
+        if self.admission is not None:
+            metrics["admission"] = self.admission.get_stats()
+        if self.prompt_cache is not None:
+            metrics["prompt_cache"] = self.prompt_cache.get_stats()
+        if self.prefix_cache is not None:
+            metrics["prefix_cache"] = self.prefix_cache.get_stats()
+        if len(steps) >= 2:
+            elapsed = steps[-1][0] - steps[0][0]
+            tokens = sum(n for _, _, n in steps[1:])
+            metrics["tokens_per_second"] = tokens / elapsed if elapsed > 0 else 0.0
+            metrics["avg_batch_size"] = sum(b for _, b, _ in steps) / len(steps)
+        else:
+            metrics["tokens_per_second"] = 0.0
+            metrics["avg_batch_size"] = 0.0
+        return metrics
+
+    # ------------------------------------------------------------------
+    # Scheduler loop
+    # ------------------------------------------------------------------
+
+    def _loop(self):
+        while not self._stop.is_set():
+            admitted = []
+            try:
+                admitted = self._take_pending(block=not self._running)
+                with torch.no_grad():
+                    if self._embeddings:
+                        self._run_embeddings()
+                    if admitted:
+                        self._prefill(admitted)
+                    if self._running:
+                        if self.drafter is not None:
+                            self._speculative_step()
+                        elif self.prompt_lookup_tokens > 0 and any(r.params.prompt_lookup for r in self._running):
+                            self._prompt_lookup_step()
+                        else:
+                            self._decode_step()
+            except Exception as e:
+                # Bad prompts are failed by _prefill alone; anything that gets
+                # here may have left the running batch's state inconsistent
+                logger.error(f"Engine step failed: {e}")
+                for request in admitted:
+                    request._finish(e)
+                self._fail_running(e)
+
+        self._fail_running(RuntimeError("Engine stopped"))
+        if self._deferred is not None:
+            self._deferred._finish(RuntimeError("Engine stopped"))
+            self._deferred = None
+        while True:
+            try:
+                request = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request._finish(RuntimeError("Engine stopped"))
+        while self._background:
+            self._background.popleft()._finish(RuntimeError("Engine stopped"))
+        while self._embeddings:
+            _, future = self._embeddings.popleft()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Engine stopped"))
+
+    def _take_pending(self, block: bool) -> List[GenerationRequest]:
+        """Pull waiting requests into free batch slots, within the KV memory budget"""
+        admitted = []
+        lengths = [self.worst_length(r) for r in self._running] if self.admission is not None else []
+        while len(self._running) + len(admitted) < self.max_batch_size:
+            if self._deferred is not None:
+                request, self._deferred = self._deferred, None
+            else:
+                try:
+                    request = self._pending.get(timeout=0.1) if block and not admitted else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    break
+            if request.cancelled:
+                request._finish()
+                continue
+            if self.admission is not None:
+                length = self.worst_length(request)
+                if not self.admission.fits(lengths, length):
+                    # Hold it at the head of the queue so long requests are not starved
+                    self._deferred = request
+                    break
+                lengths.append(length)
+            admitted.append(request)
+        if (self._deferred is None and self._pending.empty() and self._background
+                and len(self._running) + len(admitted) < self.max_batch_size
+                and not any(r.background for r in self._running)):
+            request = self._background.popleft()
+            if request.cancelled:
+                request._finish()
+            elif self.admission is None or self.admission.fits(lengths, self.worst_length(request)):
+                if self.admission is not None:
+                    lengths.append(self.worst_length(request))
+                admitted.append(request)
+            else:
+                # Background work waits for memory without holding up the queue
+                self._background.appendleft(request)
+        if self.admission is not None:
+            self.admission.record(self.admission.batch_bytes(lengths), len(admitted), self._deferred is not None)
+        return admitted
+
+    def _run_embeddings(self):
+        while self._embeddings:
+            token_ids, future = self._embeddings.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                input_ids = torch.tensor([token_ids], dtype=torch.long, device=self.device)
+                outputs = self.model(input_ids=input_ids, output_hidden_states=True, use_cache=False,
+                                     **self._keep_last_logits)
+                vector = outputs.hidden_states[-1][0].float().mean(dim=0)
+                future.set_result(torch.nn.functional.normalize(vector, dim=0).cpu().numpy())
+            except Exception as e:
+                future.set_exception(e)
+
+    def _prefill(self, requests: List[GenerationRequest]):
+        """Run the prompts of newly admitted requests and merge them into the batch
+
+        The running batch is only touched once the prompts have run, so a
+        prompt the model cannot take (e.g. a token id outside its vocabulary)
+        fails just the requests admitted with it.
+        """
+        try:
+            new_kv, new_mask = self._run_prompts(requests)
+        except Exception as e:
+            logger.error(f"Prefill of {len(requests)} request(s) failed: {e}")
+            for request in requests:
+                request._finish(e)
+            return
+        self._merge(requests, new_kv, new_mask)
+        self._evict_finished()
+
+    def _run_prompts(self, requests: List[GenerationRequest]) -> Tuple[KVLayers, torch.Tensor]:
+        """Prefill prompts and sample their first tokens; returns their KV state and mask
+
+        Prompts that start with a cached prefix only prefill their remaining
+        tokens. Each row is laid out as [padding, cached prefix, padding, new
+        tokens]; padding is masked out and position ids are explicit, so rows
+        with different cached and uncached lengths share one forward pass.
+        """
+        cached = [self._lookup_prefix(request.prompt_ids) for request in requests]
+
+        batch_size = len(requests)
+        past_len = max(n for n, _ in cached)
+        new_len = max(len(r.prompt_ids) - n for r, (n, _) in zip(requests, cached))
+
+        input_ids = torch.full((batch_size, new_len), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((batch_size, past_len + new_len), dtype=torch.long)
+        position_ids = torch.zeros((batch_size, new_len), dtype=torch.long)
+        for row, (request, (n_cached, _)) in enumerate(zip(requests, cached)):
+            new_ids = request.prompt_ids[n_cached:]
+            input_ids[row, new_len - len(new_ids):] = torch.tensor(new_ids, dtype=torch.long)
+            mask[row, past_len - n_cached:past_len] = 1
+            mask[row, past_len + new_len - len(new_ids):] = 1
+            position_ids[row, new_len - len(new_ids):] = torch.arange(n_cached, len(request.prompt_ids))
+
+        past_key_values = layers_to_cache(
+            self._stack_prefixes(cached, past_len) if past_len > 0 else None, self.kv_cache_dtype
+        )
+
+        outputs = self.model(
+            input_ids=input_ids.to(self.device),
+            attention_mask=mask.to(self.device),
+            position_ids=position_ids.to(self.device),
+            past_key_values=past_key_values,
+            use_cache=True,
+            **self._keep_last_logits,
+        )
+        logits = outputs.logits[:, -1, :]
+        new_kv = cache_to_layers(outputs.past_key_values)
+        new_mask = mask.to(self.device)
+
+        for row, request in enumerate(requests):
+            request.position = len(request.prompt_ids)
+            self._accept_token(request, sample_token(logits[row], request.params))
+
+        if self.drafter is not None:
+            # Leaves the drafter's batch as it was if its own forward pass fails
+            self.drafter.prefill(requests)
+        return new_kv, new_mask
+
+    def _lookup_prefix(self, prompt_ids: List[int]) -> Tuple[int, Optional[KVLayers]]:
+        """Longest cached prefix of a prompt across the prompt and prefix caches"""
+        best = (0, None)
+        for cache in (self.prompt_cache, self.prefix_cache):
+            if cache is None:
+                continue
+            n_cached, layers = cache.lookup(prompt_ids)
+            if n_cached > best[0]:
+                best = (n_cached, layers)
+        return best
+
+    def _stack_prefixes(self, cached: List[Tuple[int, Optional[KVLayers]]], past_len: int) -> KVLayers:
+        """Left-pad each row's cached prefix to `past_len` and stack them into a batch"""
+        reference = next(layers for _, layers in cached if layers is not None)
+        stacked = []
+        for layer_idx, (ref_k, ref_v) in enumerate(reference):
+            rows_k, rows_v = [], []
+            for n_cached, layers in cached:
+                pad_k = ref_k.new_zeros(1, ref_k.shape[1], past_len - n_cached, ref_k.shape[3])
+                pad_v = ref_v.new_zeros(1, ref_v.shape[1], past_len - n_cached, ref_v.shape[3])
+                if layers is None:
+                    rows_k.append(pad_k)
+                    rows_v.append(pad_v)
+                else:
+                    k, v = layers[layer_idx]
+                    rows_k.append(torch.cat([pad_k, k.to(ref_k.device, ref_k.dtype)], dim=2))
+                    rows_v.append(torch.cat([pad_v, v.to(ref_v.device, ref_v.dtype)], dim=2))
+            stacked.append((torch.cat(rows_k, dim=0), torch.cat(rows_v, dim=0)))
+        return stacked
+
+    def _decode_step(self):
+        """Advance every running sequence by one token"""
+        batch_size = len(self._running)
+        input_ids = torch.tensor([[r.next_token] for r in self._running], dtype=torch.long, device=self.device)
+        position_ids = torch.tensor([[r.position] for r in self._running], dtype=torch.long, device=self.device)
+        mask = torch.cat([self._mask, self._mask.new_ones(batch_size, 1)], dim=1)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=layers_to_cache(self._kv, self.kv_cache_dtype),
+            use_cache=True,
+            **self._keep_last_logits,
+        )
+        self._kv = cache_to_layers(outputs.past_key_values)
+        self._mask = mask
+        logits = outputs.logits[:, -1, :]
+
+        for row, request in enumerate(self._running):
+            request.position += 1
+            self._accept_token(request, sample_token(logits[row], request.params))
+
+        with self._stats_lock:
+            self.decode_steps += 1
+            self._recent_steps.append((time.time(), batch_size, batch_size))
+        self._evict_finished()
+
+    def _speculative_step(self):
+        """Advance every running sequence by one or more tokens using draft proposals"""
+        started = time.perf_counter()
+        proposals, draft_probs = self.drafter.propose(self._running, self.num_speculative_tokens)
+        drafted = time.perf_counter()
+        accepted = self._verify(proposals, draft_probs)
+        self.drafter.accept(proposals, accepted, [r.next_token for r in self._running])
+        with self._stats_lock:
+            self.draft_time += drafted - started
+            self.verify_time += time.perf_counter() - drafted
+        self._evict_finished()
+
+    def _prompt_lookup_step(self):
+        """Advance sequences using continuations copied from their prompts as proposals"""
+        started = time.perf_counter()
+        proposals = []
+        for request in self._running:
+            remaining = request.params.max_new_tokens - len(request.output_ids)
+            if not request.params.prompt_lookup or remaining <= 1:
+                proposals.append([])
+                continue
+            if request.ngram_index is None:
+                request.ngram_index = NgramIndex()
+            proposals.append(request.ngram_index.propose(
+                request.prompt_ids + request.output_ids,
+                min(self.prompt_lookup_tokens, remaining - 1)
+            ))
+        if not any(proposals):
+            self._decode_step()
+            return
+
+        drafted = time.perf_counter()
+        self._verify(proposals)
+        with self._stats_lock:
+            self.draft_time += drafted - started
+            self.verify_time += time.perf_counter() - drafted
+        self._evict_finished()
+
+    def _verify(
+        self, proposals: List[List[int]], draft_probs: Optional[List[List[Optional[torch.Tensor]]]] = None
+    ) -> List[int]:
+        """Check every row's proposed tokens in one forward pass of the model
+
+        Each row feeds its next token followed by its proposals. Greedy rows keep
+        the proposals that match the model's argmax; sampled rows use rejection
+        sampling against the distribution each proposal was drawn from (None for
+        deterministic proposals), which leaves the output distribution unchanged.
+        Either way the row also gains one token sampled from the model. Cache
+        columns of rejected proposals are masked out rather than removed.
+        Returns the number of proposals accepted per row.
+        """
+        batch_size = len(self._running)
+        width = 1 + max(len(drafts) for drafts in proposals)
+        input_ids = torch.full((batch_size, width), self.pad_token_id, dtype=torch.long)
+        step_mask = torch.zeros((batch_size, width), dtype=torch.long)
+        position_ids = torch.zeros((batch_size, width), dtype=torch.long)
+        for row, (request, drafts) in enumerate(zip(self._running, proposals)):
+            n = 1 + len(drafts)
+            input_ids[row, :n] = torch.tensor([request.next_token] + drafts, dtype=torch.long)
+            step_mask[row, :n] = 1
+            position_ids[row] = torch.arange(request.position, request.position + width)
+
+        offset = self._mask.shape[1]
+        mask = torch.cat([self._mask, step_mask.to(self.device)], dim=1)
+        outputs = self.model(
+            input_ids=input_ids.to(self.device),
+            attention_mask=mask,
+            position_ids=position_ids.to(self.device),
+            past_key_values=layers_to_cache(self._kv, self.kv_cache_dtype),
+            use_cache=True,
+            **({self._logits_kwarg: width} if self._logits_kwarg else {}),
+        )
+        self._kv = cache_to_layers(outputs.past_key_values)
+        self._mask = mask
+        logits = outputs.logits[:, -width:, :]
+
+        accepted = []
+        emitted = 0
+        for row, (request, drafts) in enumerate(zip(self._running, proposals)):
+            probs = draft_probs[row] if draft_probs is not None else None
+            n_accept, bonus = self._accept_proposals(logits[row], drafts, probs, request.params)
+            before = len(request.output_ids)
+            for token_id in drafts[:n_accept] + [bonus]:
+                self._accept_token(request, token_id)
+                if request.next_token is None:
+                    break
+            # The cache holds the fed token plus the accepted proposals that were kept
+            in_cache = min(len(request.output_ids) - before, n_accept)
+            self._mask[row, offset + 1 + in_cache:] = 0
+            request.position += 1 + in_cache
+            accepted.append(n_accept)
+            emitted += len(request.output_ids) - before
+
+        self._kv, self._mask = compact_layers(self._kv, self._mask)
+        with self._stats_lock:
+            self.decode_steps += 1
+            self.proposed_tokens += sum(len(drafts) for drafts in proposals)
+            self.accepted_tokens += sum(accepted)
+            self.verify_rows += batch_size
+            self._recent_steps.append((time.time(), batch_size, emitted))
+        return accepted
+
+    @staticmethod
+    def _accept_proposals(
+        logits: torch.Tensor,
+        drafts: List[int],
+        draft_probs: Optional[List[Optional[torch.Tensor]]],
+        params: SamplingParams
+    ) -> Tuple[int, int]:
+        """Return how many proposals one row keeps and the token that follows them"""
+        if not params.do_sample or not params.temperature:
+            targets = torch.argmax(logits[:len(drafts) + 1], dim=-1).tolist()
+            n = 0
+            while n < len(drafts) and drafts[n] == targets[n]:
+                n += 1
+            return n, targets[n]
+
+        probs = logits_to_probs(logits[:len(drafts) + 1], params)
+        vocab_size = probs.shape[-1]
+        for i, token_id in enumerate(drafts):
+            p = probs[i]
+            q = draft_probs[i] if draft_probs is not None else None
+            if q is not None and q.shape[-1] != vocab_size:
+                q = torch.nn.functional.pad(q[:vocab_size], (0, max(0, vocab_size - q.shape[-1])))
+            p_token = float(p[token_id]) if token_id < vocab_size else 0.0
+            q_token = float(q[token_id]) if q is not None else 1.0
+            # Accept with probability min(1, p / q)
+            if float(torch.rand(())) * q_token < p_token:
+                continue
+            if q is not None:
+                residual = (p - q).clamp(min=0)
+            else:
+                residual = p.clone()
+                if token_id < vocab_size:
+                    residual[token_id] = 0
+            if float(residual.sum()) <= 0:
+                residual = p
+            return i, int(torch.multinomial(residual / residual.sum(), num_samples=1))
+        return len(drafts), int(torch.multinomial(probs[len(drafts)], num_samples=1))
+
+    # ------------------------------------------------------------------
+    # Batch bookkeeping
+    # ------------------------------------------------------------------
+
+    def _accept_token(self, request: GenerationRequest, token_id: int):
+        with self._stats_lock:
+            self.generated_tokens += 1
+        if token_id in self.eos_token_ids:
+            request.next_token = None
+            return
+        request._append(token_id)
+        request.next_token = token_id
+        if len(request.output_ids) >= request.params.max_new_tokens:
+            request.next_token = None
+
+    def _merge(self, requests: List[GenerationRequest], kv: KVLayers, mask: torch.Tensor):
+        """Join prefilled sequences to the running batch, left-padding to a common length"""
+        if not self._running:
+            self._running, self._kv, self._mask = list(requests), kv, mask
+            return
+        self._kv, self._mask = merge_batches(self._kv, self._mask, kv, mask)
+        self._running.extend(requests)
+
+    def _evict_finished(self):
+        """Drop finished or cancelled sequences from the batch"""
+        keep = []
+        for row, request in enumerate(self._running):
+            if request.next_token is None or request.cancelled:
+                if self.prefix_cache is not None:
+                    self._cache_sequence(row, request)
+                request._finish()
+                with self._stats_lock:
+                    self.completed_requests += 1
+            else:
+                keep.append(row)
+        if len(keep) == len(self._running):
+            return
+        if self.drafter is not None:
+            self.drafter.select(keep)
+        if not keep:
+            self._running, self._kv, self._mask = [], None, None
+            if self.admission is not None:
+                self.admission.record(0)
+            return
+
+        self._kv, self._mask = select_rows(self._kv, self._mask, keep)
+        self._running = [self._running[row] for row in keep]
+        if self.admission is not None:
+            self.admission.record(self.admission.batch_bytes(self.worst_length(r) for r in self._running))
+
+    def _cache_sequence(self, row: int, request: GenerationRequest):
+        """Insert a finished sequence's KV state into the prefix cache"""
+        token_ids = (request.prompt_ids + request.output_ids)[:request.position]
+        columns = torch.nonzero(self._mask[row]).squeeze(1)
+        if columns.numel() != len(token_ids):
+            return
+        layers = [
+            (k[row:row + 1].index_select(2, columns), v[row:row + 1].index_select(2, columns))
+            for k, v in self._kv
+        ]
+        pin = request.pin_cache and not request.cancelled
+        # Pinned as it is inserted, before the insert evicts anything
+        node = self.prefix_cache.insert(token_ids, layers, lock=pin)
+        if not pin or node is None:
+            return
+        with request._cond:
+            if not request.cancelled:
+                request.cache_node = node
+                return
+        # Cancelled meanwhile: there is no owner left to release the pin
+        self.prefix_cache.unlock(node)
+
+    def _fail_running(self, error: BaseException):
+        for request in self._running:
+            request._finish(error)
+        self._running, self._kv, self._mask = [], None, None
+        if self.drafter is not None:
+            self.drafter.reset()
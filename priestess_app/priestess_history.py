@@ -0,0 +1,259 @@
+"""
+Priestess AI History - Token-budget conversation windowing
+Keeps the system prompt plus as many recent turns as fit in a prompt token
+budget, counting tokens with the model's tokenizer, and optionally folds
+older turns of long sessions into a model-written summary
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, for clients without the model's tokenizer
+APPROX_CHARS_PER_TOKEN = 4
+
+SUMMARY_SYSTEM_PROMPT = """You condense conversations for your own later reference.
+Summarize the conversation you are given, merging in the earlier summary if there is one.
+Keep every fact, finding, command, file name, host, version and decision that later turns may rely on.
+Leave out greetings and pleasantries. Answer with the summary only, as terse bullet points."""
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+
+def chat_message_overhead(tokenizer) -> int:
+    """Tokens the chat template adds around each message's content"""
+    one = [{"role": "user", "content": "x"}]
+    try:
+        single = tokenizer.apply_chat_template(one, tokenize=False)
+        double = tokenizer.apply_chat_template(one * 2, tokenize=False)
+    except Exception:
+        return 8
+    return max(0, len(tokenizer(double[len(single):], add_special_tokens=False).input_ids) - 1)
+
+
+class HistoryWindow:
+    """Chooses which turns of a conversation go into the prompt
+
+    System messages are always kept; of the other turns, the most recent
+    ones that fit in `max_tokens` are kept, and the latest turn is kept even
+    if it alone is over budget. When history has to be cut it is cut down to
+    `keep_ratio` of the budget, so the next few turns extend the same prefix
+    (and reuse its cached KV state) instead of sliding the window every turn.
+
+    Token counts are cached per message content, so each message is
+    tokenized once however many turns it stays in the window.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        max_tokens: int,
+        message_overhead: int = 0,
+        keep_ratio: float = 0.75,
+        cache_size: int = 4096
+    ):
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens
+        self.message_overhead = message_overhead
+        self.keep_ratio = keep_ratio
+        self.cache_size = cache_size
+        self._counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_tokenizer(cls, tokenizer, max_tokens: int, **kwargs) -> "HistoryWindow":
+        def count(text: str) -> int:
+            return len(tokenizer(text, add_special_tokens=False).input_ids)
+        return cls(count, max_tokens, message_overhead=chat_message_overhead(tokenizer), **kwargs)
+
+    @classmethod
+    def for_tokenizer_file(cls, path: str, max_tokens: int, **kwargs) -> "HistoryWindow":
+        """Window counting with a saved `tokenizer.json`, via `tokenizers` rather than transformers"""
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(path)
+        kwargs.setdefault("message_overhead", 8)
+        return cls(lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids), max_tokens, **kwargs)
+
+    @classmethod
+    def approximate(cls, max_tokens: int, **kwargs) -> "HistoryWindow":
+        """Window counting about one token per `APPROX_CHARS_PER_TOKEN` characters"""
+        kwargs.setdefault("message_overhead", 8)
+        return cls(lambda text: len(text) // APPROX_CHARS_PER_TOKEN + 1, max_tokens, **kwargs)
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        key = (message.get("role", ""), message.get("content", ""))
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return count
+        count = self.count_tokens(key[1]) + self.message_overhead
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = count
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def start_index(
+        self, messages: List[Dict[str, str]], start: int = 0, keep_ratio: Optional[float] = None, reserved: int = 0
+    ) -> int:
+        """Index of the first non-system message to keep, never before `start`
+
+        Pass the previous result back as `start` to keep a conversation's
+        window where it was for as long as it still fits. Callers with no
+        such state can pass `keep_ratio=1.0` to keep as much as fits.
+        `reserved` tokens of the budget are set aside, e.g. for a summary.
+        """
+        if self.max_tokens <= 0:
+            return start
+        budget = self.max_tokens - reserved - sum(self.message_tokens(m) for m in messages if m.get("role") == "system")
+        turns = [i for i, m in enumerate(messages) if m.get("role") != "system" and i >= start]
+        if not turns:
+            return start
+        total = sum(self.message_tokens(messages[i]) for i in turns)
+        if total <= budget:
+            return start
+
+        target = budget * (self.keep_ratio if keep_ratio is None else keep_ratio)
+        kept = self.message_tokens(messages[turns[-1]])
+        first = len(turns) - 1
+        while first > 0 and kept + self.message_tokens(messages[turns[first - 1]]) <= target:
+            first -= 1
+            kept += self.message_tokens(messages[turns[first]])
+        # Start on a user turn rather than a dangling assistant reply
+        while first < len(turns) - 1 and messages[turns[first]].get("role") == "assistant":
+            first += 1
+        return turns[first]
+
+    def window(
+        self, messages: List[Dict[str, str]], start: int = 0, keep_ratio: Optional[float] = None
+    ) -> List[Dict[str, str]]:
+        """The system messages plus the turns from `start_index` on"""
+        first = self.start_index(messages, start, keep_ratio)
+        return [m for i, m in enumerate(messages) if m.get("role") == "system" or i >= first]
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_tokens": self.max_tokens,
+                "cached_messages": len(self._counts),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class HistorySummary:
+    """Model-written summary standing in for a session's first `end` messages"""
+
+    def __init__(self, end: int, text: str, tokens: int):
+        self.end = end
+        self.text = text
+        self.tokens = tokens
+
+
+def summarized_window(
+    messages: List[Dict[str, str]], start: int, summary: Optional[HistorySummary] = None
+) -> List[Dict[str, str]]:
+    """The system messages, the summary if any, and the turns from `start` on
+
+    The summary is appended to the first system message (or becomes one),
+    since many chat templates only accept a system message at the start.
+    """
+    window = [m for i, m in enumerate(messages) if m.get("role") == "system" or i >= start]
+    if summary is None:
+        return window
+    note = f"{SUMMARY_HEADER}\n{summary.text}"
+    if window and window[0].get("role") == "system":
+        return [{"role": "system", "content": f"{window[0]['content']}\n\n{note}"}] + window[1:]
+    return [{"role": "system", "content": note}] + window
+
+
+class HistoryCompactor:
+    """Decides when a session's older turns are folded into its summary
+
+    Once the turns a session would send after its current summary pass
+    `threshold` tokens, everything but the most recent `keep_tokens` worth is
+    handed to the model to summarize, together with the previous summary.
+    The caller runs that as background work; until it finishes, prompts are
+    windowed as usual.
+    """
+
+    def __init__(
+        self,
+        history: HistoryWindow,
+        threshold: int,
+        keep_tokens: Optional[int] = None,
+        summary_tokens: int = 512
+    ):
+        self.history = history
+        self.threshold = threshold
+        self.keep_tokens = threshold // 2 if keep_tokens is None else keep_tokens
+        self.summary_tokens = summary_tokens
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.failed = 0
+        self.summarized_messages = 0
+
+    def plan(self, messages: List[Dict[str, str]], summary: Optional[HistorySummary] = None) -> Optional[int]:
+        """End index of the messages to summarize next, or None if it is not time yet"""
+        start = summary.end if summary is not None else 0
+        turns = [i for i, m in enumerate(messages) if m.get("role") != "system" and i >= start]
+        tokens = [self.history.message_tokens(messages[i]) for i in turns]
+        if sum(tokens) <= self.threshold:
+            return None
+        end, kept = len(turns), 0
+        while end > 0 and kept + tokens[end - 1] <= self.keep_tokens:
+            end -= 1
+            kept += tokens[end]
+        # Leave the recent turns starting on a user message
+        while end < len(turns) and messages[turns[end]].get("role") == "assistant":
+            end += 1
+        if end == 0:
+            return None
+        return turns[end] if end < len(turns) else len(messages)
+
+    def request_messages(
+        self, messages: List[Dict[str, str]], end: int, summary: Optional[HistorySummary] = None
+    ) -> List[Dict[str, str]]:
+        """The conversation asking the model for a summary of `messages[:end]`"""
+        start = summary.end if summary is not None else 0
+        parts = []
+        if summary is not None:
+            parts.append(f"Earlier summary:\n{summary.text}")
+        transcript = "\n\n".join(
+            f"{m.get('role', 'user').capitalize()}: {m.get('content', '')}"
+            for m in messages[start:end] if m.get("role") != "system"
+        )
+        parts.append(f"Conversation:\n{transcript}")
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n\n".join(parts)}
+        ]
+
+    def summary(self, end: int, text: str) -> HistorySummary:
+        return HistorySummary(end, text, self.history.count_tokens(text) + self.history.message_overhead)
+
+    def record(self, started: int = 0, completed: int = 0, failed: int = 0, summarized: int = 0):
+        with self._lock:
+            self.started += started
+            self.completed += completed
+            self.failed += failed
+            self.summarized_messages += summarized
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "keep_tokens": self.keep_tokens,
+                "started": self.started,
+                "completed": self.completed,
+                "failed": self.failed,
+                "summarized_messages": self.summarized_messages,
+            }
@@ -0,0 +1,439 @@
+"""
+Priestess AI KV Cache - Reusable attention state for prompt prefixes
+Keeps prefilled keys/values resident so requests can skip recomputing them
+"""
+
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Per-layer (key, value) tensors shaped [1, kv_heads, seq_len, head_dim]
+KVLayers = List[Tuple[torch.Tensor, torch.Tensor]]
+
+PROMPT_CACHE_FILE = "prompt_kv.pt"
+
+# "auto" keeps keys/values in the model's dtype; the others store 8-bit codes
+# with one scale per token and head
+KV_CACHE_DTYPES = ("auto", "int8", "fp8")
+# Trailing bytes of each packed head vector holding its float16 scale
+KV_SCALE_BYTES = 2
+
+
+def default_cache_dir(model_path: str) -> str:
+    """Cache directory kept beside (not inside) the model directory"""
+    return os.path.normpath(model_path) + ".priestess-cache"
+
+
+def model_fingerprint(model_path: str, dtype: torch.dtype, variants: Sequence[str] = ()) -> str:
+    """Identify the weights a cache was computed with
+
+    `variants` names non-default settings that change the cached values, such
+    as quantization modes.
+    """
+    digest = hashlib.sha256()
+    config_path = os.path.join(model_path, "config.json")
+    if os.path.exists(config_path):
+        with open(config_path, "rb") as f:
+            digest.update(f.read())
+    index_path = os.path.join(model_path, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        digest.update(str(os.path.getmtime(index_path)).encode())
+    digest.update(str(dtype).encode())
+    for variant in variants:
+        digest.update(variant.encode())
+    return digest.hexdigest()
+
+
+def pack_kv(states: torch.Tensor, kv_dtype: str) -> torch.Tensor:
+    """Quantize key or value states to 8 bits per element with a scale per head vector
+
+    The result is an int8 tensor shaped like `states` with `KV_SCALE_BYTES`
+    extra elements on the last dimension holding each vector's scale, so
+    batching code that concatenates, pads or gathers along the other
+    dimensions handles packed states unchanged. All-zero padding unpacks to 0.
+    """
+    states = states.float()
+    amax = states.abs().amax(dim=-1, keepdim=True)
+    if kv_dtype == "int8":
+        scale = (amax / 127).clamp(min=1e-6).to(torch.float16)
+        codes = torch.round(states / scale.float()).clamp(-127, 127).to(torch.int8)
+    elif kv_dtype == "fp8":
+        # float8 e4m3 codes, emulated: stored as bytes and widened before use
+        scale = (amax / 448).clamp(min=1e-6).to(torch.float16)
+        codes = (states / scale.float()).clamp(-448, 448).to(torch.float8_e4m3fn).view(torch.int8)
+    else:
+        raise ValueError(f"Unknown KV cache dtype {kv_dtype!r}; expected one of {', '.join(KV_CACHE_DTYPES)}")
+    return torch.cat([codes, scale.view(torch.int8)], dim=-1)
+
+
+def unpack_kv(packed: torch.Tensor, kv_dtype: str, dtype: torch.dtype) -> torch.Tensor:
+    """Dequantize states packed by `pack_kv` to `dtype`"""
+    codes = packed[..., :-KV_SCALE_BYTES]
+    scale = packed[..., -KV_SCALE_BYTES:].contiguous().view(torch.float16).float()
+    if kv_dtype == "fp8":
+        codes = codes.contiguous().view(torch.float8_e4m3fn)
+    return (codes.float() * scale).to(dtype)
+
+
+def slice_layers(layers: KVLayers, length: int) -> KVLayers:
+    """Keep the first `length` cached positions"""
+    return [(k[:, :, :length], v[:, :, :length]) for k, v in layers]
+
+
+@dataclass
+class PrefixEntry:
+    """Prefilled KV state for one token prefix"""
+    name: str
+    token_ids: Tuple[int, ...]
+    layers: KVLayers
+
+
+class PromptKVCache:
+    """Resident KV state for the fixed system prompts of the specialist endpoints
+
+    Entries are computed once when the model loads, forked (never mutated) by
+    every request whose prompt starts with them, and saved to disk so that a
+    restart can memory-map them instead of prefilling again.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, PrefixEntry] = {}
+        self.hits = 0
+        self.misses = 0
+        self.hit_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str, token_ids: List[int], layers: KVLayers):
+        """Register the KV state for a named prefix"""
+        self.entries[name] = PrefixEntry(name, tuple(token_ids), layers)
+
+    def get(self, name: str) -> Optional[PrefixEntry]:
+        return self.entries.get(name)
+
+    def lookup(self, prompt_ids: List[int]) -> Tuple[int, Optional[KVLayers]]:
+        """Find the longest cached prefix of `prompt_ids`
+
+        Returns the number of cached tokens and their KV state. At least one
+        prompt token is always left uncached so the model produces logits.
+        """
+        best: Optional[PrefixEntry] = None
+        for entry in self.entries.values():
+            n = len(entry.token_ids)
+            if n <= len(prompt_ids) and tuple(prompt_ids[:n]) == entry.token_ids:
+                if best is None or n > len(best.token_ids):
+                    best = entry
+
+        # Nothing is reusable when the one token left uncached is the whole match
+        length = min(len(best.token_ids), len(prompt_ids) - 1) if best is not None else 0
+        with self._lock:
+            if length <= 0:
+                self.misses += 1
+                return 0, None
+            self.hits += 1
+            self.hit_tokens += length
+
+        if length < len(best.token_ids):
+            return length, slice_layers(best.layers, length)
+        return length, best.layers
+
+    def save(self, path: str, fingerprint: str):
+        """Write all entries to `path` for reuse by the next process"""
+        payload = {
+            "fingerprint": fingerprint,
+            "entries": {
+                name: {
+                    "token_ids": torch.tensor(entry.token_ids, dtype=torch.long),
+                    "keys": [k.detach().cpu().contiguous() for k, _ in entry.layers],
+                    "values": [v.detach().cpu().contiguous() for _, v in entry.layers],
+                }
+                for name, entry in self.entries.items()
+            },
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Per-process name: several workers may save the same cache at once
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(payload, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved prompt KV cache ({len(self.entries)} prefixes) to {path}")
+
+    def load(self, path: str, fingerprint: str, device: Optional[torch.device] = None) -> int:
+        """Memory-map entries saved by a previous process
+
+        Entries are only accepted when they were computed with the same model.
+        Returns the number of entries loaded.
+        """
+        if not os.path.exists(path):
+            return 0
+        try:
+            payload = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        except TypeError:
+            # torch < 2.1 has no mmap support
+            payload = torch.load(path, map_location="cpu")
+        if payload.get("fingerprint") != fingerprint:
+            logger.info(f"Ignoring stale prompt KV cache at {path}")
+            return 0
+
+        for name, data in payload["entries"].items():
+            layers = list(zip(data["keys"], data["values"]))
+            if device is not None and torch.device(device).type != "cpu":
+                layers = [(k.to(device), v.to(device)) for k, v in layers]
+            self.add(name, data["token_ids"].tolist(), layers)
+        logger.info(f"Loaded prompt KV cache ({len(payload['entries'])} prefixes) from {path}")
+        return len(payload["entries"])
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "prefixes": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_tokens": self.hit_tokens,
+            }
+
+
+def layers_nbytes(layers: KVLayers) -> int:
+    return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+
+
+class RadixNode:
+    """Edge of the radix tree holding the KV state of its token span"""
+
+    def __init__(self, key: Tuple[int, ...] = (), layers: Optional[KVLayers] = None, parent=None):
+        self.key = key
+        self.layers = layers
+        self.parent: Optional["RadixNode"] = parent
+        self.children: Dict[int, "RadixNode"] = {}
+        self.last_access = time.monotonic()
+        # Holders (e.g. live sessions) that keep this path from being evicted
+        self.lock_ref = 0
+        self.nbytes = layers_nbytes(layers) if layers else 0
+
+
+class RadixPrefixCache:
+    """Token-level prefix cache shared by all requests
+
+    Finished sequences insert their KV state keyed by token ids. Edges are
+    split where sequences diverge, so conversations that share history share
+    storage. A new request resumes from the longest cached prefix of its
+    prompt; least recently used leaves are evicted to stay within
+    `max_bytes`.
+
+    Evictable leaves are kept in a heap by last access, so eviction does not
+    walk the tree. Entries go stale when a leaf is touched, pinned, grows a
+    child or is evicted, and are skipped when popped.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.root = RadixNode()
+        self.total_bytes = 0
+        self.num_nodes = 0
+        # (last access, tie breaker, node) of leaves that may be evictable
+        self._leaves: List[Tuple[float, int, RadixNode]] = []
+        self._leaf_ids = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.hit_tokens = 0
+        self.lookup_tokens = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt_ids: List[int]) -> Tuple[int, Optional[KVLayers]]:
+        """Find the longest cached prefix of `prompt_ids`
+
+        Returns the number of cached tokens and their KV state. At least one
+        prompt token is always left uncached so the model produces logits.
+        """
+        with self._lock:
+            path, length = self._match(prompt_ids[:-1])
+            self.lookup_tokens += len(prompt_ids)
+            if length == 0:
+                self.misses += 1
+                return 0, None
+            self.hits += 1
+            self.hit_tokens += length
+
+            now = time.monotonic()
+            pieces = []
+            remaining = length
+            for node in path:
+                node.last_access = now
+                take = min(len(node.key), remaining)
+                pieces.append(node.layers if take == len(node.key) else slice_layers(node.layers, take))
+                remaining -= take
+            self._push_leaf(path[-1])
+
+        if len(pieces) == 1:
+            return length, pieces[0]
+        layers = [
+            (torch.cat([p[i][0] for p in pieces], dim=2), torch.cat([p[i][1] for p in pieces], dim=2))
+            for i in range(len(pieces[0]))
+        ]
+        return length, layers
+
+    def insert(self, token_ids: List[int], layers: KVLayers, lock: bool = False) -> Optional[RadixNode]:
+        """Cache the KV state of `token_ids`; `layers` must cover every token
+
+        Returns the node ending at the last token. With `lock`, its path is
+        pinned as with lock() before anything is evicted, so the sequence
+        stays resident even if it alone is over budget; the caller releases
+        it with unlock(). Either way the eviction this insert triggers never
+        drops the sequence just inserted.
+        """
+        if not token_ids or self.max_bytes <= 0:
+            return None
+        with self._lock:
+            node = self.root
+            offset = 0
+            while offset < len(token_ids):
+                child = node.children.get(token_ids[offset])
+                if child is None:
+                    key = tuple(token_ids[offset:])
+                    span = [(k[:, :, offset:].clone(), v[:, :, offset:].clone()) for k, v in layers]
+                    child = RadixNode(key, span, parent=node)
+                    node.children[key[0]] = child
+                    self.total_bytes += child.nbytes
+                    self.num_nodes += 1
+                    node = child
+                    break
+                common = self._common_length(child.key, token_ids, offset)
+                if common < len(child.key):
+                    child = self._split(child, common)
+                node = child
+                node.last_access = time.monotonic()
+                offset += common
+
+            node.last_access = time.monotonic()
+            if node is self.root:
+                return None
+            self._pin(node, 1)
+            self._evict()
+            if not lock:
+                self._pin(node, -1)
+            return node
+
+    def lock(self, node: Optional[RadixNode]):
+        """Pin the path ending at `node` so it is never evicted"""
+        with self._lock:
+            self._pin(node, 1)
+
+    def unlock(self, node: Optional[RadixNode]):
+        """Release a pin taken with lock() or insert(lock=True)"""
+        with self._lock:
+            self._pin(node, -1)
+            self._evict()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "hit_tokens": self.hit_tokens,
+                "token_hit_rate": self.hit_tokens / self.lookup_tokens if self.lookup_tokens else 0.0,
+                "evictions": self.evictions,
+                "nodes": self.num_nodes,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ------------------------------------------------------------------
+    # Tree maintenance (callers hold self._lock)
+    # ------------------------------------------------------------------
+
+    def _match(self, token_ids: List[int]) -> Tuple[List[RadixNode], int]:
+        path = []
+        node = self.root
+        offset = 0
+        while offset < len(token_ids):
+            child = node.children.get(token_ids[offset])
+            if child is None:
+                break
+            common = self._common_length(child.key, token_ids, offset)
+            path.append(child)
+            offset += common
+            if common < len(child.key):
+                break
+            node = child
+        return path, offset
+
+    @staticmethod
+    def _common_length(key: Tuple[int, ...], token_ids: List[int], offset: int) -> int:
+        n = 0
+        limit = min(len(key), len(token_ids) - offset)
+        while n < limit and key[n] == token_ids[offset + n]:
+            n += 1
+        return n
+
+    def _split(self, node: RadixNode, at: int) -> RadixNode:
+        """Split `node` so its first `at` tokens become a new parent node"""
+        head_layers = [(k[:, :, :at].clone(), v[:, :, :at].clone()) for k, v in node.layers]
+        tail_layers = [(k[:, :, at:].clone(), v[:, :, at:].clone()) for k, v in node.layers]
+        head = RadixNode(node.key[:at], head_layers, parent=node.parent)
+        head.last_access = node.last_access
+        head.lock_ref = node.lock_ref
+        node.parent.children[node.key[0]] = head
+        self.num_nodes += 1
+
+        self.total_bytes -= node.nbytes
+        node.key = node.key[at:]
+        node.layers = tail_layers
+        node.nbytes = layers_nbytes(tail_layers)
+        node.parent = head
+        head.children[node.key[0]] = node
+        self.total_bytes += head.nbytes + node.nbytes
+        return head
+
+    def _pin(self, node: Optional[RadixNode], delta: int):
+        leaf = node
+        while node is not None and node is not self.root:
+            node.lock_ref = max(0, node.lock_ref + delta)
+            node = node.parent
+        if delta < 0 and leaf is not None:
+            self._push_leaf(leaf)
+
+    def _attached(self, node: RadixNode) -> bool:
+        return node.parent is not None and node.parent.children.get(node.key[0]) is node
+
+    def _evictable(self, node: RadixNode) -> bool:
+        return node is not self.root and not node.children and node.lock_ref == 0 and self._attached(node)
+
+    def _push_leaf(self, node: RadixNode):
+        """Queue `node` for eviction if it is an unpinned leaf, as of its current last access"""
+        if not self._evictable(node):
+            return
+        heapq.heappush(self._leaves, (node.last_access, next(self._leaf_ids), node))
+        if len(self._leaves) > 2 * self.num_nodes + 64:
+            # Mostly stale entries; rebuild from the leaves that are evictable now
+            self._leaves = []
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                if self._evictable(node):
+                    self._leaves.append((node.last_access, next(self._leaf_ids), node))
+                stack.extend(node.children.values())
+            heapq.heapify(self._leaves)
+
+    def _evict(self):
+        """Drop least recently used unpinned leaves until under budget"""
+        while self.total_bytes > self.max_bytes and self._leaves:
+            last_access, _, victim = heapq.heappop(self._leaves)
+            if last_access != victim.last_access or not self._evictable(victim):
+                continue
+            parent = victim.parent
+            del parent.children[victim.key[0]]
+            self.total_bytes -= victim.nbytes
+            self.num_nodes -= 1
+            self.evictions += 1
+            self._push_leaf(parent)
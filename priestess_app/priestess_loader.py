@@ -0,0 +1,233 @@
+"""
+Priestess AI Loader - Memory-mapped safetensors weights
+Parameters alias the checkpoint files, so every process serving the same model
+on one host shares a single page-cache copy of the weights and startup does
+not wait for them to be read
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_CHUNK_BYTES = 16 * 1024 * 1024
+
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+class LoadProgress:
+    """Thread-safe record of how far model loading has got, for health checks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase = "idle"
+        self.error: Optional[str] = None
+        self.total_bytes = 0
+        self.loaded_bytes = 0
+        self.shards_total = 0
+        self.shards_done = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def set_phase(self, phase: str):
+        with self._lock:
+            if self.started is None:
+                self.started = time.time()
+            self.phase = phase
+            if phase in ("ready", "failed"):
+                self.finished = time.time()
+
+    def fail(self, error: BaseException):
+        with self._lock:
+            self.error = str(error)
+        self.set_phase("failed")
+
+    def add_shards(self, files: List[str]):
+        with self._lock:
+            self.shards_total += len(files)
+            self.total_bytes += sum(os.path.getsize(path) for path in files)
+
+    def advance(self, nbytes: int = 0, shard_done: bool = False):
+        with self._lock:
+            self.loaded_bytes += nbytes
+            if shard_done:
+                self.shards_done += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            end = self.finished or time.time()
+            return {
+                "phase": self.phase,
+                "bytes_loaded": self.loaded_bytes,
+                "bytes_total": self.total_bytes,
+                "shards_loaded": self.shards_done,
+                "shards_total": self.shards_total,
+                "percent": round(100.0 * self.loaded_bytes / self.total_bytes, 1) if self.total_bytes else 0.0,
+                "elapsed": end - self.started if self.started else 0.0,
+                "error": self.error,
+            }
+
+
+def prefetch_files(files: List[str], progress: Optional[LoadProgress] = None, max_workers: int = 4) -> threading.Thread:
+    """Read checkpoint shards into the page cache concurrently, in the background
+
+    Memory-mapped weights fault their pages in on first use; prefetching
+    turns those faults into page cache hits without delaying startup.
+    """
+    def read(path: str):
+        buffer = bytearray(PREFETCH_CHUNK_BYTES)
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                if progress is not None:
+                    progress.advance(n)
+        if progress is not None:
+            progress.advance(shard_done=True)
+
+    def run():
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(files))), thread_name_prefix="priestess-prefetch") as pool:
+            for future in [pool.submit(read, path) for path in files]:
+                try:
+                    future.result()
+                except OSError as e:
+                    logger.warning(f"Could not prefetch checkpoint shard: {e}")
+        logger.info(f"Prefetched {len(files)} checkpoint shards")
+
+    if progress is not None:
+        progress.add_shards(files)
+    thread = threading.Thread(target=run, name="priestess-prefetch", daemon=True)
+    thread.start()
+    return thread
+
+
+def safetensors_files(model_path: str) -> List[str]:
+    """Checkpoint shards of a model directory, in index order"""
+    index_path = os.path.join(model_path, "model.safetensors.index.json")
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            weight_map = json.load(f)["weight_map"]
+        return [os.path.join(model_path, name) for name in sorted(set(weight_map.values()))]
+    single = os.path.join(model_path, "model.safetensors")
+    return [single] if os.path.exists(single) else []
+
+
+def read_safetensors_header(path: str) -> Dict:
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    header.pop("__metadata__", None)
+    return {"data_start": 8 + length, "tensors": header}
+
+
+def mmap_safetensors(path: str) -> Dict[str, torch.Tensor]:
+    """Map a safetensors file and return tensors that alias its pages
+
+    The mapping is private: pages are read from the shared page cache and only
+    copied if a tensor is written to.
+    """
+    header = read_safetensors_header(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    tensors = {}
+    for name, info in header["tensors"].items():
+        dtype = SAFETENSORS_DTYPES.get(info["dtype"])
+        if dtype is None:
+            raise ValueError(f"Unsupported safetensors dtype {info['dtype']} for {name}")
+        start = header["data_start"] + info["data_offsets"][0]
+        itemsize = torch.empty(0, dtype=dtype).element_size()
+        if start % itemsize:
+            raise ValueError(f"Tensor {name} in {path} is not aligned for memory mapping")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(storage, start // itemsize, info["shape"])
+    return tensors
+
+
+def checkpoint_dtype(model_path: str) -> Optional[torch.dtype]:
+    """Floating point dtype the checkpoint is stored in"""
+    for path in safetensors_files(model_path):
+        for info in read_safetensors_header(path)["tensors"].values():
+            dtype = SAFETENSORS_DTYPES.get(info["dtype"])
+            if dtype is not None and dtype.is_floating_point:
+                return dtype
+    return None
+
+
+def empty_model(model_path: str, trust_remote_code: bool = True):
+    """Instantiate a model from its config without allocating its parameters"""
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    config = AutoConfig.from_pretrained(model_path, trust_remote_code=trust_remote_code)
+    try:
+        from accelerate import init_empty_weights
+        with init_empty_weights(include_buffers=False):
+            return AutoModelForCausalLM.from_config(config, trust_remote_code=trust_remote_code)
+    except ImportError:
+        return AutoModelForCausalLM.from_config(config, trust_remote_code=trust_remote_code)
+
+
+def finish_model(model, model_path: str) -> bool:
+    """Prepare a model assembled from an empty one for inference
+
+    Returns False if some parameters were never assigned.
+    """
+    from transformers import GenerationConfig
+
+    model.tie_weights()
+    missing = [name for name, param in model.named_parameters() if param.is_meta]
+    if missing:
+        logger.info(f"Checkpoint does not cover {len(missing)} parameters")
+        return False
+    try:
+        model.generation_config = GenerationConfig.from_pretrained(model_path)
+    except OSError:
+        pass
+    model.eval()
+    return True
+
+
+def load_mmap_model(model_path: str, torch_dtype="auto", trust_remote_code: bool = True):
+    """Build a CPU model whose parameters are memory-mapped from the checkpoint
+
+    Returns None when the checkpoint cannot be used as-is (no safetensors
+    shards, or a dtype conversion is needed); callers then fall back to
+    `from_pretrained`.
+    """
+    files = safetensors_files(model_path)
+    stored_dtype = checkpoint_dtype(model_path)
+    if not files or stored_dtype is None:
+        return None
+    if torch_dtype not in ("auto", None):
+        wanted = getattr(torch, torch_dtype) if isinstance(torch_dtype, str) else torch_dtype
+        if wanted != stored_dtype:
+            logger.info(f"Checkpoint is {stored_dtype}, {wanted} requested; not memory-mapping weights")
+            return None
+
+    model = empty_model(model_path, trust_remote_code)
+    state_dict = {}
+    for path in files:
+        state_dict.update(mmap_safetensors(path))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    if not finish_model(model, model_path):
+        return None
+    return model
@@ -0,0 +1,262 @@
+"""
+Priestess AI Quantization - Low-bit CPU weights
+Replaces the model's linear layers with int8 (dynamically quantized
+activations) or int4 (weight-only, grouped) equivalents after loading, and
+caches the converted checkpoint so the conversion runs once per model
+"""
+
+import logging
+import os
+from typing import Dict, Optional
+
+import torch
+from torch import nn
+
+from priestess_loader import empty_model, finish_model
+
+logger = logging.getLogger(__name__)
+
+QUANTIZATION_MODES = ("none", "int8-dynamic", "int4-weight-only")
+INT4_GROUP_SIZES = (128, 64, 32)
+QUANTIZED_CACHE_VERSION = 1
+
+
+class Int8DynamicLinear(nn.Module):
+    """Linear layer with per-channel int8 weights; activations are quantized per call"""
+
+    def __init__(self, in_features: int, out_features: int, bias: bool = True, dtype=torch.float32, device=None):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.register_buffer("weight_int8", torch.empty(out_features, in_features, dtype=torch.int8, device=device))
+        self.register_buffer("weight_scale", torch.empty(out_features, dtype=torch.float32, device=device))
+        self.register_buffer("bias", torch.empty(out_features, dtype=dtype, device=device) if bias else None)
+        self._packed = None
+
+    @classmethod
+    def from_linear(cls, linear: nn.Linear) -> "Int8DynamicLinear":
+        weight = linear.weight.detach().float()
+        scale = (weight.abs().amax(dim=1) / 127).clamp(min=1e-8)
+        module = cls(linear.in_features, linear.out_features, linear.bias is not None, dtype=linear.weight.dtype)
+        module.weight_int8 = torch.round(weight / scale[:, None]).clamp(-127, 127).to(torch.int8)
+        module.weight_scale = scale
+        if linear.bias is not None:
+            module.bias = linear.bias.detach().clone()
+        return module
+
+    def _pack(self):
+        qweight = torch._make_per_channel_quantized_tensor(
+            self.weight_int8,
+            self.weight_scale.double(),
+            torch.zeros(self.out_features, dtype=torch.long),
+            0
+        )
+        bias = None if self.bias is None else self.bias.float()
+        self._packed = torch.ops.quantized.linear_prepack(qweight, bias)
+        # The packed copy is all forward needs; state_dict unpacks it again
+        self.weight_int8 = None
+        self.weight_scale = None
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        if self._packed is not None:
+            qweight, _ = torch.ops.quantized.linear_unpack(self._packed)
+            destination[prefix + "weight_int8"] = qweight.int_repr()
+            destination[prefix + "weight_scale"] = qweight.q_per_channel_scales().float()
+            if self.bias is not None:
+                destination[prefix + "bias"] = self.bias
+            return
+        super()._save_to_state_dict(destination, prefix, keep_vars)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self._packed is None:
+            self._pack()
+        out = torch.ops.quantized.linear_dynamic(x.reshape(-1, self.in_features).float(), self._packed, True)
+        return out.to(x.dtype).reshape(*x.shape[:-1], self.out_features)
+
+    def extra_repr(self) -> str:
+        return f"in_features={self.in_features}, out_features={self.out_features}, bias={self.bias is not None}"
+
+
+class Int4WeightOnlyLinear(nn.Module):
+    """Linear layer with asymmetric int4 weights in groups along the input dimension
+
+    Weights are dequantized inside torch's packed int4 CPU matmul; activations
+    stay in bfloat16.
+    """
+
+    def __init__(self, in_features: int, out_features: int, bias: bool = True, group_size: int = 128,
+                 dtype=torch.float32, device=None):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.group_size = group_size
+        self.register_buffer("packed", torch.empty(out_features, in_features // 2, dtype=torch.uint8, device=device))
+        self.register_buffer(
+            "scales_and_zeros",
+            torch.empty(in_features // group_size, out_features, 2, dtype=torch.bfloat16, device=device)
+        )
+        self.register_buffer("bias", torch.empty(out_features, dtype=dtype, device=device) if bias else None)
+
+    @classmethod
+    def from_linear(cls, linear: nn.Linear, group_size: int) -> "Int4WeightOnlyLinear":
+        weight = linear.weight.detach().float().reshape(linear.out_features, -1, group_size)
+        low = weight.amin(dim=2, keepdim=True)
+        scales = ((weight.amax(dim=2, keepdim=True) - low) / 15).clamp(min=1e-6)
+        q = torch.round((weight - low) / scales).clamp(0, 15).to(torch.int32)
+        # The kernel computes (q - 8) * scale + zero
+        zeros = low + scales * 8
+        module = cls(linear.in_features, linear.out_features, linear.bias is not None, group_size, dtype=linear.weight.dtype)
+        module.packed = torch._convert_weight_to_int4pack_for_cpu(q.reshape(linear.out_features, -1), 2)
+        module.scales_and_zeros = torch.stack([scales, zeros], dim=-1).squeeze(2).transpose(0, 1).contiguous().to(torch.bfloat16)
+        if linear.bias is not None:
+            module.bias = linear.bias.detach().clone()
+        return module
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = torch._weight_int4pack_mm_for_cpu(
+            x.reshape(-1, self.in_features).to(torch.bfloat16),
+            self.packed,
+            self.group_size,
+            self.scales_and_zeros
+        )
+        out = out.to(x.dtype).reshape(*x.shape[:-1], self.out_features)
+        if self.bias is not None:
+            out = out + self.bias
+        return out
+
+    def extra_repr(self) -> str:
+        return (f"in_features={self.in_features}, out_features={self.out_features}, "
+                f"bias={self.bias is not None}, group_size={self.group_size}")
+
+
+def int4_group_size(linear: nn.Linear) -> Optional[int]:
+    """Largest supported group size dividing the layer's input dimension
+
+    None if the packed kernel cannot take the layer's shape at all.
+    """
+    if linear.out_features % 16:
+        return None
+    for group_size in INT4_GROUP_SIZES:
+        if linear.in_features % group_size == 0:
+            return group_size
+    return None
+
+
+def set_submodule(model: nn.Module, name: str, module: nn.Module):
+    parent_name, _, child = name.rpartition(".")
+    setattr(model.get_submodule(parent_name) if parent_name else model, child, module)
+
+
+def unsupported_reason(mode: str) -> Optional[str]:
+    """Why this torch build cannot run `mode`, or None if it can"""
+    if mode == "int4-weight-only" and not hasattr(torch, "_weight_int4pack_mm_for_cpu"):
+        # The CPU int4 matmul kernel first shipped in torch 2.6
+        return f"int4-weight-only quantization needs torch>=2.6 (found {torch.__version__})"
+    return None
+
+
+def quantize_model(model: nn.Module, mode: str) -> nn.Module:
+    """Swap the model's linear layers for quantized ones, in place
+
+    An output projection tied to the input embeddings is left alone, since
+    quantizing it would add a second copy of the embedding matrix.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {', '.join(QUANTIZATION_MODES)}")
+    if mode == "none":
+        return model
+    reason = unsupported_reason(mode)
+    if reason is not None:
+        raise RuntimeError(reason)
+
+    tied = None
+    output, embeddings = model.get_output_embeddings(), model.get_input_embeddings()
+    if output is not None and embeddings is not None and output.weight is embeddings.weight:
+        tied = output
+
+    converted = skipped = 0
+    for name, module in list(model.named_modules()):
+        if type(module) is not nn.Linear or module is tied:
+            continue
+        if mode == "int8-dynamic":
+            set_submodule(model, name, Int8DynamicLinear.from_linear(module))
+        else:
+            group_size = int4_group_size(module)
+            if group_size is None:
+                skipped += 1
+                continue
+            set_submodule(model, name, Int4WeightOnlyLinear.from_linear(module, group_size))
+        converted += 1
+    logger.info(f"Quantized {converted} linear layers to {mode}" + (f" ({skipped} left unquantized)" if skipped else ""))
+    return model
+
+
+def quantized_layout(model: nn.Module) -> Dict[str, Dict]:
+    """Constructor arguments of each quantized layer, to rebuild an empty model"""
+    layout = {}
+    for name, module in model.named_modules():
+        if isinstance(module, Int8DynamicLinear):
+            layout[name] = {"kind": "int8", "in_features": module.in_features, "out_features": module.out_features,
+                            "bias": module.bias is not None}
+        elif isinstance(module, Int4WeightOnlyLinear):
+            layout[name] = {"kind": "int4", "in_features": module.in_features, "out_features": module.out_features,
+                            "bias": module.bias is not None, "group_size": module.group_size}
+    return layout
+
+
+def save_quantized(model: nn.Module, path: str, fingerprint: str, mode: str):
+    """Write a quantized model's weights, replacing any previous file atomically"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        "version": QUANTIZED_CACHE_VERSION,
+        "fingerprint": fingerprint,
+        "mode": mode,
+        "layout": quantized_layout(model),
+        "state": model.state_dict(),
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(payload, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved {mode} weights to {path}")
+
+
+def read_quantized(path: str, fingerprint: str, mode: str) -> Optional[Dict]:
+    """The memory-mapped contents of a file written by `save_quantized`
+
+    Returns None if the file is missing or was made from other weights or
+    with another mode.
+    """
+    if not os.path.exists(path):
+        return None
+    payload = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    if (payload.get("version") != QUANTIZED_CACHE_VERSION or payload.get("fingerprint") != fingerprint
+            or payload.get("mode") != mode):
+        logger.info(f"Quantized weights in {path} are stale")
+        return None
+    return payload
+
+
+def load_quantized(model_path: str, path: str, fingerprint: str, mode: str):
+    """Rebuild a quantized model from a file written by `save_quantized`
+
+    Tensors are memory-mapped from the file. Returns None if the file is
+    missing or stale.
+    """
+    payload = read_quantized(path, fingerprint, mode)
+    if payload is None:
+        return None
+
+    model = empty_model(model_path)
+    for name, spec in payload["layout"].items():
+        original = model.get_submodule(name)
+        dtype = original.weight.dtype
+        if spec["kind"] == "int8":
+            module = Int8DynamicLinear(spec["in_features"], spec["out_features"], spec["bias"], dtype=dtype, device="meta")
+        else:
+            module = Int4WeightOnlyLinear(spec["in_features"], spec["out_features"], spec["bias"], spec["group_size"],
+                                          dtype=dtype, device="meta")
+        set_submodule(model, name, module)
+    model.load_state_dict(payload["state"], strict=False, assign=True)
+    if not finish_model(model, model_path):
+        return None
+    return model
@@ -0,0 +1,273 @@
+"""
+Priestess AI Response Cache - Reuse answers to repeated stateless requests
+Keys responses by a canonical hash of the conversation and the effective
+generation parameters, in a size-bounded LRU in memory and optionally on disk
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from priestess_engine import SamplingParams
+
+logger = logging.getLogger(__name__)
+
+# Values of the X-Cache response header
+CACHE_HIT = "HIT"
+CACHE_SEMANTIC_HIT = "HIT-SEMANTIC"
+CACHE_MISS = "MISS"
+CACHE_BYPASS = "BYPASS"
+
+
+@dataclass
+class CacheLookup:
+    """Outcome of looking one request up in the response caches"""
+    status: str  # X-Cache value
+    response: Optional[str] = None  # The cached answer, on a hit
+    key: Optional[str] = None  # Exact cache and coalescing key; None if answers may not be shared
+    probe: Optional[Tuple[str, Any]] = None  # Semantic cache namespace and query embedding
+
+
+def is_deterministic(params: SamplingParams) -> bool:
+    return not params.do_sample or not params.temperature
+
+
+def response_cache_key(messages: List[Dict[str, str]], params: SamplingParams, model_id: str) -> str:
+    """Canonical hash of a request's conversation and effective generation parameters
+
+    Settings that do not change a greedy answer (temperature, top_p and
+    prompt lookup) are left out for deterministic requests, so callers that
+    spell the same request differently share an entry.
+    """
+    effective = asdict(params)
+    effective.pop("prompt_lookup", None)
+    if is_deterministic(params):
+        effective = {"max_new_tokens": params.max_new_tokens, "do_sample": False}
+    payload = {
+        "model": model_id,
+        "messages": [{"role": m.get("role", ""), "content": m.get("content", "")} for m in messages],
+        "params": effective,
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LRU cache of generated responses with a time-to-live
+
+    The memory tier holds up to `max_bytes` of response text. With a
+    `disk_dir`, entries are also written there as small JSON files (up to
+    `disk_max_bytes`), so they survive restarts and are shared by servers
+    using the same directory: a lookup that misses memory reads the entry's
+    file even if this server has not indexed it. Disk hits are promoted back
+    into memory.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float = 3600.0,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 1024 ** 3
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        # key -> (expiry time, response)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> file size, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.expired = 0
+        if disk_dir is not None:
+            self._scan_disk()
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached response for `key`, or None if missing or expired"""
+        now = time.time()
+        expired = False
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires, response = entry
+                if expires > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return response
+                self._drop_memory(key)
+                expired = True
+            on_disk = key in self._disk
+
+        if self.disk_dir is not None:
+            # Checked even when not indexed, since other servers sharing the
+            # directory write entries too
+            entry = self._read_disk(key)
+            if entry is not None and entry[0] > now:
+                expires, response, size = entry
+                with self._lock:
+                    self._store_memory(key, expires, response)
+                    evict = self._index_disk(key, size)
+                    self.hits += 1
+                    self.disk_hits += 1
+                for oldest in evict:
+                    self._unlink(oldest)
+                self._touch(key)
+                return response
+            if entry is not None or on_disk:
+                # Expired, or gone or unreadable and not worth keeping
+                self._remove_disk(key)
+                expired = expired or entry is not None
+
+        with self._lock:
+            self.expired += expired
+            self.misses += 1
+        return None
+
+    def put(self, key: str, response: str):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, expires, response)
+            self.stores += 1
+        if self.disk_dir is not None:
+            self._write_disk(key, expires, response)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            keys = list(self._disk)
+        for key in keys:
+            self._remove_disk(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "expired": self.expired,
+            }
+
+    # ------------------------------------------------------------------
+    # Memory tier; callers hold _lock
+    # ------------------------------------------------------------------
+
+    def _store_memory(self, key: str, expires: float, response: str):
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (expires, response)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            self._drop_memory(next(iter(self._memory)))
+
+    def _drop_memory(self, key: str):
+        _, response = self._memory.pop(key)
+        self._memory_bytes -= len(response.encode("utf-8"))
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _scan_disk(self):
+        """Index the entries already on disk, oldest first"""
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        if entries:
+            logger.info(f"Response cache has {len(entries)} entries on disk in {self.disk_dir}")
+
+    def _read_disk(self, key: str) -> Optional[Tuple[float, str, int]]:
+        """Expiry time, response and file size of an entry on disk"""
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            entry = json.loads(data.decode("utf-8"))
+            return float(entry["expires"]), entry["response"], len(data)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_disk(self, key: str, expires: float, response: str):
+        path = self._path(key)
+        data = json.dumps({"expires": expires, "response": response}, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.disk_max_bytes:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cached response to {path}: {e}")
+            return
+        with self._lock:
+            evict = self._index_disk(key, len(data))
+        for oldest in evict:
+            self._unlink(oldest)
+
+    def _index_disk(self, key: str, size: int) -> List[str]:
+        """Index an entry as most recently used; returns the keys evicted for it. Callers hold _lock"""
+        self._disk_bytes += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+        evict = []
+        while self._disk_bytes > self.disk_max_bytes:
+            oldest, oldest_size = self._disk.popitem(last=False)
+            self._disk_bytes -= oldest_size
+            evict.append(oldest)
+        return evict
+
+    def _touch(self, key: str):
+        """Mark a disk entry recently used, so the order survives a restart"""
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _remove_disk(self, key: str):
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+        self._unlink(key)
+
+    def _unlink(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
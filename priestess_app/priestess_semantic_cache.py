@@ -0,0 +1,111 @@
+"""
+Priestess AI Semantic Cache - Answers for near-duplicate specialist queries
+Embeds queries with the loaded model and looks up answers to similar earlier
+queries with a vectorized cosine search over a NumPy index
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def namespace_id(namespace: str) -> int:
+    """Fold a hex namespace digest into the index's int64 namespace column"""
+    return int(namespace[:15], 16)
+
+
+class SemanticCache:
+    """Fixed-capacity vector index of answered queries
+
+    Query vectors are unit length, so cosine similarity against every entry
+    is a single matrix-vector product. Entries only match queries in the same
+    namespace (endpoint, system prompt, generation parameters and model) and
+    expire after `ttl` seconds. When the index is full, an expired entry or
+    else the least recently used one is replaced.
+    """
+
+    def __init__(self, max_entries: int = 4096, threshold: float = 0.92, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        # Allocated on the first insert, once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._namespaces = np.zeros(max_entries, dtype=np.int64)
+        self._expires = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._responses: List[Optional[str]] = [None] * max_entries
+        self._size = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.inserts = 0
+        self.evictions = 0
+        self.search_time = 0.0
+        self.embed_time = 0.0
+        self.embeddings = 0
+
+    def search(self, namespace: str, vector: np.ndarray) -> Optional[str]:
+        """The answer to the most similar cached query, if it clears the threshold"""
+        now = time.time()
+        with self._lock:
+            started = time.perf_counter()
+            self.lookups += 1
+            response = None
+            if self._size and self._vectors is not None and self._vectors.shape[1] == vector.shape[0]:
+                n = self._size
+                scores = self._vectors[:n] @ vector
+                valid = (self._namespaces[:n] == namespace_id(namespace)) & (self._expires[:n] > now)
+                scores = np.where(valid, scores, -np.inf)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._last_used[best] = now
+                    response = self._responses[best]
+                    self.hits += 1
+            self.search_time += time.perf_counter() - started
+            return response
+
+    def add(self, namespace: str, vector: np.ndarray, response: str):
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._size = 0
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                # Expired entries go first, then the least recently used
+                age = np.where(self._expires > now, self._last_used, -np.inf)
+                slot = int(np.argmin(age))
+                self.evictions += 1
+            self._vectors[slot] = vector
+            self._namespaces[slot] = namespace_id(namespace)
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._responses[slot] = response
+            self.inserts += 1
+
+    def record_embedding(self, seconds: float):
+        with self._lock:
+            self.embeddings += 1
+            self.embed_time += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "inserts": self.inserts,
+                "evictions": self.evictions,
+                "avg_search_ms": 1000 * self.search_time / self.lookups if self.lookups else 0.0,
+                "avg_embed_ms": 1000 * self.embed_time / self.embeddings if self.embeddings else 0.0,
+            }
@@ -0,0 +1,183 @@
+"""
+Priestess AI Sessions - Server-side conversation state
+Lets clients send only the new turn while the server keeps history and KV state
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SessionLimitError(RuntimeError):
+    """Raised when every session slot is held by an active conversation"""
+
+
+class ChatSession:
+    """One conversation kept on the server between turns"""
+
+    def __init__(self, messages: Optional[List[Dict[str, str]]] = None):
+        self.session_id = uuid.uuid4().hex
+        self.messages: List[Dict[str, str]] = list(messages or [])
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        # Chat-templated text of the last prompt and its token ids
+        self.prompt_text: Optional[str] = None
+        self.prompt_ids: List[int] = []
+        # First message still inside the prompt's token window
+        self.window_start = 0
+        # Summary standing in for the oldest messages, and the job writing the next one
+        self.summary = None
+        self.compaction = None
+        # Prefix cache node pinned to keep this conversation's KV state resident;
+        # only read or replaced while holding `lock`
+        self.cache_node = None
+        self.closed = False
+        # Serializes turns within the session, and its release once closed
+        self.lock = threading.Lock()
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "messages": self.messages,
+            "prompt_tokens": len(self.prompt_ids),
+            "window_start": self.window_start,
+            "summary": self.summary.text if self.summary is not None else None,
+            "summarized_messages": self.summary.end if self.summary is not None else 0,
+            "created": self.created,
+        }
+
+
+class SessionManager:
+    """Bounded registry of live sessions with idle-timeout eviction"""
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        idle_timeout: float = 1800.0,
+        on_evict: Optional[Callable[[ChatSession], None]] = None
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.on_evict = on_evict
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def create(self, messages: Optional[List[Dict[str, str]]] = None) -> ChatSession:
+        """Open a new session, evicting idle ones to stay under the cap"""
+        with self._lock:
+            self._expire_idle()
+            if len(self._sessions) >= self.max_sessions:
+                victim = next((s for s in self._sessions.values() if not s.busy), None)
+                if victim is None:
+                    raise SessionLimitError(f"All {self.max_sessions} sessions are active")
+                self._remove(victim.session_id)
+            session = ChatSession(messages)
+            self._sessions[session.session_id] = session
+            self.created += 1
+            return session
+
+    def get(self, session_id: str) -> ChatSession:
+        """Look up a live session; raises KeyError if unknown or expired"""
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions[session_id]
+            session.touch()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove(session_id, evicted=False)
+
+    @contextmanager
+    def turn(self, session: ChatSession) -> Iterator[ChatSession]:
+        """Hold a session for one turn
+
+        A session deleted or evicted while the turn is in flight is released
+        when the turn ends, still holding the session's lock.
+        """
+        session.lock.acquire()
+        try:
+            yield session
+        finally:
+            self._end_turn(session)
+
+    @asynccontextmanager
+    async def aturn(self, session: ChatSession) -> AsyncIterator[ChatSession]:
+        """Asyncio counterpart of turn() that waits for the session without blocking a thread"""
+        delay = 0.005
+        while not session.lock.acquire(blocking=False):
+            # Only another turn of the same session holds it, so this is rare
+            await asyncio.sleep(delay)
+            delay = min(0.1, delay * 2)
+        try:
+            yield session
+        finally:
+            self._end_turn(session)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "live": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "created": self.created,
+                "evicted": self.evicted,
+            }
+
+    def _end_turn(self, session: ChatSession):
+        # Checked under the registry lock so _remove cannot slip in between
+        with self._lock:
+            release = session.closed
+            if not release:
+                session.lock.release()
+        if release:
+            try:
+                self._release(session)
+            finally:
+                session.lock.release()
+
+    def _expire_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for session in list(self._sessions.values()):
+            if session.last_active < cutoff and not session.busy:
+                self._remove(session.session_id)
+
+    def _remove(self, session_id: str, evicted: bool = True) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.closed = True
+        if evicted:
+            self.evicted += 1
+        # A turn in flight releases the session itself when it ends
+        if session.lock.acquire(blocking=False):
+            try:
+                self._release(session)
+            finally:
+                session.lock.release()
+        return True
+
+    def _release(self, session: ChatSession):
+        """Run the eviction hook; callers hold the session's lock"""
+        if self.on_evict is None:
+            return
+        try:
+            self.on_evict(session)
+        except Exception as e:
+            logger.warning(f"Session eviction hook failed: {e}")
@@ -0,0 +1,462 @@
+"""
+Priestess AI Workers - Multi-process CPU inference pool
+Each worker process owns a slice of cores and runs its own batching engine;
+the front-end process tokenizes requests and dispatches them to the least
+loaded worker
+"""
+
+import dataclasses
+import glob
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from priestess_admission import AdmissionRejected
+from priestess_engine import GenerationRequest, SamplingParams
+
+logger = logging.getLogger(__name__)
+
+# Prompts are fingerprinted in blocks of this many tokens to route follow-up
+# turns to the worker whose prefix cache already holds the conversation
+AFFINITY_BLOCK = 64
+AFFINITY_ENTRIES = 8192
+
+
+def parse_cpulist(text: str) -> List[int]:
+    """Parse a kernel cpulist such as "0-3,8,10-11\""""
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def numa_nodes() -> List[List[int]]:
+    """CPUs of each NUMA node, or an empty list where the topology is unknown"""
+    nodes = []
+    paths = glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")
+    for path in sorted(paths, key=lambda p: int(os.path.basename(os.path.dirname(p))[4:])):
+        with open(path) as f:
+            nodes.append(parse_cpulist(f.read()))
+    return nodes
+
+
+def cpu_slices(num_workers: int) -> List[List[int]]:
+    """Split the CPUs this process may use into one contiguous slice per worker
+
+    CPUs are ordered node by node, so with a worker count that is a multiple
+    of the socket count no worker straddles two sockets.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+    else:
+        available = list(range(os.cpu_count() or 1))
+    allowed = set(available)
+    ordered = [cpu for node in numa_nodes() for cpu in node if cpu in allowed]
+    ordered += [cpu for cpu in available if cpu not in set(ordered)]
+
+    if num_workers > len(ordered):
+        raise ValueError(f"{num_workers} workers requested but only {len(ordered)} CPUs are available")
+    base, extra = divmod(len(ordered), num_workers)
+    slices = []
+    start = 0
+    for i in range(num_workers):
+        size = base + (1 if i < extra else 0)
+        slices.append(ordered[start:start + size])
+        start += size
+    return slices
+
+
+def prefix_blocks(token_ids: List[int]) -> List[int]:
+    """Rolling fingerprints of each whole block of `token_ids`"""
+    blocks = []
+    digest = 0
+    for end in range(AFFINITY_BLOCK, len(token_ids) + 1, AFFINITY_BLOCK):
+        digest = hash((digest, tuple(token_ids[end - AFFINITY_BLOCK:end])))
+        blocks.append(digest)
+    return blocks
+
+
+def worker_main(worker_id: int, config, cores: List[int], inbox, outbox):
+    """Entry point of a worker process"""
+    # The front-end owns shutdown; Ctrl-C in the terminal should not kill workers mid-step
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    torch.set_num_threads(config.threads_per_worker or max(1, len(cores)))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+    from priestess_api import PriestessCore
+    try:
+        # Responses are cached by the front-end, which sees every request
+        core = PriestessCore(dataclasses.replace(config, num_workers=1, response_cache_bytes=0, semantic_cache=False))
+        core.load_model()
+    except Exception as e:
+        outbox.put(("failed", None, str(e)))
+        return
+    outbox.put(("ready", None, os.getpid()))
+
+    requests: Dict[int, GenerationRequest] = {}
+    while True:
+        kind, request_id, payload = inbox.get()
+        if kind == "submit":
+            prompt_ids, params, background = payload
+            try:
+                request = core.engine.submit(prompt_ids, params, background=background)
+            except AdmissionRejected as e:
+                # Sent as is so the front-end can answer 413 rather than 500
+                outbox.put(("done", request_id, e))
+                continue
+            except Exception as e:
+                outbox.put(("done", request_id, str(e)))
+                continue
+            requests[request_id] = request
+            request.add_listener(_token_forwarder(request_id, request, outbox, requests))
+        elif kind == "embed":
+            try:
+                future = core.engine.embed(payload)
+            except Exception as e:
+                outbox.put(("embedded", request_id, e))
+                continue
+            future.add_done_callback(
+                lambda f, job_id=request_id: outbox.put(("embedded", job_id, f.exception() or f.result()))
+            )
+        elif kind == "cancel":
+            request = requests.get(request_id)
+            if request is not None:
+                request.cancel()
+        elif kind == "metrics":
+            metrics = core.get_metrics()
+            metrics.pop("sessions", None)
+            outbox.put(("metrics", request_id, metrics))
+        elif kind == "stop":
+            break
+    core.engine.stop()
+
+
+def _token_forwarder(request_id: int, request: GenerationRequest, outbox, requests: Dict):
+    """Listener that sends a worker-side request's new tokens back to the front-end"""
+    sent = 0
+    finished = False
+
+    def forward():
+        nonlocal sent, finished
+        with request._cond:
+            if finished:
+                return
+            tokens = request.output_ids[sent:]
+            if tokens:
+                sent += len(tokens)
+                outbox.put(("tokens", request_id, tokens))
+            if request.future.done():
+                finished = True
+                requests.pop(request_id, None)
+                error = None
+                if not request.cancelled and request.future.exception() is not None:
+                    error = str(request.future.exception())
+                outbox.put(("done", request_id, error))
+
+    return forward
+
+
+class WorkerHandle:
+    """Front-end view of one worker process"""
+
+    def __init__(self, worker_id: int, cores: List[int], process, inbox, outbox):
+        self.worker_id = worker_id
+        self.cores = cores
+        self.process = process
+        self.inbox = inbox
+        self.outbox = outbox
+        self.pid: Optional[int] = None
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+        self.alive = True
+        # Requests dispatched to this worker and not yet finished
+        self.requests: Dict[int, GenerationRequest] = {}
+        # Recently seen prefix blocks, most recent last
+        self.blocks: "OrderedDict[int, None]" = OrderedDict()
+        # The pending get_metrics() call: its request id and the future it waits on
+        self.metrics_id: Optional[int] = None
+        self.metrics_reply: Optional[Future] = None
+        # Outstanding embed() calls by job id
+        self.embeddings: Dict[int, Future] = {}
+
+    @property
+    def load(self) -> int:
+        return len(self.requests)
+
+
+class WorkerPoolEngine:
+    """Drop-in replacement for PriestessEngine that runs inference in worker processes
+
+    Workers are spawned with `num_workers` slices of the host's cores, set
+    their torch thread count to match and load the model independently; with
+    `mmap_weights` they map the same checkpoint pages rather than holding
+    private copies. Requests go to the least loaded live worker, preferring,
+    among nearly idle ones, the worker that last saw the prompt's prefix.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.workers: List[WorkerHandle] = []
+        self.total_requests = 0
+        self.completed_requests = 0
+        self._embed_ids = itertools.count()
+        self._metrics_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._stopping = False
+
+    def start(self):
+        """Spawn the workers and wait until every one has loaded the model"""
+        if self.workers:
+            return
+        self._stopping = False
+        context = multiprocessing.get_context("spawn")
+        for worker_id, cores in enumerate(cpu_slices(self.config.num_workers)):
+            inbox, outbox = context.Queue(), context.Queue()
+            process = context.Process(
+                target=worker_main,
+                args=(worker_id, self.config, cores, inbox, outbox),
+                name=f"priestess-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            worker = WorkerHandle(worker_id, cores, process, inbox, outbox)
+            self.workers.append(worker)
+            threading.Thread(target=self._read, args=(worker,), name=f"priestess-worker-{worker_id}-reader", daemon=True).start()
+            logger.info(f"Started worker {worker_id} on CPUs {cores}")
+
+        for worker in self.workers:
+            worker.ready.wait()
+            if worker.error is not None:
+                self.stop()
+                raise RuntimeError(f"Worker {worker.worker_id} failed to load: {worker.error}")
+
+    def stop(self):
+        """Shut the workers down and fail any outstanding requests"""
+        self._stopping = True
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.inbox.put(("stop", None, None))
+        for worker in self.workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._worker_exited(worker)
+        self.workers = []
+
+    @property
+    def is_running(self) -> bool:
+        return any(worker.alive and worker.ready.is_set() for worker in self.workers)
+
+    def submit(
+        self, prompt_ids: List[int], params: SamplingParams, pin_cache: bool = False, background: bool = False
+    ) -> GenerationRequest:
+        """Queue a tokenized prompt on the least loaded worker
+
+        Prefix cache pins live inside the workers, so `pin_cache` is ignored.
+        """
+        if not self.is_running:
+            raise RuntimeError("Engine not running. Call start() first.")
+        if not prompt_ids:
+            raise ValueError("Prompt must contain at least one token")
+        request = GenerationRequest(prompt_ids, params, background=background)
+        blocks = prefix_blocks(request.prompt_ids)
+        with self._lock:
+            worker = self._choose(blocks)
+            worker.requests[request.request_id] = request
+            self._remember(worker, blocks)
+            self.total_requests += 1
+        worker.inbox.put(("submit", request.request_id, (request.prompt_ids, params, background)))
+        request.add_listener(self._cancel_forwarder(worker, request))
+        return request
+
+    def embed(self, token_ids: List[int]) -> Future:
+        """Embed text on the least loaded worker; see PriestessEngine.embed"""
+        if not self.is_running:
+            raise RuntimeError("Engine not running. Call start() first.")
+        future = Future()
+        job_id = next(self._embed_ids)
+        with self._lock:
+            live = [worker for worker in self.workers if worker.alive]
+            if not live:
+                raise RuntimeError("No inference workers available")
+            worker = min(live, key=lambda w: w.load)
+            worker.embeddings[job_id] = future
+        worker.inbox.put(("embed", job_id, list(token_ids)))
+        return future
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Return pool-wide totals and per-worker statistics"""
+        per_worker = []
+        with self._metrics_lock:
+            for worker in self.workers:
+                entry = {
+                    "worker": worker.worker_id,
+                    "pid": worker.pid,
+                    "cores": worker.cores,
+                    "alive": worker.alive,
+                    "load": worker.load,
+                }
+                if worker.alive:
+                    # Tagged so a reply arriving after its call timed out is not
+                    # taken for the answer to the next one
+                    worker.metrics_id = next(self._metrics_ids)
+                    worker.metrics_reply = Future()
+                    worker.inbox.put(("metrics", worker.metrics_id, None))
+                    try:
+                        entry.update(worker.metrics_reply.result(timeout=2.0))
+                    except Exception:
+                        pass
+                per_worker.append(entry)
+
+        def total(key):
+            return sum(entry.get(key, 0) for entry in per_worker)
+
+        batch_sizes = [entry["avg_batch_size"] for entry in per_worker if entry.get("avg_batch_size")]
+        return {
+            "running": total("running"),
+            "waiting": total("waiting"),
+            "background_waiting": total("background_waiting"),
+            "max_batch_size": total("max_batch_size"),
+            "total_requests": self.total_requests,
+            "completed_requests": self.completed_requests,
+            "generated_tokens": total("generated_tokens"),
+            "decode_steps": total("decode_steps"),
+            "tokens_per_second": total("tokens_per_second"),
+            "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0.0,
+            "workers": per_worker,
+        }
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def _choose(self, blocks: List[int]) -> WorkerHandle:
+        live = [worker for worker in self.workers if worker.alive]
+        if not live:
+            raise RuntimeError("No inference workers available")
+        least = min(worker.load for worker in live)
+        candidates = [worker for worker in live if worker.load <= least + 1]
+        return max(candidates, key=lambda worker: (self._affinity(worker, blocks), -worker.load))
+
+    @staticmethod
+    def _affinity(worker: WorkerHandle, blocks: List[int]) -> int:
+        matched = 0
+        for block in blocks:
+            if block not in worker.blocks:
+                break
+            matched += 1
+        return matched
+
+    @staticmethod
+    def _remember(worker: WorkerHandle, blocks: List[int]):
+        for block in blocks:
+            worker.blocks[block] = None
+            worker.blocks.move_to_end(block)
+        while len(worker.blocks) > AFFINITY_ENTRIES:
+            worker.blocks.popitem(last=False)
+
+    def _cancel_forwarder(self, worker: WorkerHandle, request: GenerationRequest):
+        sent = False
+
+        def forward():
+            nonlocal sent
+            if request.cancelled and not sent:
+                sent = True
+                worker.inbox.put(("cancel", request.request_id, None))
+
+        return forward
+
+    # ------------------------------------------------------------------
+    # Worker replies
+    # ------------------------------------------------------------------
+
+    def _read(self, worker: WorkerHandle):
+        """Apply a worker's replies to the front-end requests"""
+        while True:
+            try:
+                kind, request_id, payload = worker.outbox.get(timeout=1.0)
+            except queue.Empty:
+                if not worker.process.is_alive():
+                    self._worker_exited(worker)
+                    return
+                continue
+            except (EOFError, OSError):
+                self._worker_exited(worker)
+                return
+
+            if kind == "tokens":
+                request = worker.requests.get(request_id)
+                if request is not None:
+                    for token_id in payload:
+                        request._append(token_id)
+            elif kind == "done":
+                with self._lock:
+                    request = worker.requests.pop(request_id, None)
+                    if request is not None and payload is None:
+                        self.completed_requests += 1
+                        self._remember(worker, prefix_blocks(request.prompt_ids + request.output_ids))
+                if request is not None:
+                    if payload and not isinstance(payload, BaseException):
+                        payload = RuntimeError(payload)
+                    request._finish(payload)
+            elif kind == "embedded":
+                with self._lock:
+                    future = worker.embeddings.pop(request_id, None)
+                if future is not None and not future.done():
+                    if isinstance(payload, BaseException):
+                        future.set_exception(payload)
+                    else:
+                        future.set_result(payload)
+            elif kind == "metrics":
+                reply = worker.metrics_reply
+                if request_id == worker.metrics_id and reply is not None and not reply.done():
+                    reply.set_result(payload)
+            elif kind == "ready":
+                worker.pid = payload
+                worker.ready.set()
+            elif kind == "failed":
+                worker.error = payload
+                worker.alive = False
+                worker.ready.set()
+
+    def _worker_exited(self, worker: WorkerHandle):
+        with self._lock:
+            if not worker.alive and not worker.requests:
+                worker.ready.set()
+                return
+            worker.alive = False
+            orphans = list(worker.requests.values())
+            worker.requests.clear()
+            embeddings = list(worker.embeddings.values())
+            worker.embeddings.clear()
+        if not worker.ready.is_set():
+            worker.error = worker.error or f"exited with code {worker.process.exitcode}"
+            worker.ready.set()
+        elif not self._stopping:
+            logger.error(f"Worker {worker.worker_id} exited with code {worker.process.exitcode}")
+        for request in orphans:
+            request._finish(RuntimeError(f"Worker {worker.worker_id} exited"))
+        for future in embeddings:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Worker {worker.worker_id} exited"))
@@ -35,6 +35,9 @@ setup(
     ],
     python_requires=">=3.8",
     install_requires=requirements,
+    extras_require={
+        "async": ["aiohttp>=3.8.0"],
+    },
     entry_points={
         "console_scripts": [
             "priestess=priestess_cli:main",
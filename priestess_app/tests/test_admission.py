@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from priestess_admission import AdmissionController, AdmissionRejected, kv_bytes_per_token
+
+
+def test_kv_bytes_per_token_counts_keys_and_values_of_every_layer():
+    config = SimpleNamespace(num_attention_heads=8, num_key_value_heads=2, hidden_size=256, num_hidden_layers=4)
+
+    # 2 (k, v) * 4 layers * 2 kv heads * 32 dims * 2 bytes
+    assert kv_bytes_per_token(config, torch.float16) == 1024
+
+
+def test_check_rejects_request_larger_than_the_whole_budget():
+    controller = AdmissionController(budget_bytes=1000, bytes_per_token=10)
+    controller.check(100)
+
+    with pytest.raises(AdmissionRejected):
+        controller.check(101)
+    assert controller.get_stats()["rejected"] == 1
+
+
+def test_fits_accounts_for_padding_to_the_longest_row():
+    controller = AdmissionController(budget_bytes=1000, bytes_per_token=10)
+
+    # Three rows padded to 30 tokens: 3 * 30 * 10 = 900 bytes
+    assert controller.fits([10, 20], 30)
+    # A long newcomer pads the short rows too: 3 * 40 * 10 = 1200 bytes
+    assert not controller.fits([10, 20], 40)
+    assert controller.fits([], 100)
+
+
+def test_record_counts_each_wait_for_memory_once():
+    controller = AdmissionController(budget_bytes=1000, bytes_per_token=10)
+    controller.record(600, admitted=2, waiting=True)
+    controller.record(600, waiting=True)
+    controller.record(300, admitted=1, waiting=False)
+    controller.record(900, waiting=True)
+
+    stats = controller.get_stats()
+    assert stats["admitted"] == 3
+    assert stats["deferred"] == 2
+    assert stats["committed_bytes"] == 900
+    assert stats["available_bytes"] == 100
+    assert stats["waiting_for_memory"]
@@ -0,0 +1,71 @@
+import json
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from priestess_batch import BatchRunner
+
+
+class FakeCore:
+    """Answers each chat with the length of its last message"""
+
+    config = SimpleNamespace(max_batch_size=2, num_workers=1)
+    tokenizer = SimpleNamespace(decode=lambda ids, skip_special_tokens: " ".join(map(str, ids)))
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.asked = []
+
+    def check_secret_request(self, messages):
+        return None
+
+    def check_caches(self, messages, generation_kwargs, endpoint):
+        return SimpleNamespace(response=None, key=None, status="MISS")
+
+    def submit_shared(self, messages, key, **generation_kwargs):
+        content = messages[-1]["content"]
+        self.asked.append(content)
+        future = Future()
+        if content in self.failing:
+            future.set_exception(RuntimeError("engine failed"))
+        else:
+            future.set_result([len(content)])
+        return SimpleNamespace(future=future, cancel=future.cancel)
+
+    def remember_response(self, lookup, response):
+        pass
+
+
+def write_items(path, contents):
+    with open(path, "w", encoding="utf-8") as f:
+        for content in contents:
+            f.write(json.dumps({"messages": [{"role": "user", "content": content}]}) + "\n")
+
+
+def read_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_resume_retries_only_failed_items(tmp_path):
+    input_path, output_path = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+    write_items(input_path, ["a", "bb", "ccc"])
+
+    first = BatchRunner(FakeCore(failing={"bb"}), window=2).run(input_path, output_path)
+    assert (first["completed"], first["failed"]) == (3, 1)
+
+    core = FakeCore()
+    second = BatchRunner(core, window=2).run(input_path, output_path)
+    assert core.asked == ["bb"]
+    assert (second["skipped"], second["completed"], second["failed"]) == (2, 1, 0)
+
+    latest = {record["line"]: record for record in read_records(output_path)}
+    assert {line: record.get("response") for line, record in latest.items()} == {1: "1", 2: "2", 3: "3"}
+    assert BatchRunner(FakeCore(), window=2).checkpoint(output_path) == {1, 2, 3}
+
+
+def test_checkpoint_drops_a_record_cut_short(tmp_path):
+    output_path = tmp_path / "out.jsonl"
+    output_path.write_text('{"line": 1, "response": "x"}\n{"line": 2, "resp', encoding="utf-8")
+
+    assert BatchRunner(FakeCore(), window=2).checkpoint(str(output_path)) == {1}
+    assert output_path.read_text(encoding="utf-8") == '{"line": 1, "response": "x"}\n'
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from priestess_client import PriestessAsyncClient, PriestessClient, Replica, backoff_delay, retry_after_seconds
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert retry_after_seconds("7") == 7.0
+    assert retry_after_seconds("-3") == 0.0
+    assert 55 < retry_after_seconds(formatdate(usegmt=True, timeval=time.time() + 60)) <= 60
+    assert retry_after_seconds(formatdate(usegmt=True, timeval=0)) == 0.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+
+
+def test_backoff_is_jittered_exponential_up_to_the_cap():
+    for attempt in range(8):
+        delay = backoff_delay(attempt, None, backoff=0.5, max_backoff=4.0)
+        assert 0.0 <= delay <= min(4.0, 0.5 * 2 ** attempt)
+
+
+def test_backoff_never_waits_less_than_retry_after():
+    for _ in range(20):
+        assert 10.0 <= backoff_delay(0, 10.0, backoff=0.5, max_backoff=1.0) <= 10.5
+
+
+def test_map_stopping_early_waits_for_cancelled_calls():
+    unwound = []
+
+    async def call(item):
+        try:
+            await asyncio.sleep(0 if item == 0 else 60)
+            return item
+        finally:
+            unwound.append(item)
+
+    async def first_result():
+        results = PriestessAsyncClient().map(call, range(4), concurrency=4)
+        async for index, result in results:
+            await results.aclose()
+            # Before the event loop gets a chance to run anything else
+            return index, result, sorted(unwound)
+
+    assert asyncio.run(first_result()) == (0, 0, [0, 1, 2, 3])
+
+
+def test_replica_counters_are_exact_under_concurrent_updates():
+    replica = Replica("http://replica/")
+
+    def update():
+        for _ in range(2000):
+            replica.record(requests=1, errors=1)
+            replica.set_health(True, 0.01)
+            replica.weight
+
+    threads = [threading.Thread(target=update) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = replica.to_dict()
+    assert stats["url"] == "http://replica"
+    assert stats["requests"] == stats["errors"] == 16000
+    assert stats["weight"] == pytest.approx(1 / 0.06)
+
+
+def test_unhealthy_replicas_are_not_picked():
+    client = PriestessClient(["http://first", "http://second"], health_interval=3600)
+    client._health_checked = time.monotonic()
+    client.replicas[0].set_health(False)
+
+    assert {client.pick_replica().url for _ in range(50)} == {"http://second"}
+    assert client.get_stats()["replicas"][0]["weight"] == 0.0
+
+
+class FakeServer:
+    """Serves each connection on its own thread with `handle`"""
+
+    def __init__(self):
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.accepted = 0
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.socket.getsockname()[1]}"
+
+    def serve(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection):
+        raise NotImplementedError
+
+    def close(self):
+        self.socket.close()
+
+
+class ResettingServer(FakeServer):
+    """Accepts connections and closes them without answering"""
+
+    def handle(self, connection):
+        connection.recv(65536)
+        connection.close()
+
+
+class StreamingServer(FakeServer):
+    """Answers with a server-sent event stream, after `delay` seconds
+
+    Records when each client went away, as the real servers stop generating then.
+    """
+
+    def __init__(self, text, delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.disconnects = []
+        super().__init__()
+
+    def handle(self, connection):
+        with connection:
+            self.read_request(connection)
+            connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                               b"Transfer-Encoding: chunked\r\n\r\n")
+            self.send_chunk(connection, ": stream open\n\n")
+            if self.delay:
+                connection.settimeout(self.delay)
+                try:
+                    connection.recv(1)
+                except socket.timeout:
+                    pass
+                except OSError:
+                    self.disconnects.append(time.monotonic())
+                    return
+                else:
+                    self.disconnects.append(time.monotonic())
+                    return
+            for event in ({"delta": self.text}, {"done": True}):
+                self.send_chunk(connection, f"data: {json.dumps(event)}\n\n")
+            connection.sendall(b"0\r\n\r\n")
+
+    @staticmethod
+    def read_request(connection):
+        data = b""
+        while b"\r\n\r\n" not in data:
+            data += connection.recv(65536)
+        head, body = data.split(b"\r\n\r\n", 1)
+        length = next((int(line.split(b":")[1]) for line in head.split(b"\r\n")
+                       if line.lower().startswith(b"content-length:")), 0)
+        while len(body) < length:
+            body += connection.recv(65536)
+
+    @staticmethod
+    def send_chunk(connection, text):
+        data = text.encode()
+        connection.sendall(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+def hedging_client(primary, other, **kwargs):
+    """A hedging client whose first attempt always goes to `primary`"""
+    client = PriestessClient([primary, other], hedge_delay=0.2, max_retries=0, **kwargs)
+    client._health_checked = time.monotonic()
+    # Stale health: the client believes only the primary is serving
+    client.replicas[1].set_health(False)
+    return client
+
+
+def unused_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def test_post_is_not_resent_after_the_connection_drops():
+    server = ResettingServer()
+    client = PriestessClient(server.url, max_retries=2, backoff=0.0)
+    try:
+        with pytest.raises(requests.ConnectionError):
+            client.request("POST", "/chat", {"messages": []})
+        assert server.accepted == 1
+
+        with pytest.raises(requests.ConnectionError):
+            client.request("GET", "/health")
+        assert server.accepted == 4
+    finally:
+        client.close()
+        server.close()
+
+
+def test_post_is_retried_when_the_connection_is_refused():
+    client = PriestessClient(f"http://127.0.0.1:{unused_port()}", max_retries=2, backoff=0.0)
+    try:
+        with pytest.raises(requests.ConnectionError):
+            client.request("POST", "/chat", {"messages": []})
+        assert client.replicas[0].requests == 3
+    finally:
+        client.close()
+
+
+def test_hedge_aborts_the_losing_stream():
+    slow, fast = StreamingServer("slow", delay=30.0), StreamingServer("fast")
+    client = hedging_client(slow.url, fast.url)
+    try:
+        assert "".join(client.chat_stream([])) == "fast"
+        finished = time.monotonic()
+        deadline = finished + 5
+        while not slow.disconnects and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert slow.disconnects and slow.disconnects[0] - finished < 1.0
+        assert client.get_stats()["hedging"]["hedge_wins"] == 1
+    finally:
+        client.close()
+        slow.close()
+        fast.close()
+
+
+def test_hedge_fails_over_at_once_when_the_first_replica_is_down():
+    fast = StreamingServer("fast")
+    client = hedging_client(f"http://127.0.0.1:{unused_port()}", fast.url, backoff=0.0)
+    client.hedge_delay = 30.0
+    try:
+        started = time.monotonic()
+        assert "".join(client.chat_stream([])) == "fast"
+        assert time.monotonic() - started < 5.0
+    finally:
+        client.close()
+        fast.close()
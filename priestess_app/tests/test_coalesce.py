@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from priestess_coalesce import InflightRequests
+from priestess_engine import GenerationRequest, SamplingParams
+
+
+def make_request():
+    return GenerationRequest([1, 2, 3], SamplingParams(8, 0.0, 1.0, do_sample=False))
+
+
+def test_identical_requests_share_one_generation():
+    inflight = InflightRequests()
+    submitted = []
+
+    def submit():
+        submitted.append(make_request())
+        return submitted[-1]
+
+    first = inflight.join("key", submit)
+    second = inflight.join("key", submit)
+    assert len(submitted) == 1
+
+    submitted[0].future.set_result([7, 8])
+    assert first.result() == second.result() == [7, 8]
+    assert inflight.get_stats() == {"in_flight": 0, "leaders": 1, "coalesced": 1}
+
+
+def test_cancel_only_stops_the_generation_when_every_caller_has():
+    inflight = InflightRequests()
+    request = make_request()
+    first = inflight.join("key", lambda: request)
+    second = inflight.join("key", lambda: make_request())
+
+    first.cancel()
+    first.cancel()
+    assert first.cancelled
+    assert not request.cancelled
+    assert not second.cancelled
+
+    second.cancel()
+    assert request.cancelled
+    assert inflight.get_stats()["in_flight"] == 0
+
+
+def test_finished_generation_is_not_joined_again():
+    inflight = InflightRequests()
+    first_request, second_request = make_request(), make_request()
+    inflight.join("key", lambda: first_request)
+    first_request.future.set_result([1])
+
+    assert inflight.join("key", lambda: second_request).request is second_request
+
+
+def test_submit_error_reaches_callers_that_joined_meanwhile():
+    inflight = InflightRequests()
+    submitting = threading.Event()
+    errors = []
+
+    def submit():
+        submitting.set()
+        deadline = time.monotonic() + 5
+        while inflight.get_stats()["coalesced"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        raise RuntimeError("rejected")
+
+    def follower():
+        submitting.wait(5)
+        try:
+            inflight.join("key", make_request)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        inflight.join("key", submit)
+    thread.join(5)
+
+    assert [str(e) for e in errors] == ["rejected"]
+    assert inflight.get_stats()["in_flight"] == 0
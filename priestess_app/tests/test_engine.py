@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+from transformers import AutoModelForCausalLM, Qwen2Config
+
+from priestess_engine import PriestessEngine, SamplingParams
+
+VOCAB_SIZE = 64
+
+
+@pytest.fixture
+def engine():
+    torch.manual_seed(0)
+    config = Qwen2Config(
+        vocab_size=VOCAB_SIZE, hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, eos_token_id=None
+    )
+    model = AutoModelForCausalLM.from_config(config).eval()
+    engine = PriestessEngine(model, SimpleNamespace(pad_token_id=0, eos_token_id=None), max_batch_size=4)
+    engine.start()
+    yield engine
+    engine.stop()
+
+
+def greedy(max_new_tokens):
+    return SamplingParams(max_new_tokens, 0.0, 1.0, do_sample=False)
+
+
+def test_bad_prompt_fails_alone_while_another_request_streams(engine):
+    streaming = engine.submit([1, 2, 3], greedy(200))
+    tokens = streaming.iter_tokens()
+    next(tokens)
+
+    bad = engine.submit([1, VOCAB_SIZE + 10], greedy(4))
+    with pytest.raises(IndexError):
+        bad.result(timeout=30)
+
+    assert len(streaming.result(timeout=30)) == 200
+    assert len(engine.submit([4, 5], greedy(3)).result(timeout=30)) == 3
@@ -0,0 +1,88 @@
+from priestess_history import HistoryCompactor, HistorySummary, HistoryWindow, summarized_window
+
+
+def words(text):
+    return len(text.split())
+
+
+def turn(role, count):
+    return {"role": role, "content": " ".join([role] * count)}
+
+
+def conversation(turns, size=10):
+    messages = [turn("system", 5)]
+    for _ in range(turns):
+        messages += [turn("user", size), turn("assistant", size)]
+    return messages
+
+
+def test_window_keeps_everything_that_fits():
+    history = HistoryWindow(words, max_tokens=100)
+    messages = conversation(4)
+
+    assert history.window(messages) == messages
+
+
+def test_window_cuts_to_keep_ratio_and_starts_on_a_user_turn():
+    history = HistoryWindow(words, max_tokens=65, keep_ratio=0.5)
+    messages = conversation(4)
+
+    start = history.start_index(messages)
+
+    # 60 of the 65 tokens are left after the system prompt; half of that keeps
+    # the last three 10-token turns, trimmed to begin with the user's
+    assert start == 7
+    assert messages[start]["role"] == "user"
+    assert history.window(messages) == [messages[0]] + messages[7:]
+
+
+def test_window_stays_put_while_it_fits():
+    history = HistoryWindow(words, max_tokens=65, keep_ratio=0.5)
+    messages = conversation(4)
+    start = history.start_index(messages)
+
+    messages += [turn("user", 10)]
+    assert history.start_index(messages, start) == start
+    messages += [turn("assistant", 10), turn("user", 10), turn("assistant", 10)]
+    assert history.start_index(messages, start) == start
+    messages += [turn("user", 10)]
+    assert history.start_index(messages, start) > start
+
+
+def test_latest_turn_is_kept_even_over_budget():
+    history = HistoryWindow(words, max_tokens=20)
+    messages = conversation(1) + [turn("user", 50)]
+
+    assert history.window(messages) == [messages[0], messages[-1]]
+
+
+def test_message_overhead_and_token_count_cache():
+    counted = []
+    history = HistoryWindow(lambda text: counted.append(text) or words(text), max_tokens=100, message_overhead=3)
+    message = turn("user", 4)
+
+    assert history.message_tokens(message) == 7
+    assert history.message_tokens(dict(message)) == 7
+    assert len(counted) == 1
+    assert history.get_stats()["hits"] == 1
+
+
+def test_summary_is_folded_into_the_system_prompt():
+    messages = conversation(2)
+    summary = HistorySummary(end=3, text="earlier", tokens=2)
+
+    window = summarized_window(messages, 3, summary)
+
+    assert window[0]["role"] == "system"
+    assert window[0]["content"].endswith("earlier")
+    assert window[1:] == messages[3:]
+
+
+def test_compactor_plans_once_over_threshold():
+    compactor = HistoryCompactor(HistoryWindow(words, max_tokens=1000), threshold=50, keep_tokens=20)
+
+    assert compactor.plan(conversation(2)) is None
+    messages = conversation(3)
+    end = compactor.plan(messages)
+    assert end == 5
+    assert compactor.plan(messages, compactor.summary(end, "earlier")) is None
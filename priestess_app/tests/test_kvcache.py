@@ -0,0 +1,134 @@
+import torch
+
+from priestess_kvcache import PromptKVCache, RadixPrefixCache, layers_nbytes
+
+
+def kv_layers(token_ids, num_layers=2):
+    """KV state whose values record the token at each position"""
+    values = torch.tensor(token_ids, dtype=torch.float32).view(1, 1, -1, 1)
+    return [(values.clone(), values.clone() + 0.5) for _ in range(num_layers)]
+
+
+def cached_tokens(layers):
+    return [int(t) for t in layers[0][0].view(-1).tolist()]
+
+
+def test_prompt_cache_counts_only_usable_prefixes_as_hits():
+    cache = PromptKVCache()
+    cache.add("system", [1, 2, 3], kv_layers([1, 2, 3]))
+    cache.add("bos", [1], kv_layers([1]))
+
+    length, layers = cache.lookup([1, 2, 3, 4])
+    assert length == 3
+    assert cached_tokens(layers) == [1, 2, 3]
+    assert cache.lookup([1]) == (0, None)
+    assert cache.lookup([5, 6]) == (0, None)
+    assert (cache.hits, cache.misses, cache.hit_tokens) == (1, 2, 3)
+
+
+def test_lookup_returns_longest_prefix_and_leaves_one_token():
+    cache = RadixPrefixCache(max_bytes=1 << 20)
+    cache.insert([1, 2, 3, 4], kv_layers([1, 2, 3, 4]))
+
+    length, layers = cache.lookup([1, 2, 3, 4])
+    assert length == 3
+    assert cached_tokens(layers) == [1, 2, 3]
+
+    length, layers = cache.lookup([1, 2, 9, 9])
+    assert length == 2
+    assert cached_tokens(layers) == [1, 2]
+
+    assert cache.lookup([7, 8]) == (0, None)
+    stats = cache.get_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_diverging_insert_splits_edge_and_shares_prefix():
+    cache = RadixPrefixCache(max_bytes=1 << 20)
+    cache.insert([1, 2, 3, 4], kv_layers([1, 2, 3, 4]))
+    cache.insert([1, 2, 5, 6], kv_layers([1, 2, 5, 6]))
+
+    head = cache.root.children[1]
+    assert head.key == (1, 2)
+    assert sorted(child.key for child in head.children.values()) == [(3, 4), (5, 6)]
+    # The shared prefix is stored once
+    assert cache.total_bytes == layers_nbytes(kv_layers([1, 2, 3, 4, 5, 6]))
+
+    length, layers = cache.lookup([1, 2, 5, 6, 7])
+    assert length == 4
+    assert cached_tokens(layers) == [1, 2, 5, 6]
+
+
+def test_evicts_least_recently_used_leaf():
+    one_sequence = layers_nbytes(kv_layers([0, 0]))
+    cache = RadixPrefixCache(max_bytes=2 * one_sequence)
+    cache.insert([1, 2], kv_layers([1, 2]))
+    cache.insert([3, 4], kv_layers([3, 4]))
+    cache.lookup([1, 2, 0])
+    cache.insert([5, 6], kv_layers([5, 6]))
+
+    assert set(cache.root.children) == {1, 5}
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_locked_path_survives_eviction_until_unlocked():
+    one_sequence = layers_nbytes(kv_layers([0, 0]))
+    cache = RadixPrefixCache(max_bytes=one_sequence)
+    pinned = cache.insert([1, 2], kv_layers([1, 2]))
+    cache.lock(pinned)
+    # Over budget, but neither the pinned path nor the new sequence may go
+    cache.insert([3, 4], kv_layers([3, 4]))
+    assert set(cache.root.children) == {1, 3}
+
+    cache.unlock(pinned)
+    assert pinned.lock_ref == 0
+    assert set(cache.root.children) == {3}
+    assert cache.total_bytes == one_sequence
+
+
+def test_insert_with_lock_pins_a_sequence_larger_than_the_budget():
+    cache = RadixPrefixCache(max_bytes=200)
+    tokens = list(range(1, 31))
+    node = cache.insert(tokens, kv_layers(tokens), lock=True)
+
+    assert cache.root.children[1] is node
+    assert node.lock_ref == 1
+    assert cache.total_bytes == node.nbytes > cache.max_bytes
+    assert cache.lookup(tokens + [99])[0] == 30
+
+    cache.unlock(node)
+    assert cache.total_bytes == 0
+    assert cache.lookup(tokens + [99]) == (0, None)
+
+
+def test_eviction_follows_recency_across_many_leaves():
+    one_sequence = layers_nbytes(kv_layers([0, 0]))
+    cache = RadixPrefixCache(max_bytes=50 * one_sequence)
+    for i in range(50):
+        cache.insert([i + 1, 0], kv_layers([i + 1, 0]))
+    for _ in range(20):
+        for i in range(0, 50, 2):
+            cache.lookup([i + 1, 0, 0])
+    for i in range(25):
+        cache.insert([100 + i, 0], kv_layers([100 + i, 0]))
+
+    # The 25 leaves never looked up again went first
+    assert set(cache.root.children) == {i + 1 for i in range(0, 50, 2)} | {100 + i for i in range(25)}
+    assert cache.get_stats()["nodes"] == 50
+    assert len(cache._leaves) <= 2 * cache.num_nodes + 64
+
+
+def test_split_keeps_lock_on_shared_prefix():
+    cache = RadixPrefixCache(max_bytes=1 << 20)
+    pinned = cache.insert([1, 2, 3, 4], kv_layers([1, 2, 3, 4]))
+    cache.lock(pinned)
+    cache.insert([1, 2, 5], kv_layers([1, 2, 5]))
+
+    head = cache.root.children[1]
+    assert head.key == (1, 2)
+    assert head.lock_ref == 1
+    assert pinned.parent is head and pinned.lock_ref == 1
+
+    cache.unlock(pinned)
+    assert head.lock_ref == 0 and pinned.lock_ref == 0
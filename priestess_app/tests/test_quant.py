@@ -0,0 +1,38 @@
+import pytest
+import torch
+from torch import nn
+
+from priestess_quant import quantize_model, unsupported_reason
+
+
+class TinyModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.proj = nn.Linear(256, 256)
+
+    def get_output_embeddings(self):
+        return None
+
+    def get_input_embeddings(self):
+        return None
+
+
+def test_int4_reports_the_torch_version_it_needs(monkeypatch):
+    monkeypatch.delattr(torch, "_weight_int4pack_mm_for_cpu", raising=False)
+
+    assert "torch>=2.6" in unsupported_reason("int4-weight-only")
+    assert unsupported_reason("int8-dynamic") is None
+    with pytest.raises(RuntimeError, match=r"torch>=2\.6"):
+        quantize_model(TinyModel(), "int4-weight-only")
+
+
+def test_int8_dynamic_swaps_linear_layers_and_stays_close():
+    torch.manual_seed(0)
+    model = TinyModel()
+    x = torch.randn(2, 256)
+    expected = model.proj(x)
+
+    quantize_model(model, "int8-dynamic")
+
+    assert type(model.proj) is not nn.Linear
+    assert torch.allclose(model.proj(x), expected, atol=0.05)
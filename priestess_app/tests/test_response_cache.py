@@ -0,0 +1,80 @@
+import os
+
+from priestess_engine import SamplingParams
+from priestess_response_cache import ResponseCache, response_cache_key
+
+KEY_A = "aa" + "0" * 62
+KEY_B = "bb" + "0" * 62
+KEY_C = "cc" + "0" * 62
+
+
+def test_key_ignores_sampling_settings_of_greedy_requests():
+    messages = [{"role": "user", "content": "hi"}]
+    greedy = response_cache_key(messages, SamplingParams(64, 0.7, 0.9, do_sample=False), "model")
+
+    assert greedy == response_cache_key(messages, SamplingParams(64, 0.2, 1.0, do_sample=False), "model")
+    assert greedy != response_cache_key(messages, SamplingParams(64, 0.7, 0.9, do_sample=True), "model")
+    assert greedy != response_cache_key(messages, SamplingParams(64, 0.7, 0.9, do_sample=False), "other-model")
+
+
+def test_entries_expire_after_ttl():
+    cache = ResponseCache(max_bytes=1024, ttl=-1.0)
+    cache.put(KEY_A, "answer")
+
+    assert cache.get(KEY_A) is None
+    stats = cache.get_stats()
+    assert stats["expired"] == 1
+    assert stats["entries"] == 0
+
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    cache = ResponseCache(max_bytes=10)
+    cache.put(KEY_A, "aaaa")
+    cache.put(KEY_B, "bbbb")
+    cache.get(KEY_A)
+    cache.put(KEY_C, "cccc")
+
+    assert cache.get(KEY_B) is None
+    assert cache.get(KEY_A) == "aaaa"
+    assert cache.get(KEY_C) == "cccc"
+    assert cache.get_stats()["bytes"] == 8
+
+
+def test_disk_tier_survives_restart_and_promotes_hits(tmp_path):
+    ResponseCache(max_bytes=1024, disk_dir=str(tmp_path)).put(KEY_A, "answer")
+
+    cache = ResponseCache(max_bytes=1024, disk_dir=str(tmp_path))
+    assert cache.get_stats()["disk_entries"] == 1
+    assert cache.get(KEY_A) == "answer"
+    assert cache.get_stats()["disk_hits"] == 1
+    assert cache.get(KEY_A) == "answer"
+    assert cache.get_stats()["disk_hits"] == 1
+
+
+def test_disk_entries_are_shared_between_running_servers(tmp_path):
+    first = ResponseCache(max_bytes=1024, disk_dir=str(tmp_path))
+    second = ResponseCache(max_bytes=1024, disk_dir=str(tmp_path))
+
+    first.put(KEY_A, "answer")
+
+    assert second.get(KEY_A) == "answer"
+    assert second.get_stats()["disk_entries"] == 1
+
+
+def test_disk_tier_evicts_oldest_files_over_budget(tmp_path):
+    cache = ResponseCache(max_bytes=1024, disk_dir=str(tmp_path), disk_max_bytes=100)
+    cache.put(KEY_A, "a" * 40)
+    cache.put(KEY_B, "b" * 40)
+
+    assert not os.path.exists(cache._path(KEY_A))
+    assert os.path.exists(cache._path(KEY_B))
+    assert cache.get_stats()["disk_bytes"] <= 100
+
+
+def test_expired_disk_entries_are_removed(tmp_path):
+    cache = ResponseCache(max_bytes=1024, ttl=-1.0, disk_dir=str(tmp_path))
+    cache.put(KEY_A, "answer")
+
+    assert cache.get(KEY_A) is None
+    assert not os.path.exists(cache._path(KEY_A))
+    assert cache.get_stats()["disk_entries"] == 0
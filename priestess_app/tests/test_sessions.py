@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from priestess_sessions import SessionLimitError, SessionManager
+
+
+def test_idle_sessions_expire_and_are_released():
+    released = []
+    manager = SessionManager(idle_timeout=60.0, on_evict=released.append)
+    idle = manager.create()
+    active = manager.create()
+    idle.last_active = time.monotonic() - 120.0
+
+    with pytest.raises(KeyError):
+        manager.get(idle.session_id)
+    assert manager.get(active.session_id) is active
+    assert released == [idle]
+    assert idle.closed
+    assert manager.get_stats()["evicted"] == 1
+
+
+def test_max_sessions_evicts_least_recently_used_idle_session():
+    released = []
+    manager = SessionManager(max_sessions=2, on_evict=released.append)
+    first = manager.create()
+    second = manager.create()
+    manager.get(first.session_id)
+
+    third = manager.create()
+
+    assert released == [second]
+    assert manager.get(first.session_id) is first
+    assert manager.get(third.session_id) is third
+    assert manager.get_stats()["live"] == 2
+
+
+def test_max_sessions_raises_when_every_session_is_busy():
+    manager = SessionManager(max_sessions=1)
+    session = manager.create()
+    with manager.turn(session):
+        with pytest.raises(SessionLimitError):
+            manager.create()
+    assert manager.create() is not session
+
+
+def test_delete_during_turn_releases_once_when_turn_ends():
+    released = []
+    manager = SessionManager(on_evict=released.append)
+    session = manager.create()
+
+    with manager.turn(session):
+        assert manager.delete(session.session_id)
+        assert session.closed
+        assert released == []
+    assert released == [session]
+    assert not session.busy
+
+    assert not manager.delete(session.session_id)
+    assert released == [session]
+
+
+def test_release_holds_session_lock():
+    held = []
+    manager = SessionManager(on_evict=lambda s: held.append(s.busy))
+    session = manager.create()
+    manager.delete(session.session_id)
+    other = manager.create()
+    with manager.turn(other):
+        manager.delete(other.session_id)
+    assert held == [True, True]
+
+
+def test_concurrent_delete_and_turn_release_exactly_once():
+    for _ in range(200):
+        released = []
+        manager = SessionManager(on_evict=released.append)
+        session = manager.create()
+        started = threading.Event()
+
+        def run_turn():
+            with manager.turn(session):
+                started.set()
+
+        thread = threading.Thread(target=run_turn)
+        thread.start()
+        started.wait()
+        manager.delete(session.session_id)
+        thread.join()
+        assert released == [session]